@@ -0,0 +1,143 @@
+"""REID
+   ASGI serving mode on the async drivers of the database
+
+   create_asgi() builds the same app as create_api(), with the same URLs
+   and answers, but connected with the async driver of its database
+   (asyncpg for PostgreSQL, aiosqlite for SQLite), and serves it as an
+   ASGI application:
+       uvicorn --app-dir api asgiAlchemy:app
+
+   Every request runs the views in a greenlet of the event loop, the way
+   AsyncSession runs the statements of its session: while a statement
+   waits on the database, or an answer waits on a slow client, the
+   greenlet hands the loop to the other requests. An in-flight request
+   costs a greenlet instead of a thread, so a few workers serve thousands
+   of slow clients. The body of a request is read before its view runs.
+"""
+
+import io
+import sys
+from sqlalchemy.util import await_only, greenlet_spawn
+from apiAlchemy import create_api
+from modelsAlchemy import db
+
+def read_body(receive) -> bytes:
+    """Body of the request, read from the ASGI messages (a coroutine).
+    """
+    async def read() -> bytes:
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                return bytes(body)
+    return read()
+
+def wsgi_environ(scope: dict, body: bytes) -> dict:
+    """WSGI environ of an ASGI http scope.
+    """
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+        "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+class AsgiApp:
+    """ASGI application that runs a Flask app in a greenlet per request"""
+
+    def __init__(self, api):
+        self.api = api
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            body = await read_body(receive)
+            await greenlet_spawn(self.handle, scope, body, send)
+
+    def handle(self, scope: dict, body: bytes, send) -> None:
+        """Runs the request in the app and sends its answer, chunk by chunk
+        for the streamed ones. Runs in a greenlet: the statements and the
+        sends wait on the event loop.
+        """
+        started = {}
+
+        def start_response(status, headers, exc_info = None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1"))\
+                for name, value in headers]
+
+        chunks = self.api(wsgi_environ(scope, body), start_response)
+        try:
+            #The previous chunk is held back to send the last one with more_body False
+            previous = None
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if previous is None:
+                    await_only(send({"type": "http.response.start", **started}))
+                else:
+                    await_only(send({"type": "http.response.body", "body": previous, "more_body": True}))
+                previous = chunk
+            if previous is None:
+                await_only(send({"type": "http.response.start", **started}))
+            await_only(send({"type": "http.response.body", "body": previous or b""}))
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    async def lifespan(self, receive, send) -> None:
+        """Closes the connections of the pools on shutdown.
+        """
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await greenlet_spawn(self.dispose)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def dispose(self) -> None:
+        with self.api.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+
+def create_asgi(config: dict = None) -> AsgiApp:
+    """Builds the app with create_api() on the async drivers of its databases.
+
+    Args:
+        config: settings that override the defaults and the CATALOG_ variables
+    Returns:
+        the ASGI application, its Flask app is in .api
+    """
+    return AsgiApp(create_api({**(config or {}), "DB_ASYNC_DRIVER": True}))
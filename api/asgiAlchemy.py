@@ -0,0 +1,11 @@
+"""REID
+   Run the API in the ASGI mode
+
+   Importing this module only builds the app, like initAlchemy, here on
+   the async driver of the database (see asgi.py):
+       uvicorn --app-dir api asgiAlchemy:app --workers 4
+   The schema and the example data are set up with the CLI of initAlchemy.
+"""
+from asgi import create_asgi
+
+app = create_asgi()
@@ -0,0 +1,176 @@
+"""REID
+   HTTP caching of the GET answers
+
+   Every cached answer has a strong ETag, the hash of its body, so a
+   client sending If-None-Match gets a 304 without the view being called.
+   There is no Last-Modified: the times of the cache are the ones of the
+   writes seen by this process, not of the data, so another worker would
+   answer If-Modified-Since with a 304 for rows changed by a write it did
+   not see. The answer of a row has its version before the hash, e.g.
+   "3-5f2a...", the tag that If-Match of a PATCH gives back. The answers
+   are kept by path, query and format
+   and tagged with the resources they show, and the writes invalidate
+   the tags they change.
+
+   The cache lives in each process: the writes of another worker are only
+   seen when RESPONSE_CACHE_TTL expires. The reads of a client that has
+   just written go to the primary database and skip the cache.
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import threading
+import time
+
+from flask import current_app, request, Response
+from streaming import stream_requested
+from routing import after_own_write
+import status
+
+class CacheEntry:
+    """A serialized answer and its validators"""
+
+    def __init__(self, body: bytes, mimetype: str, code: int, tags: tuple,\
+        last_modified: float, etag: str = None) -> None:
+        self.body = body
+        self.mimetype = mimetype
+        self.code = code
+        self.tags = tags
+        self.etag = etag or hashlib.sha1(body).hexdigest()
+        self.last_modified = last_modified
+        self.created = time.monotonic()
+
+class ResponseCache:
+    """LRU cache of answers with invalidation by tag"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = None) -> None:
+        """
+        Args:
+            max_entries: number of answers kept.
+            ttl: seconds an answer is kept (None: until invalidated).
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.keys_by_tag = {}
+        # Time of the last change of every tag
+        self.modified = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """Uses this cache for the cached views of an app.
+        """
+        app.extensions["response_cache"] = self
+
+    def last_modified(self, tags: tuple) -> float:
+        """Last time a resource with one of the tags was invalidated in this
+        process, only used to not store answers older than a write.
+        """
+        with self.lock:
+            return max([self.modified.get(tag, self.started) for tag in tags], default = self.started)
+
+    def get(self, key: tuple) -> CacheEntry:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl is not None and time.monotonic() - entry.created > self.ttl:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: CacheEntry) -> None:
+        with self.lock:
+            # Not stored if the resource changed while it was serialized
+            if any(self.modified.get(tag, self.started) > entry.last_modified for tag in entry.tags):
+                return
+            self._remove(key)
+            self.entries[key] = entry
+            for tag in entry.tags:
+                self.keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def invalidate(self, *tags: str) -> None:
+        """Removes the answers that show any of the tags.
+
+        Args:
+            tags: e.g. "pieces" for the lists or "piece:3" for a piece.
+        """
+        now = time.time()
+        with self.lock:
+            for tag in tags:
+                self.modified[tag] = now
+                for key in list(self.keys_by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_tag.clear()
+            self.started = time.time()
+
+    def _remove(self, key: tuple) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+
+def invalidate(*tags: str) -> None:
+    """Invalidates tags in the cache of the current app, if there is one.
+    """
+    cache = current_app.extensions.get("response_cache")
+    if cache is not None:
+        cache.invalidate(*tags)
+
+def version_etag(response: Response, version: int) -> Response:
+    """Sets the ETag of the answer of a row: its version, then the hash of
+    the body so that every format and field set has its own tag.
+    """
+    response.set_etag(f"{version}-{hashlib.sha1(response.get_data()).hexdigest()}")
+    return response
+
+def answer(entry: CacheEntry) -> Response:
+    """Builds the answer of a cache entry, a 304 if the client has it.
+    """
+    response = Response(entry.body, status = entry.code, mimetype = entry.mimetype)
+    response.set_etag(entry.etag)
+    response.vary.add("Content-Type")
+    return response.make_conditional(request)
+
+def cached(*tags: str):
+    """Decorator for the GET views whose answer can be cached.
+
+    Args:
+        tags: resources shown by the view, formatted with its arguments,
+            e.g. "piece:{id}".
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            cache = current_app.extensions.get("response_cache")
+            if cache is None or stream_requested() or after_own_write():
+                return view(**kwargs)
+
+            key = (request.script_root, request.path, request.query_string, request.content_type)
+            entry = cache.get(key)
+            if entry is None:
+                entry_tags = tuple(tag.format(**kwargs) for tag in tags)
+                last_modified = cache.last_modified(entry_tags)
+                response = current_app.make_response(view(**kwargs))
+                if response.is_streamed or not status.is_success(response.status_code):
+                    return response
+                entry = CacheEntry(response.get_data(), response.mimetype, response.status_code,\
+                    entry_tags, last_modified, response.get_etag()[0])
+                cache.put(key, entry)
+            return answer(entry)
+        return wrapper
+    return decorator
@@ -0,0 +1,130 @@
+"""REID
+   Commands of the flask CLI
+
+   The schema and the example data are set up with these commands instead
+   of on every start:
+
+       flask --app initAlchemy migrate        apply the pending migrations
+       flask --app initAlchemy migrations     show the applied and pending ones
+       flask --app initAlchemy seed           add the missing example data
+       flask --app initAlchemy routes         show the URL map
+       flask --app initAlchemy sync-replica   copy a SQLite primary to its replica
+
+   and a table is exported or imported as NDJSON or CSV with
+
+       flask --app initAlchemy export pieces -o pieces.csv
+       flask --app initAlchemy import pieces pieces.csv
+"""
+
+import contextlib
+import sys
+import click
+from flask.cli import with_appcontext
+from modelsAlchemy import db
+from seed import seed
+import migrations
+import routing
+import transfer
+
+def migrate_database(target: int = None) -> list:
+    """Applies the pending migrations of the database of the current app.
+
+    Returns:
+        list of (version, description) applied
+    """
+    return migrations.upgrade(db.engine, target)
+
+@click.command("migrate")
+@click.option("--target", type = int, default = None, help = "Last version to apply.")
+@with_appcontext
+def migrate_command(target: int) -> None:
+    """Apply the pending migrations."""
+    applied = migrate_database(target)
+    for version, description in applied:
+        click.echo(f"Migration {version}: {description}")
+    if not applied:
+        click.echo("The database is up to date")
+
+@click.command("migrations")
+@with_appcontext
+def migrations_command() -> None:
+    """Show the version of the database and the pending migrations."""
+    with db.engine.connect() as connection:
+        click.echo(f"Version {migrations.current_version(connection)}")
+        for migration in migrations.pending(connection):
+            click.echo(f"Pending {migration.VERSION}: {migration.DESCRIPTION}")
+
+@click.command("seed")
+@with_appcontext
+def seed_command() -> None:
+    """Add the example studios, pieces and evaluations that are missing."""
+    added = seed()
+    click.echo(", ".join(f"{count} {name}" for name, count in added.items()) + " added")
+
+def open_text(path: str, mode: str):
+    """File to read or write as UTF-8 without changing the line ends, as the
+    CSV module needs, or the standard input or output for -.
+    """
+    if path == "-":
+        return contextlib.nullcontext(sys.stdin if mode == "r" else sys.stdout)
+    return open(path, mode, encoding = "utf-8", newline = "")
+
+@click.command("export")
+@click.argument("table", type = click.Choice(list(transfer.TABLES)))
+@click.option("--output", "-o", default = "-", help = "File to write, the standard output by default.")
+@click.option("--format", "format", type = click.Choice(list(transfer.MIMETYPES)), default = None,\
+    help = "Default csv if the file ends with .csv, else ndjson.")
+@with_appcontext
+def export_command(table: str, output: str, format: str) -> None:
+    """Export all the rows of a table."""
+    model, after_insert = transfer.TABLES[table]
+    with open_text(output, "w") as file:
+        report = transfer.export_file(model, transfer.format_of(output, format), file)
+    click.echo(f"{report['rows']} {table} exported in {report['seconds']} s "
+        f"({report['rows_per_second']} rows/s)", err = True)
+
+@click.command("import")
+@click.argument("table", type = click.Choice(list(transfer.TABLES)))
+@click.argument("input", default = "-")
+@click.option("--format", "format", type = click.Choice(list(transfer.MIMETYPES)), default = None,\
+    help = "Default csv if the file ends with .csv, else ndjson.")
+@click.option("--batch", type = int, default = transfer.IMPORT_BATCH_ROWS,\
+    help = "Rows written and committed at once.")
+@with_appcontext
+def import_command(table: str, input: str, format: str, batch: int) -> None:
+    """Add the valid rows of a NDJSON or CSV file (the standard input by default) to a table."""
+    with open_text(input, "r") as file:
+        report = transfer.import_file(table, transfer.format_of(input, format), file, batch)
+    for error in report["errors"]:
+        click.echo(f"Line {error['line']}: {error['message']}", err = True)
+    click.echo(f"{report['inserted']} of {report['rows']} {table} imported, {report['rejected']} rejected, "
+        f"in {report['seconds']} s ({report['rows_per_second']} rows/s)")
+
+@click.command("sync-replica")
+@with_appcontext
+def sync_replica_command() -> None:
+    """Copy the primary SQLite database to the SQLite replica (local setup)."""
+    primary = db.engines[None]
+    replica = db.engines.get(routing.REPLICA)
+    if replica is None:
+        raise click.ClickException("DATABASE_REPLICA_URI is not set")
+    if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+        raise click.ClickException("Only a SQLite replica is copied, other databases replicate themselves")
+    source = primary.raw_connection()
+    target = replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        target.close()
+        source.close()
+    click.echo(f"{primary.url.database} copied to {replica.url.database}")
+
+def init_app(app) -> None:
+    """Adds the commands to the CLI of an app.
+    """
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(migrations_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(import_command)
+    app.cli.add_command(sync_replica_command)
@@ -0,0 +1,180 @@
+"""REID
+   Compression of the answers negotiated with Accept-Encoding
+
+   The answers of a compressible type over COMPRESSION_MIN_SIZE bytes are
+   sent with brotli (when the brotli package is installed) or gzip, the
+   best one accepted by the client. The streamed answers are compressed
+   chunk by chunk, every chunk flushed so the client reads the rows as
+   they come. COMPRESSION_ENDPOINTS turns it off (or on) by endpoint.
+
+   A compressed answer has a weak ETag, as its bytes are not the ones
+   hashed by the cache, and the compressed bodies of the cached answers
+   are kept by ETag so a hit is not compressed again.
+"""
+
+from collections import OrderedDict
+import threading
+import time
+import zlib
+
+from flask import request, Response
+from metrics import Counter, Histogram
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Types worth compressing, without parameters
+COMPRESSIBLE = ("application/json", "application/xml", "application/x-ndjson", "text/csv", "text/plain",\
+    "application/msgpack", "application/cbor")
+# Compressed size / size
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0)
+# Compressed bodies of the cached answers kept by ETag
+ENCODED_ENTRIES = 256
+
+class Gzip:
+    """gzip with zlib, the output of compress is flushed"""
+
+    def __init__(self, level: int) -> None:
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush()
+
+class Brotli:
+    """brotli, the output of compress is flushed"""
+
+    def __init__(self, quality: int) -> None:
+        self.compressor = brotli.Compressor(quality = quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self.compressor.process(data) + self.compressor.finish()
+
+class Compression:
+    """Compression of the answers of an app"""
+
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,\
+        endpoints: dict = None) -> None:
+        """
+        Args:
+            min_size: bytes under which an answer is sent as it is.
+            gzip_level: 1 (fastest) to 9 (smallest).
+            brotli_quality: 0 (fastest) to 11 (smallest).
+            endpoints: endpoint (e.g. pieces.all_pieces) -> compressed or
+                not, the others are compressed.
+        """
+        self.min_size = min_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+        self.encoders = {"gzip": Gzip}
+        if brotli is not None:
+            self.encoders = {"br": Brotli, "gzip": Gzip}
+        self.endpoints = endpoints or {}
+        self.encoded = OrderedDict()
+        self.lock = threading.Lock()
+        self.bytes_in = self.bytes_out = self.cpu_seconds = self.ratio = None
+
+    def init_app(self, app) -> None:
+        """Compresses the answers of an app, and adds the compression to its
+        metrics if they are enabled. Its after_request hook has to be
+        registered right after the one of the metrics, so it runs before it.
+        """
+        app.extensions["compression"] = self
+        metrics = app.extensions.get("metrics")
+        if metrics is not None:
+            labels = ("endpoint", "encoding")
+            self.bytes_in = metrics.add(Counter("catalog_compression_input_bytes_total",\
+                "Bytes of the answers before compression", labels))
+            self.bytes_out = metrics.add(Counter("catalog_compression_output_bytes_total",\
+                "Bytes of the answers after compression", labels))
+            self.cpu_seconds = metrics.add(Counter("catalog_compression_cpu_seconds_total",\
+                "CPU time spent compressing", labels))
+            self.ratio = metrics.add(Histogram("catalog_compression_ratio",\
+                "Compressed size over size of every answer", labels, RATIO_BUCKETS))
+        app.after_request(self.after_request)
+
+    def encoding(self, response: Response) -> str:
+        """Encoding of the answer, None if it is sent as it is.
+        """
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else ""
+        if not self.endpoints.get(endpoint, True) or response.direct_passthrough\
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE\
+            or response.status_code < 200 or response.status_code in (204, 304):
+            return None
+        response.vary.add("Accept-Encoding")
+        if not response.is_streamed and (response.calculate_content_length() or 0) < self.min_size:
+            return None
+        return request.accept_encodings.best_match(list(self.encoders))
+
+    def after_request(self, response: Response) -> Response:
+        encoding = self.encoding(response)
+        if encoding is None:
+            return response
+        labels = (request.url_rule.endpoint if request.url_rule is not None else "", encoding)
+        etag, weak = response.get_etag()
+        if response.is_streamed:
+            response.response = self.compressed(response.iter_encoded(), encoding, labels)
+        else:
+            response.set_data(self.compress(response.get_data(), encoding, labels, etag if not weak else None))
+        response.headers["Content-Encoding"] = encoding
+        if etag is not None:
+            response.set_etag(etag, weak = True)
+        return response
+
+    def compress(self, body: bytes, encoding: str, labels: tuple, etag: str = None) -> bytes:
+        """Compressed body of an answer, kept by ETag when it has a strong one.
+        """
+        if etag is not None:
+            with self.lock:
+                encoded = self.encoded.get((etag, encoding))
+                if encoded is not None:
+                    self.encoded.move_to_end((etag, encoding))
+                    return encoded
+        start = time.thread_time()
+        encoder = self.encoders[encoding](self.levels[encoding])
+        encoded = encoder.finish(body)
+        self.observe(labels, len(body), len(encoded), time.thread_time() - start)
+        if etag is not None:
+            with self.lock:
+                self.encoded[(etag, encoding)] = encoded
+                while len(self.encoded) > ENCODED_ENTRIES:
+                    self.encoded.popitem(last = False)
+        return encoded
+
+    def compressed(self, chunks, encoding: str, labels: tuple):
+        """Compresses the chunks of a streamed answer, each one flushed.
+        """
+        encoder = self.encoders[encoding](self.levels[encoding])
+        size = encoded_size = 0
+        cpu = 0.0
+        try:
+            for chunk in chunks:
+                start = time.thread_time()
+                encoded = encoder.compress(chunk)
+                cpu += time.thread_time() - start
+                size += len(chunk)
+                encoded_size += len(encoded)
+                if encoded:
+                    yield encoded
+            start = time.thread_time()
+            encoded = encoder.finish()
+            cpu += time.thread_time() - start
+            encoded_size += len(encoded)
+            yield encoded
+        finally:
+            self.observe(labels, size, encoded_size, cpu)
+
+    def observe(self, labels: tuple, size: int, encoded_size: int, cpu: float) -> None:
+        if self.bytes_in is None:
+            return
+        self.bytes_in.inc(labels, size)
+        self.bytes_out.inc(labels, encoded_size)
+        self.cpu_seconds.inc(labels, cpu)
+        if size:
+            self.ratio.observe(labels, encoded_size / size)
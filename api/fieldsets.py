@@ -0,0 +1,45 @@
+"""REID
+   Sparse fieldsets of the GET answers
+
+   ?fields=piece_name,date limits the resources of an answer to those
+   fields (their JSON keys, which are also their XML tags) and the query
+   to their columns with load_only, so the other columns are neither read
+   nor sent. The id and the url of a resource are always sent.
+"""
+
+from flask import request
+from flask_restful import abort
+from sqlalchemy.orm import load_only
+import status
+
+def requested_fields(model) -> tuple:
+    """Fields of the model asked with ?fields=, in the order of its codec.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+
+    Returns:
+        tags of the fields with the id, None when every field is sent
+    """
+    value = request.args.get("fields")
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(model.xml_codec.fields) - {"url"}
+    if unknown:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Fields {', '.join(sorted(unknown))} not valid!")
+    return tuple(tag for tag in model.xml_codec.fields if tag in names or tag == "id")
+
+def only_fields(query, model, fields: tuple, *keys):
+    """Query that loads only the columns of some fields.
+
+    Args:
+        fields: from requested_fields, None loads every column.
+        keys: other columns read by the view, e.g. the ones of its cursor.
+    """
+    if fields is None:
+        return query
+    columns = {}
+    for column in [getattr(model, model.xml_codec.fields[tag]) for tag in fields] + list(keys):
+        columns[column.key] = column
+    return query.options(load_only(*columns.values()))
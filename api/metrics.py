@@ -0,0 +1,195 @@
+"""REID
+   Metrics of the requests in the Prometheus text format
+
+   Every request is counted by endpoint, method, format (the content type
+   of the request) and status, and its latency and answer size are kept in
+   histograms with fixed buckets. Recording a request is a bisect and a few
+   additions under a lock, so the metrics can stay on. GET /metrics shows
+   them in the text format read by Prometheus.
+
+   The metrics live in each process, like the answer cache: with many
+   workers every one of them has to be scraped.
+"""
+
+from bisect import bisect_left
+import threading
+import time
+
+from flask import current_app, g, request, Response
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+FORMATS = {
+    "application/json": "json",
+    "application/xml": "xml",
+    "application/msgpack": "msgpack",
+    "application/cbor": "cbor",
+}
+
+def label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+class Counter:
+    """Counter by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in values.items():
+            yield f"{self.name}{render_labels(self.labels, labels)} {value}"
+
+class Gauge(Counter):
+    """Value by labels that goes up and down"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()) -> None:
+        super().__init__(name, help, labels)
+        if not labels:
+            self.values[()] = 0
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+class Histogram:
+    """Histogram by labels with fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple, buckets: tuple) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count of every bucket and +Inf, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = {labels: list(counts) for labels, counts in self.values.items()}
+        bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for labels, counts in values.items():
+            total = 0
+            for bound, count in zip(bounds, counts):
+                total += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{render_labels(self.labels, labels, le)} {total}"
+            yield f"{self.name}_sum{render_labels(self.labels, labels)} {counts[-1]}"
+            yield f"{self.name}_count{render_labels(self.labels, labels)} {total}"
+
+class Metrics:
+    """Metrics of the requests of an app"""
+
+    def __init__(self, prefix: str = "catalog") -> None:
+        self.metrics = []
+        self.requests = self.add(Counter(f"{prefix}_requests_total",\
+            "Requests by endpoint, method, format and status",\
+            ("endpoint", "method", "format", "status")))
+        self.latency = self.add(Histogram(f"{prefix}_request_duration_seconds",\
+            "Time to build and send the answer", ("endpoint", "method", "format"), LATENCY_BUCKETS))
+        self.sizes = self.add(Histogram(f"{prefix}_response_size_bytes",\
+            "Size of the body of the answers", ("endpoint", "method", "format"), SIZE_BUCKETS))
+        self.in_progress = self.add(Gauge(f"{prefix}_requests_in_progress",\
+            "Requests being answered"))
+
+    def add(self, metric):
+        """Adds a metric to the ones shown by /metrics.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def init_app(self, app) -> None:
+        """Records the requests of an app and adds the /metrics route.
+        Its after_request hook has to be the first one registered, so it
+        runs the last and sees the final answer.
+        """
+        app.extensions["metrics"] = self
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule("/metrics", "metrics", self.view, methods = ["GET"])
+
+    def before_request(self) -> None:
+        g.metrics_start = time.perf_counter()
+        self.in_progress.inc()
+
+    def after_request(self, response: Response) -> Response:
+        start = g.pop("metrics_start", None)
+        if start is None:
+            return response
+        endpoint = request.url_rule.endpoint if request.url_rule is not None else ""
+        if endpoint == "metrics":
+            self.in_progress.dec()
+            return response
+        labels = (endpoint, request.method, FORMATS.get(request.content_type,\
+            "none" if request.content_type is None else "other"))
+        if response.is_streamed:
+            # Recorded when the last chunk is sent
+            response.response = self.counted(response.iter_encoded(), labels, response.status_code, start)
+        else:
+            self.observe(labels, response.status_code, start, response.calculate_content_length() or 0)
+        return response
+
+    def counted(self, chunks, labels: tuple, code: int, start: float):
+        """Sends the chunks of a streamed answer and records it at the end.
+        """
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(labels, code, start, size)
+
+    def observe(self, labels: tuple, code: int, start: float, size: int) -> None:
+        self.requests.inc(labels + (code,))
+        self.latency.observe(labels, time.perf_counter() - start)
+        self.sizes.observe(labels, size)
+        self.in_progress.dec()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def view(self):
+        return Response(self.render(), content_type = "text/plain; version=0.0.4; charset=utf-8")
+
+def current_metrics() -> Metrics:
+    """Metrics of the current app, None if they are disabled.
+    """
+    return current_app.extensions.get("metrics")
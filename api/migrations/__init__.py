@@ -0,0 +1,85 @@
+"""REID
+   Versioned migrations of the database schema
+
+   Every migration is a module with a VERSION, a DESCRIPTION and an
+   upgrade(connection) function. The versions applied are kept in the
+   schema_version table, so upgrade() only runs the pending ones, each in
+   its own transaction. The migrations never drop data, and the first one
+   also adopts a database created before they existed by create_all.
+
+   A new migration is a new module added at the end of MIGRATIONS. The
+   models have to describe the same schema, since the benchmarks build
+   throwaway databases with create_all.
+"""
+
+import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, select, text
+from migrations import v0001_initial, v0002_filter_indexes, v0003_piece_rating_stats, v0004_row_versions,\
+    v0005_piece_date_index
+
+MIGRATIONS = [
+    v0001_initial,
+    v0002_filter_indexes,
+    v0003_piece_rating_stats,
+    v0004_row_versions,
+    v0005_piece_date_index,
+]
+
+# Key of the PostgreSQL advisory lock taken while migrating
+LOCK_KEY = 2022121601
+
+metadata = MetaData()
+schema_version = Table("schema_version", metadata,
+    Column("version", Integer, primary_key = True),
+    Column("description", String(250), nullable = False),
+    Column("applied_at", DateTime, nullable = False),
+)
+
+def current_version(connection) -> int:
+    """Last version applied, 0 for a database without migrations.
+    """
+    if not connection.dialect.has_table(connection, "schema_version"):
+        return 0
+    return connection.scalar(select(func.max(schema_version.c.version))) or 0
+
+def pending(connection) -> list:
+    """Migrations not applied yet, in order.
+    """
+    version = current_version(connection)
+    return [migration for migration in MIGRATIONS if migration.VERSION > version]
+
+def upgrade(engine, target: int = None) -> list:
+    """Applies the pending migrations up to a version.
+
+    Args:
+        engine: engine of the database.
+        target: last version to apply, None for all of them.
+
+    Returns:
+        list of (version, description) applied
+    """
+    applied = []
+    with engine.connect() as connection:
+        locked = connection.dialect.name == "postgresql"
+        if locked:
+            # Only one process migrates at once, the others wait and find nothing to do
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": LOCK_KEY})
+            connection.commit()
+        try:
+            with connection.begin():
+                metadata.create_all(connection, checkfirst = True)
+                migrations = pending(connection)
+            for migration in migrations:
+                if target is not None and migration.VERSION > target:
+                    break
+                with connection.begin():
+                    migration.upgrade(connection)
+                    connection.execute(insert(schema_version).values(version = migration.VERSION,\
+                        description = migration.DESCRIPTION, applied_at = datetime.datetime.now()))
+                applied.append((migration.VERSION, migration.DESCRIPTION))
+        finally:
+            if locked:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": LOCK_KEY})
+                connection.commit()
+    return applied
@@ -0,0 +1,52 @@
+"""REID
+   Migration 1: studios, pieces, evaluations, the studio counters and the
+   search index of the evaluations
+
+   The tables are only created if they do not exist, so a database made
+   by create_all before the migrations is adopted as it is.
+"""
+
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, MetaData, String, Table, text
+import search
+
+VERSION = 1
+DESCRIPTION = "Studios, pieces, evaluations, studio piece counts and text search"
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    Table("studios", metadata,
+        Column("id", Integer, primary_key = True),
+        Column("name", String(250), unique = True, nullable = False),
+        Column("email", String(250), unique = True, nullable = False),
+        Column("phone", String(250), unique = True, nullable = False),
+    )
+    Table("pieces", metadata,
+        Column("id", Integer, primary_key = True),
+        Column("name", String(250), unique = True, nullable = False),
+        Column("date", Date, nullable = False),
+        Column("author", String(250), nullable = False),
+        Column("genre", String(250), nullable = False),
+        Column("nationality", String(250), nullable = False),
+        Column("studio", Integer, ForeignKey("studios.id")),
+        Column("summary", String(250)),
+    )
+    Table("evaluations", metadata,
+        Column("id", Integer, primary_key = True),
+        Column("piece", Integer, ForeignKey("pieces.id", ondelete = "CASCADE")),
+        Column("note", Integer, nullable = False),
+        Column("date", Date, nullable = False),
+        Column("text", String(250), nullable = False),
+        Index("ix_evaluations_piece_date", "piece", "date"),
+    )
+    Table("studio_piece_counts", metadata,
+        Column("studio", Integer, ForeignKey("studios.id"), primary_key = True),
+        Column("count", Integer, nullable = False, default = 0),
+    )
+    metadata.create_all(connection, checkfirst = True)
+
+    search.install(connection)
+
+    # The counters of the pieces that already exist
+    connection.execute(text("DELETE FROM studio_piece_counts"))
+    connection.execute(text("INSERT INTO studio_piece_counts (studio, count) "
+        "SELECT studio, count(id) FROM pieces WHERE studio IS NOT NULL GROUP BY studio"))
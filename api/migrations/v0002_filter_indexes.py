@@ -0,0 +1,19 @@
+"""REID
+   Migration 2: indexes of the filters
+
+   The evaluations are also filtered only by date, and the pieces are
+   counted and listed by studio. The evaluations of a piece already use
+   ix_evaluations_piece_date, whose first column is the piece.
+"""
+
+from sqlalchemy import Column, Date, Index, Integer, MetaData, Table
+
+VERSION = 2
+DESCRIPTION = "Indexes on evaluations.date and pieces.studio"
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    evaluations = Table("evaluations", metadata, Column("date", Date))
+    pieces = Table("pieces", metadata, Column("studio", Integer))
+    Index("ix_evaluations_date", evaluations.c.date).create(connection, checkfirst = True)
+    Index("ix_pieces_studio", pieces.c.studio).create(connection, checkfirst = True)
@@ -0,0 +1,30 @@
+"""REID
+   Migration 3: number, sum and histogram of the notes of every piece
+
+   The stats of the evaluations that already exist are computed once here,
+   then the writes of evaluations keep them up to date.
+"""
+
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, Table, text
+
+VERSION = 3
+DESCRIPTION = "Piece rating stats"
+
+NOTES = range(1, 6)
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    Table("pieces", metadata, Column("id", Integer, primary_key = True))
+    Table("piece_rating_stats", metadata,
+        Column("piece", Integer, ForeignKey("pieces.id", ondelete = "CASCADE"), primary_key = True),
+        Column("count", Integer, nullable = False, default = 0),
+        Column("total", Integer, nullable = False, default = 0),
+        *[Column(f"note_{note}", Integer, nullable = False, default = 0) for note in NOTES],
+    )
+    metadata.tables["piece_rating_stats"].create(connection, checkfirst = True)
+
+    histogram = ", ".join(f"note_{note}" for note in NOTES)
+    counts = ", ".join(f"sum(CASE WHEN note = {note} THEN 1 ELSE 0 END)" for note in NOTES)
+    connection.execute(text("DELETE FROM piece_rating_stats"))
+    connection.execute(text(f"INSERT INTO piece_rating_stats (piece, count, total, {histogram}) "
+        f"SELECT piece, count(id), sum(note), {counts} FROM evaluations WHERE piece IS NOT NULL GROUP BY piece"))
@@ -0,0 +1,21 @@
+"""REID
+   Migration 4: version of the pieces, studios and evaluations
+
+   Every update of a row adds 1 to its version, which a PATCH compares with
+   its If-Match. The rows that already exist start at version 1.
+"""
+
+from sqlalchemy import inspect, text
+
+VERSION = 4
+DESCRIPTION = "Row versions"
+
+TABLES = ("pieces", "studios", "evaluations")
+
+def upgrade(connection) -> None:
+    inspector = inspect(connection)
+    for table in TABLES:
+        #A database created by create_all already has the column
+        if "version" in [column["name"] for column in inspector.get_columns(table)]:
+            continue
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
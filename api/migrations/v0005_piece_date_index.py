@@ -0,0 +1,17 @@
+"""REID
+   Migration 5: index of the evaluations of a piece
+
+   Migration 1 declares ix_evaluations_piece_date on the evaluations
+   table, and create_all skips it with the table when the database was
+   made before the migrations, so an adopted database did not have it.
+"""
+
+from sqlalchemy import Column, Date, Index, Integer, MetaData, Table
+
+VERSION = 5
+DESCRIPTION = "Index on evaluations.piece and evaluations.date"
+
+def upgrade(connection) -> None:
+    metadata = MetaData()
+    evaluations = Table("evaluations", metadata, Column("piece", Integer), Column("date", Date))
+    Index("ix_evaluations_piece_date", evaluations.c.piece, evaluations.c.date).create(connection, checkfirst = True)
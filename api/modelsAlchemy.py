@@ -2,16 +2,84 @@
    Pieces, Studios and Evaluations tables in sqlAlchemy
 """
 
+import datetime
 import flask_sqlalchemy
-from flask import url_for
-import xmltodict
-
-db = flask_sqlalchemy.SQLAlchemy()
+from urls import build_url
+from collections import Counter
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import validates
+from xmlcodec import XmlCodec
+from routing import RoutingSession
+
+db = flask_sqlalchemy.SQLAlchemy(session_options = {"class_": RoutingSession})
+
+# Dialect -> INSERT with ON CONFLICT
+UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def add_to_row(model, key, id: int, deltas: dict, values: dict) -> None:
+    """Adds deltas to the columns of a row of counters, or inserts it with
+    some values if it does not exist, in one INSERT ... ON CONFLICT DO
+    UPDATE so two first writes of the same row do not both insert it.
+    Other databases run an UPDATE and then the INSERT if no row changed.
+
+    Args:
+        model: table of counters.
+        key: primary key column.
+        id: value of the key.
+        deltas: column -> number added.
+        values: column -> value of a new row.
+    """
+    increments = {column: getattr(model, column) + delta for column, delta in deltas.items()}
+    upsert = UPSERTS.get(db.session.connection().dialect.name)
+    if upsert is not None:
+        db.session.execute(upsert(model).values({key.key: id, **values})\
+            .on_conflict_do_update(index_elements = [key], set_ = increments))
+        return
+    updated = db.session.execute(update(model).where(key == id).values(increments))
+    if updated.rowcount == 0:
+        db.session.execute(insert(model).values({key.key: id, **values}))
+
+def to_date(value):
+    """Converts a YYYY-MM-DD string to a date, as not every database
+    (e.g. SQLite) accepts strings in a date column. Any other value is
+    left to the database.
+    """
+    if isinstance(value, str):
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            pass
+    #A native date of MessagePack or CBOR may come with a time
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+def json_date(value):
+    """Date of a JSON object, a YYYY-MM-DD string or a native date of the
+    binary representations.
+    """
+    if isinstance(value, datetime.date):
+        return to_date(value)
+    return to_date(value.rstrip().lower())
+
+def sparse_json(obj, url: str, fields: tuple) -> dict:
+    """JSON of the url and some fields of a row.
+
+    Args:
+        fields: tags of the xml_codec of the model, which are also the JSON keys.
+    """
+    resource = {"url": url}
+    for tag in fields:
+        resource[tag] = getattr(obj, obj.xml_codec.fields[tag])
+    return resource
 
 class Pieces(db.Model):
     """This class models all the columns needed in the table Pieces"""
     #Table name and columns
     __tablename__ = 'pieces'
+    #The pieces of a studio are counted and listed
+    __table_args__ = (db.Index("ix_pieces_studio", "studio"),)
     id = db.Column(db.Integer, primary_key = True)
     name = db.Column(db.String(250), unique = True, nullable = False)
     date = db.Column(db.Date, nullable = False)
@@ -20,6 +88,16 @@ class Pieces(db.Model):
     nationality = db.Column(db.String(250), nullable = False)
     studio = db.Column(db.Integer, db.ForeignKey("studios.id"))
     summary = db.Column(db.String(250))
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1")
+    #Only read when it is loaded with the piece (joinedload)
+    rating = db.relationship("PieceRatingStats", uselist = False, viewonly = True, lazy = "raise")
+    #Every update of a row adds 1 to its version, see If-Match in the PATCH
+    __mapper_args__ = {"version_id_col": version}
+
+    endpoint = "pieces.get_piece"
+    xml_codec = XmlCodec("Piece", "Pieces", {"id": "id", "piece_name": "name", "date": "date",\
+        "author": "author", "genre": "genre", "nationality": "nationality", "studio": "studio",\
+        "summary": "summary"})
 
     def __init__(self, name: str, date: str, author: str, genre:str, nationality: str,\
         studio: int, summary: str) -> None:
@@ -43,22 +121,57 @@ class Pieces(db.Model):
         self.studio = studio
         self.summary = summary
 
-    def to_json(self) -> dict:
+    @validates("date")
+    def validate_date(self, key: str, value):
+        """Dates are stored as dates"""
+        return to_date(value)
+
+    def to_json(self, url: str = None, fields: tuple = None) -> dict:
         """From piece to JSON
+
+        Args:
+            url: url of the piece, built from its id if it is not given.
+            fields: fields written (default all), see fieldsets.py.
         """
-        resource = {
-            "url": url_for("pieces.get_piece", id = self.id),
-            "id": self.id,
-            "piece_name": self.name,
-            "date": self.date,
-            "author": self.author,
-            "genre": self.genre,
-            "nationality": self.nationality,
-            "studio": self.studio,
-            "summary": self.summary
-        }
+        if url is None:
+            url = build_url(Pieces.endpoint, self.id)
+        if fields is not None:
+            resource = sparse_json(self, url, fields)
+        else:
+            resource = {
+                "url": url,
+                "id": self.id,
+                "piece_name": self.name,
+                "date": self.date,
+                "author": self.author,
+                "genre": self.genre,
+                "nationality": self.nationality,
+                "studio": self.studio,
+                "summary": self.summary
+            }
+        #The rating is an optional field, written when it was loaded
+        if "rating" in self.__dict__:
+            resource["rating"] = PieceRatingStats.json_of(self.rating)
         return resource
 
+    @staticmethod
+    def json_values(item: dict) -> dict:
+        """Column values of a piece from one JSON object.
+
+        Args:
+            item: one object of the input JSON.
+        """
+        #all lower
+        return {
+            "name": item.get("piece_name").rstrip().lower(),
+            "date": json_date(item.get("date")),
+            "author": item.get("author").rstrip().lower(),
+            "genre": item.get("genre").rstrip().lower(),
+            "nationality": item.get("nationality").rstrip().lower(),
+            "studio": item.get("studio"),
+            "summary": item.get("summary").rstrip().lower()
+        }
+
     @staticmethod
     def from_json(data: list) -> None:
         """From JSON to piece.
@@ -67,103 +180,62 @@ class Pieces(db.Model):
             data: input JSON.
         """
         try:
-            #all lower
-            name = data[0].get("piece_name").rstrip().lower()
-            date = data[0].get("date").rstrip().lower()
-            author = data[0].get("author").rstrip().lower()
-            genre = data[0].get("genre").rstrip().lower()
-            nationality = data[0].get("nationality").rstrip().lower()
-            studio = data[0].get("studio")
-            summary = data[0].get("summary").rstrip().lower()
-
-            return Pieces(name, date, author, genre, nationality, studio, summary)
+            return Pieces(**Pieces.json_values(data[0]))
         
-        except KeyError:
+        except (KeyError, AttributeError):
             return None
 
         except IndexError:
             return None
 
-    def to_xml(self) -> str:
+    def to_xml(self, url: str = None, fields: tuple = None) -> str:
         """From piece to XML.
+
+        Args:
+            url: url of the piece, built from its id if it is not given.
+            fields: fields written (default all), see fieldsets.py.
         """
-        xml_data = f"""
-        <Piece>
-            <uri>{url_for("pieces.get_piece", id = self.id)}</uri>
-            <id>{self.id}</id>
-            <piece_name>{self.name}</piece_name>
-            <date>{self.date}</date>
-            <author>{self.author}</author>
-            <genre>{self.genre}</genre>
-            <nationality>{self.nationality}</nationality>
-            <studio>{self.studio}</studio>
-            <summary>{self.summary}</summary>
-        </Piece>
-        """
+        if url is None:
+            url = build_url(Pieces.endpoint, self.id)
+        xml_data = Pieces.xml_codec.encode(self, url, fields)
+        if "rating" in self.__dict__:
+            xml_data = xml_data[:-len("</Piece>")] + PieceRatingStats.xml_of(self.rating) + "</Piece>"
         return xml_data
-    
+
+    @staticmethod
+    def xml_values(item: dict) -> dict:
+        """Column values of a piece from one <Piece> element.
+
+        Args:
+            item: element as dict.
+        """
+        #All are strings
+        return {
+            "name": item["piece_name"].rstrip().lower(),
+            "date": to_date(item["date"].rstrip().lower()),
+            "author": item["author"].rstrip().lower(),
+            "genre": item["genre"].rstrip().lower(),
+            "nationality": item["nationality"].rstrip().lower(),
+            "studio": item["studio"].rstrip().lower(),
+            "summary": item["summary"].rstrip().lower()
+        }
+
     @staticmethod
     def from_xml(data: dict) -> None:
         """From XML to a new piece.
 
         Args:
-            data: XML as dict
+            data: <Piece> element as dict
         """
         try:
-            #All are strings
-            name = data["Piece"]["piece_name"].rstrip().lower()
-            date = data["Piece"]["date"].rstrip().lower()
-            author = data["Piece"]["author"].rstrip().lower()
-            genre = data["Piece"]["genre"].rstrip().lower()
-            nationality = data["Piece"]["nationality"].rstrip().lower()
-            studio = data["Piece"]["studio"].rstrip().lower()
-            summary = data["Piece"]["summary"].rstrip().lower()
-
-            return Pieces(name, date, author, genre, nationality, studio, summary)
+            return Pieces(**Pieces.xml_values(data))
         
-        except KeyError:
+        except (KeyError, TypeError, AttributeError):
             return None
 
         except IndexError:
             return None
 
-    def update_xml(self, data: dict) -> None:
-        """Update a piece from a XML.
-
-        Args: 
-            data: XML as dict.
-        """
-        data = xmltodict.parse(data)
-        try:
-            self.name = data["Piece"]["piece_name"].rstrip().lower()
-            self.date = data["Piece"]["date"].rstrip().lower()
-            self.author = data["Piece"]["author"].rstrip().lower()
-            self.genre = data["Piece"]["genre"].rstrip().lower()
-            self.nationality = data["Piece"]["nationality"].rstrip().lower()
-            self.studio = data["Piece"]["studio"].rstrip().lower()
-            self.summary = data["Piece"]["summary"].rstrip().lower()
-
-        except:
-            pass
-    
-    def update_json(self, data: dict) -> None:
-        """Update a piece from JSON.
-
-        Args: 
-            data: input JSON.
-        """
-        try:
-            self.name = data[0].get("piece_name").rstrip().lower()
-            self.date = data[0].get("date").rstrip().lower()
-            self.author = data[0].get("author").rstrip().lower()
-            self.genre = data[0].get("genre").rstrip().lower()
-            self.nationality = data[0].get("nationality").rstrip().lower()
-            self.studio = data[0].get("studio")
-            self.summary = data[0].get("summary").rstrip().lower()
-        
-        except:
-            pass
-
 class Studios(db.Model):
     """This class models all the columns needed in the table Studios"""
     #Table name and columns
@@ -172,6 +244,12 @@ class Studios(db.Model):
     name = db.Column(db.String(250), unique = True, nullable = False)
     email = db.Column(db.String(250), unique = True, nullable = False)
     phone = db.Column(db.String(250), unique = True, nullable = False)
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1")
+    __mapper_args__ = {"version_id_col": version}
+
+    endpoint = "studios.get_studio"
+    xml_codec = XmlCodec("Studio", "Studios", {"id": "id", "studio_name": "name", "email": "email",\
+        "phone": "phone"})
 
     def __init__(self, name: str, email: str, phone: str) -> None:
         """Adds a studio to the table
@@ -186,11 +264,17 @@ class Studios(db.Model):
         self.email = email
         self.phone = phone
 
-    def to_json(self) -> dict:
+    def to_json(self, url: str = None, fields: tuple = None) -> dict:
         """From studio to JSON
+
+        Args:
+            url: url of the studio, built from its id if it is not given.
+            fields: fields written (default all), see fieldsets.py.
         """
+        if fields is not None:
+            return sparse_json(self, url if url is not None else build_url(Studios.endpoint, self.id), fields)
         resource = {
-            "url": url_for("studios.get_studio", id = self.id),
+            "url": url if url is not None else build_url(Studios.endpoint, self.id),
             "id": self.id,
             "studio_name": self.name,
             "email": self.email,
@@ -198,6 +282,20 @@ class Studios(db.Model):
         }
         return resource
 
+    @staticmethod
+    def json_values(item: dict) -> dict:
+        """Column values of a studio from one JSON object.
+
+        Args:
+            item: one object of the input JSON.
+        """
+        #all lower
+        return {
+            "name": item.get("studio_name").rstrip().lower(),
+            "email": item.get("email").rstrip().lower(),
+            "phone": item.get("phone").rstrip().lower()
+        }
+
     @staticmethod
     def from_json(data: dict) -> None:
         """From JSON to studio.
@@ -206,92 +304,212 @@ class Studios(db.Model):
             data: input JSON
         """
         try:
-            #all lower
-            name = data[0].get("studio_name").rstrip().lower()
-            email = data[0].get("email").rstrip().lower()
-            phone = data[0].get("phone").rstrip().lower()
-
-            return Studios(name, email, phone)
+            return Studios(**Studios.json_values(data[0]))
 
-        except KeyError:
+        except (KeyError, AttributeError):
             return None
 
         except IndexError:
             return None
 
-    def to_xml(self) -> str:
+    def to_xml(self, url: str = None, fields: tuple = None) -> str:
         """From studio to XML.
+
+        Args:
+            url: url of the studio, built from its id if it is not given.
+            fields: fields written (default all), see fieldsets.py.
         """
-        xml_data = f"""
-        <Studio>
-            <uri>{url_for("studios.get_studio", id = self.id)}</uri>
-            <id>{self.id}</id>
-            <studio_name>{self.name}</studio_name>
-            <email>{self.email}</email>
-            <phone>{self.phone}</phone>
-        </Studio>
+        if url is None:
+            url = build_url(Studios.endpoint, self.id)
+        return Studios.xml_codec.encode(self, url, fields)
+
+    @staticmethod
+    def xml_values(item: dict) -> dict:
+        """Column values of a studio from one <Studio> element.
+
+        Args:
+            item: element as dict.
         """
-        return xml_data
+        #All are strings
+        return {
+            "name": item["studio_name"].rstrip().lower(),
+            "email": item["email"].rstrip().lower(),
+            "phone": item["phone"].rstrip().lower()
+        }
 
     @staticmethod
     def from_xml(data: dict) -> None:
         """From XML to a new studio.
 
         Args:
-            data: XML as dict
+            data: <Studio> element as dict
         """
         try:
-            #All are strings
-            name = data["Studio"]["studio_name"].rstrip().lower()
-            email = data["Studio"]["email"].rstrip().lower()
-            phone = data["Studio"]["phone"].rstrip().lower()
+            return Studios(**Studios.xml_values(data))
 
-            return Studios(name, email, phone)
-
-        except KeyError:
+        except (KeyError, TypeError, AttributeError):
             return None
 
         except IndexError:
             return None
 
-    def update_xml(self, data: dict) -> None:
-        """Update a studio from a XML.
+class StudioPieceCounts(db.Model):
+    """This class models the number of pieces of every studio, kept up to date
+    by the writes of pieces so the count is read without scanning them"""
+    #Table name and columns
+    __tablename__ = 'studio_piece_counts'
+    studio = db.Column(db.Integer, db.ForeignKey("studios.id"), primary_key = True)
+    count = db.Column(db.Integer, nullable = False, default = 0)
+
+    @staticmethod
+    def add(studio: int, delta: int) -> None:
+        """Adds delta to the count of a studio in the current transaction.
+
+        Args:
+            studio: id of the studio (None is ignored)
+            delta: number of pieces added (or removed if negative)
+        """
+        if studio is None or delta == 0:
+            return
+        add_to_row(StudioPieceCounts, StudioPieceCounts.studio, int(studio), {"count": delta},\
+            {"count": max(delta, 0)})
 
-        Args: 
-            data: XML as dict.
+    @staticmethod
+    def remove(studio: int) -> None:
+        """Deletes the count of a studio in the current transaction, before
+        the studio as it references it.
         """
-        data = xmltodict.parse(data)
-        try:
-            self.name = data["Studio"]["studio_name"].rstrip().lower()
-            self.email = data["Studio"]["email"].rstrip().lower()
-            self.phone = data["Studio"]["phone"].rstrip().lower()
+        db.session.execute(delete(StudioPieceCounts).where(StudioPieceCounts.studio == studio),\
+            execution_options = {"synchronize_session": False})
 
-        except:
-            pass
+    @staticmethod
+    def rebuild() -> None:
+        """Computes again all the counts from the pieces table.
+        """
+        db.session.execute(delete(StudioPieceCounts))
+        db.session.execute(
+            insert(StudioPieceCounts).from_select(
+                ["studio", "count"],
+                select(Pieces.studio, func.count(Pieces.id))
+                .where(Pieces.studio.isnot(None))
+                .group_by(Pieces.studio)
+            )
+        )
+
+class PieceRatingStats(db.Model):
+    """This class models the number, sum and histogram of the notes of the
+    evaluations of every piece, kept up to date by the writes of evaluations
+    so the rating is read without scanning them"""
+    #Table name and columns
+    __tablename__ = 'piece_rating_stats'
+    piece = db.Column(db.Integer, db.ForeignKey("pieces.id", ondelete = "CASCADE"), primary_key = True)
+    count = db.Column(db.Integer, nullable = False, default = 0)
+    total = db.Column(db.Integer, nullable = False, default = 0)
+    #Evaluations with every note from 1 to 5, other notes are only in count and total
+    note_1 = db.Column(db.Integer, nullable = False, default = 0)
+    note_2 = db.Column(db.Integer, nullable = False, default = 0)
+    note_3 = db.Column(db.Integer, nullable = False, default = 0)
+    note_4 = db.Column(db.Integer, nullable = False, default = 0)
+    note_5 = db.Column(db.Integer, nullable = False, default = 0)
+
+    NOTES = range(1, 6)
 
-    def update_json(self, data: dict) -> None:
-        """Update a studio from JSON.
+    @staticmethod
+    def add(piece: int, notes: Counter, sign: int = 1) -> None:
+        """Adds (or removes if sign is -1) evaluations to the stats of a piece
+        in the current transaction.
 
-        Args: 
-            data: input JSON.
+        Args:
+            piece: id of the piece (None is ignored)
+            notes: number of evaluations of every note
+            sign: 1 to add the evaluations, -1 to remove them
         """
-        try:
-            self.name = data[0].get("studio_name").rstrip().lower()
-            self.email = data[0].get("email").rstrip().lower()
-            self.phone = data[0].get("phone").rstrip().lower()
-        
-        except:
-            pass
+        if piece is None or not notes:
+            return
+        piece = int(piece)
+        notes = Counter({int(note): count for note, count in notes.items()})
+        values = {
+            "count": sign * sum(notes.values()),
+            "total": sign * sum(note * count for note, count in notes.items())
+        }
+        for note in PieceRatingStats.NOTES:
+            if notes[note]:
+                values[f"note_{note}"] = sign * notes[note]
+
+        if sign > 0:
+            add_to_row(PieceRatingStats, PieceRatingStats.piece, piece, values, values)
+            return
+        #The evaluations removed were counted, so the row exists
+        db.session.execute(
+            update(PieceRatingStats)
+            .where(PieceRatingStats.piece == piece)
+            .values({key: getattr(PieceRatingStats, key) + delta for key, delta in values.items()})
+        )
+
+    @staticmethod
+    def remove_pieces(ids: list) -> None:
+        """Deletes the stats of some pieces in the current transaction.
+        """
+        db.session.execute(delete(PieceRatingStats).where(PieceRatingStats.piece.in_(ids)),\
+            execution_options = {"synchronize_session": False})
+
+    @staticmethod
+    def rebuild() -> None:
+        """Computes again all the stats from the evaluations table.
+        """
+        db.session.execute(delete(PieceRatingStats))
+        histogram = [func.sum(case((Evaluations.note == note, 1), else_ = 0)) for note in PieceRatingStats.NOTES]
+        db.session.execute(
+            insert(PieceRatingStats).from_select(
+                ["piece", "count", "total"] + [f"note_{note}" for note in PieceRatingStats.NOTES],
+                select(Evaluations.piece, func.count(Evaluations.id), func.sum(Evaluations.note), *histogram)
+                .where(Evaluations.piece.isnot(None))
+                .group_by(Evaluations.piece)
+            )
+        )
+
+    @staticmethod
+    def json_of(stats) -> dict:
+        """Rating of a piece as JSON, stats is None if it has no evaluations.
+        """
+        count = stats.count if stats is not None else 0
+        total = stats.total if stats is not None else 0
+        return {
+            "count": count,
+            "sum": total,
+            "average": total / count if count else None,
+            "histogram": {str(note): getattr(stats, f"note_{note}") if stats is not None else 0\
+                for note in PieceRatingStats.NOTES}
+        }
+
+    @staticmethod
+    def xml_of(stats) -> str:
+        """Rating of a piece as XML, stats is None if it has no evaluations.
+        """
+        rating = PieceRatingStats.json_of(stats)
+        average = rating["average"] if rating["average"] is not None else ""
+        histogram = "".join(f"<note_{note}>{count}</note_{note}>" for note, count in rating["histogram"].items())
+        return f"<rating><count>{rating['count']}</count><sum>{rating['sum']}</sum>"\
+            f"<average>{average}</average><histogram>{histogram}</histogram></rating>"
 
 class Evaluations(db.Model):
     """This class models all the columns needed in the table Evaluations"""
     #Table name and columns
     __tablename__ = 'evaluations'
+    #Evaluations are filtered by piece and then by date, or only by date
+    __table_args__ = (db.Index("ix_evaluations_piece_date", "piece", "date"),\
+        db.Index("ix_evaluations_date", "date"))
     id = db.Column(db.Integer, primary_key = True)
-    piece = db.Column(db.Integer, db.ForeignKey("pieces.id"))
+    piece = db.Column(db.Integer, db.ForeignKey("pieces.id", ondelete = "CASCADE"))
     note = db.Column(db.Integer, nullable = False)
     date = db.Column(db.Date, nullable = False)
     text = db.Column(db.String(250), nullable = False)
+    version = db.Column(db.Integer, nullable = False, default = 1, server_default = "1")
+    __mapper_args__ = {"version_id_col": version}
+
+    endpoint = "evaluations.get_evaluation"
+    xml_codec = XmlCodec("Evaluation", "Evaluations", {"id": "id", "piece_id": "piece", "note": "note",\
+        "date": "date", "text": "text"})
 
     def __init__(self, piece: int, note: int, date: str, text: str) -> None:
         """Adds a evaluation to the table
@@ -308,11 +526,22 @@ class Evaluations(db.Model):
         self.date = date
         self.text = text
 
-    def to_json(self) -> dict:
+    @validates("date")
+    def validate_date(self, key: str, value):
+        """Dates are stored as dates"""
+        return to_date(value)
+
+    def to_json(self, url: str = None, fields: tuple = None) -> dict:
         """From evaluation to JSON
+
+        Args:
+            url: url of the evaluation, built from its id if it is not given.
+            fields: fields written (default all), see fieldsets.py.
         """
+        if fields is not None:
+            return sparse_json(self, url if url is not None else build_url(Evaluations.endpoint, self.id), fields)
         resource = {
-            "url": url_for("evaluations.get_evaluation", id = self.id),
+            "url": url if url is not None else build_url(Evaluations.endpoint, self.id),
             "id": self.id,
             "piece_id": self.piece,
             "note": self.note,
@@ -321,6 +550,21 @@ class Evaluations(db.Model):
         }
         return resource
 
+    @staticmethod
+    def json_values(item: dict) -> dict:
+        """Column values of an evaluation from one JSON object.
+
+        Args:
+            item: one object of the input JSON.
+        """
+        #all lower
+        return {
+            "piece": item.get("piece_id"),
+            "note": item.get("note"),
+            "date": json_date(item.get("date")),
+            "text": item.get("text").rstrip().lower()
+        }
+
     @staticmethod
     def from_json(data: dict) -> None:
         """From JSON to evaluation.
@@ -329,85 +573,52 @@ class Evaluations(db.Model):
             data: input JSON.
         """
         try:
-            #all lower
-            piece = data[0].get("piece_id")
-            note = data[0].get("note")
-            date = data[0].get("date").rstrip().lower()
-            text = data[0].get("text").rstrip().lower()
-
-            return Evaluations(piece, note, date, text)
+            return Evaluations(**Evaluations.json_values(data[0]))
 
-        except KeyError:
+        except (KeyError, AttributeError):
             return None
 
         except IndexError:
             return None
 
-    def to_xml(self) -> str:
+    def to_xml(self, url: str = None, fields: tuple = None) -> str:
         """From evaluation to XML.
+
+        Args:
+            url: url of the evaluation, built from its id if it is not given.
+            fields: fields written (default all), see fieldsets.py.
         """
-        xml_data = f"""
-        <Evaluation>
-            <uri>{url_for("evaluations.get_evaluation", id = self.id)}</uri>
-            <id>{self.id}</id>
-            <piece_id>{self.piece}</piece_id>
-            <note>{self.note}</note>
-            <date>{self.date}</date>
-            <text>{self.text}</text>
-        </Evaluation>
+        if url is None:
+            url = build_url(Evaluations.endpoint, self.id)
+        return Evaluations.xml_codec.encode(self, url, fields)
+
+    @staticmethod
+    def xml_values(item: dict) -> dict:
+        """Column values of an evaluation from one <Evaluation> element.
+
+        Args:
+            item: element as dict.
         """
-        return xml_data
+        #All are strings
+        return {
+            "piece": item["piece_id"].rstrip().lower(),
+            "note": item["note"].rstrip().lower(),
+            "date": to_date(item["date"].rstrip().lower()),
+            "text": item["text"].rstrip().lower()
+        }
 
     @staticmethod
     def from_xml(data: dict) -> None:
         """From XML to a new evaluation.
 
         Args:
-            data: XML as dict
+            data: <Evaluation> element as dict
         """
         try:
-            #All are strings
-            piece = data["Evaluation"]["piece_id"].rstrip().lower()
-            note = data["Evaluation"]["note"].rstrip().lower()
-            date = data["Evaluation"]["date"].rstrip().lower()
-            text = data["Evaluation"]["text"].rstrip().lower()
-
-            return Evaluations(piece, note, date, text)
+            return Evaluations(**Evaluations.xml_values(data))
 
-        except KeyError:
+        except (KeyError, TypeError, AttributeError):
             return None
 
         except IndexError:
             return None
-
-    def update_xml(self, data: dict) -> None:
-        """Update a evaluation from a XML.
-
-        Args: 
-            data: XML as dict.
-        """
-        data = xmltodict.parse(data)
-        try:
-            self.piece = data["Evaluation"]["piece_id"].rstrip().lower()
-            self.note = data["Evaluation"]["note"].rstrip().lower()
-            self.date = data["Evaluation"]["date"].rstrip().lower()
-            self.text = data["Evaluation"]["text"].rstrip().lower()
-
-        except:
-            pass
-
-    def update_json(self, data: dict) -> None:
-        """Update a evaluation from JSON.
-
-        Args: 
-            data: input JSON.
-        """
-        try:
-            self.piece = data[0].get("piece_id")
-            self.note = data[0].get("note")
-            self.date = data[0].get("date").rstrip().lower()
-            self.text = data[0].get("text").rstrip().lower()
-        
-        except:
-            pass
-    
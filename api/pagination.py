@@ -0,0 +1,192 @@
+"""REID
+   Keyset (cursor) pagination helpers
+"""
+
+import base64
+import json
+from datetime import date
+
+from flask import request
+from flask_restful import abort
+from sqlalchemy import tuple_
+import status
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+def encode_cursor(*keys) -> str:
+    """Builds an opaque cursor from the sort keys of the last row of a page.
+
+    Args:
+        keys: values of the ordering columns of the last row sent.
+
+    Returns:
+        url safe string
+    """
+    raw = json.dumps(list(keys), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    """Reads back the sort keys stored in a cursor.
+
+    A plain integer is also accepted, so clients can ask for ?after=<id>.
+
+    Args:
+        cursor: value of the after parameter.
+
+    Returns:
+        list with the sort keys
+    """
+    if cursor.isdigit():
+        return [int(cursor)]
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        keys = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except ValueError:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Cursor {cursor} not valid!")
+
+    if not isinstance(keys, list) or len(keys) == 0:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Cursor {cursor} not valid!")
+    return keys
+
+def page_args(default_limit: int = DEFAULT_LIMIT, unbounded: bool = False) -> tuple:
+    """Reads the after and limit parameters of the request.
+
+    Args:
+        default_limit: limit when the parameter is missing.
+        unbounded: the whole result can be requested (streamed answers),
+            so the limit is optional and has no maximum.
+
+    Returns:
+        (list of sort keys or None, limit or None)
+    """
+    after = request.args.get("after")
+    limit = request.args.get("limit", default = None if unbounded else default_limit, type = int)
+    if limit is not None and (limit < 1 or (limit > MAX_LIMIT and not unbounded)):
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Limit must be between 1 and {MAX_LIMIT}")
+
+    if after:
+        after = decode_cursor(after)
+    else:
+        after = None
+    return after, limit
+
+def _coerce(column, key):
+    """Converts a key read from a cursor to the python type of its column.
+    """
+    python_type = column.type.python_type
+    if python_type is date:
+        return date.fromisoformat(key)
+    return python_type(key)
+
+def _columns(columns) -> tuple:
+    if not isinstance(columns, (list, tuple)):
+        return (columns,)
+    return tuple(columns)
+
+def keyset_query(query, columns, after: list, descending: bool = False):
+    """Orders a query by a unique key and starts it after a cursor.
+
+    The query becomes WHERE key > :cursor ORDER BY key, so every page
+    costs the same whatever its position.
+
+    Args:
+        query: query to paginate.
+        columns: column (usually the primary key) or tuple of columns whose
+            values are unique together, e.g. (date, id).
+        after: keys decoded from the cursor or None for the first page.
+        descending: walk the key from the highest to the lowest value.
+
+    Returns:
+        ordered query
+    """
+    columns = _columns(columns)
+    if after is not None:
+        try:
+            if len(after) != len(columns):
+                raise ValueError(after)
+            keys = [_coerce(column, key) for column, key in zip(columns, after)]
+        except (TypeError, ValueError):
+            abort(status.HTTP_400_BAD_REQUEST, message=f"Cursor not valid!")
+
+        if len(columns) == 1:
+            left, right = columns[0], keys[0]
+        else:
+            left, right = tuple_(*columns), tuple_(*keys)
+        query = query.filter(left < right if descending else left > right)
+
+    order = [column.desc() if descending else column for column in columns]
+    return query.order_by(*order)
+
+def keyset_cursor(columns):
+    """Function that builds the next cursor from the last row of a page.
+    """
+    columns = _columns(columns)
+    return lambda row, count: encode_cursor(*[getattr(row, column.key) for column in columns])
+
+def offset_cursor(after: list):
+    """Reads the position stored in a cursor of an offset_page.
+
+    Returns:
+        (offset, function that builds the next cursor from a page)
+    """
+    offset = 0
+    if after is not None:
+        try:
+            offset = int(after[0])
+        except (TypeError, ValueError):
+            abort(status.HTTP_400_BAD_REQUEST, message=f"Cursor not valid!")
+    return offset, lambda row, count: encode_cursor(offset + count)
+
+def first_rows(query, limit: int, cursor) -> tuple:
+    """Reads limit rows of a paginated query. One extra row is read to
+    know if there is a next page.
+
+    Returns:
+        (rows of the page, next cursor or None)
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, cursor(rows[-1], limit)
+    return rows, None
+
+def keyset_page(query, columns, after: list, limit: int, descending: bool = False,\
+    offset: int = 0) -> tuple:
+    """Returns one page of a query ordered by a unique key.
+
+    Args:
+        query: query to paginate.
+        columns: column or tuple of columns of the key, see keyset_query.
+        after: keys decoded from the cursor or None for the first page.
+        limit: maximum number of rows of the page.
+        descending: walk the key from the highest to the lowest value.
+        offset: rows skipped after the cursor.
+
+    Returns:
+        (rows of the page, next cursor or None)
+    """
+    query = keyset_query(query, columns, after, descending).offset(offset)
+    return first_rows(query, limit, keyset_cursor(columns))
+
+def offset_page(query, after: list, limit: int) -> tuple:
+    """Returns one page of an already ordered query that has no unique key,
+    like a ranked search. The cursor keeps the position of the next row.
+
+    Args:
+        query: ordered query to paginate.
+        after: keys decoded from the cursor or None for the first page.
+        limit: maximum number of rows of the page.
+
+    Returns:
+        (rows of the page, next cursor or None)
+    """
+    offset, cursor = offset_cursor(after)
+    return first_rows(query.offset(offset), limit, cursor)
+
+def xml_next(cursor: str) -> str:
+    """XML element with the next cursor, empty if this is the last page.
+    """
+    if cursor is None:
+        return ""
+    return f"<next>{cursor}</next>"
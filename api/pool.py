@@ -0,0 +1,154 @@
+"""REID
+   Pool of connections of the database
+
+   The size, overflow, timeout, recycle and pre-ping of the pool are read
+   from the config of the app (DB_POOL_*), which create_api fills from the
+   environment. The pool measures how long the requests wait for a
+   connection and /api/_internal/pool shows its state.
+"""
+
+import threading
+import time
+
+from flask import Blueprint, jsonify, request, Response
+from sqlalchemy import exc, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from modelsAlchemy import db
+import status
+
+# Async driver of every database, used by the ASGI mode
+ASYNC_DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+# Defaults of the pool, the same as SQLAlchemy but with recycle and pre-ping
+POOL_DEFAULTS = {
+    "DB_POOL_SIZE": 5,
+    "DB_MAX_OVERFLOW": 10,
+    "DB_POOL_TIMEOUT": 30,
+    "DB_POOL_RECYCLE": 1800,
+    "DB_POOL_PRE_PING": True,
+}
+
+internal = Blueprint("internal", __name__)
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that keeps how long the checkouts wait for a connection"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def recreate(self):
+        # Used by the engine when the database restarts, the stats are kept
+        pool = super().recreate()
+        pool.checkouts, pool.wait_total, pool.wait_max, pool.timeouts =\
+            self.checkouts, self.wait_total, self.wait_max, self.timeouts
+        return pool
+
+    def reset_stats(self) -> None:
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self.stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            with self.stats_lock:
+                self.checkouts += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+
+    def stats(self) -> dict:
+        """State of the pool and the waits since it was created.
+        """
+        with self.stats_lock:
+            checkouts, wait_total, wait_max, timeouts =\
+                self.checkouts, self.wait_total, self.wait_max, self.timeouts
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "timeout": self.timeout(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            # Negative while the pool has not opened size connections
+            "overflow": max(self.overflow(), 0),
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_avg_ms": round(wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+            "wait_max_ms": round(wait_max * 1000, 3),
+        }
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """TimedQueuePool of an async driver, whose checkouts wait on the event loop"""
+
+def async_uri(uri: str) -> str:
+    """Same database with its async driver, e.g. postgresql+asyncpg for postgresql.
+
+    Raises:
+        ValueError: the database has no async driver.
+    """
+    url = make_url(uri)
+    if url.get_dialect().is_async:
+        return uri
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for {backend}")
+    return url.set(drivername = f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password = False)
+
+def is_memory_sqlite(uri: str) -> bool:
+    """Checks if the URI is a SQLite in-memory database, which has one
+    static connection and no pool.
+    """
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(config, uri: str = None) -> dict:
+    """Options of the engine built from the DB_POOL_* keys of a config.
+
+    Args:
+        config: config of the app.
+        uri: database of the engine, SQLALCHEMY_DATABASE_URI by default.
+    """
+    uri = uri or config["SQLALCHEMY_DATABASE_URI"]
+    if is_memory_sqlite(uri):
+        return {}
+    return {
+        "poolclass": TimedAsyncQueuePool if make_url(uri).get_dialect().is_async else TimedQueuePool,
+        "pool_size": int(config["DB_POOL_SIZE"]),
+        "max_overflow": int(config["DB_MAX_OVERFLOW"]),
+        # engine_from_config reads the timeout as whole seconds
+        "pool_timeout": int(config["DB_POOL_TIMEOUT"]),
+        "pool_recycle": int(config["DB_POOL_RECYCLE"]),
+        "pool_pre_ping": bool(config["DB_POOL_PRE_PING"]),
+    }
+
+def pool_stats(pool) -> dict:
+    """Stats of a pool, only the class for the pools that are not timed.
+    """
+    if isinstance(pool, TimedQueuePool):
+        return {"pool": type(pool).__name__, **pool.stats()}
+    return {"pool": type(pool).__name__, "status": pool.status()}
+
+@internal.route("/api/_internal/pool", methods=["GET"])
+def get_pool():
+    """State of the pools of connections of the app."""
+    engines = {bind or "default": pool_stats(engine.pool) for bind, engine in db.engines.items()}
+
+    if request.content_type == "application/xml":
+        engines_xml = ""
+        for name, stats in engines.items():
+            values = "".join(f"<{key}>{value}</{key}>" for key, value in stats.items())
+            engines_xml += f"<Engine><name>{name}</name>{values}</Engine>"
+        return Response(f"<Pools>{engines_xml}</Pools>", status = status.HTTP_200_OK,\
+            mimetype = "application/xml")
+
+    # JSON when the format is not set, it is read by monitoring tools
+    return jsonify(engines), status.HTTP_200_OK
@@ -0,0 +1,177 @@
+"""REID
+   SQL statements of every request
+
+   Listeners on the engines count the statements, the time spent in the
+   database and the rows of every request. The totals are sent in the
+   Server-Timing header, and a warning is logged when a request runs the
+   same statement more than QUERY_REPEAT_WARNING times (an N+1 loop).
+   query_budget() records the statements of a block of code, so the
+   benchmarks can check that a route does not run more than expected.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import Histogram
+from modelsAlchemy import db
+
+# Parameters of the statements (?, :name, %(name)s, %s, $1)
+PARAMETER = re.compile(r"\?|:\w+|%\(\w+\)s|%s|\$\d+")
+# Lists of parameters of IN (...) and multi-row VALUES
+PARAMETER_LIST = re.compile(r"\(\?(?:\s*,\s*\?)+\)(?:\s*,\s*\(\?(?:\s*,\s*\?)*\))*")
+# Statements per request
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class QueryBudgetExceeded(AssertionError):
+    """A block of code ran more statements than its budget"""
+
+class QueryStats:
+    """Statements, database time and rows of a request or a block of code"""
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.shapes = Counter()
+
+    def repeated(self, times: int) -> list:
+        """(shape, count) of the statements run more than times.
+        """
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > times]
+
+# query_budget() blocks being recorded
+recorders = []
+recorders_lock = threading.Lock()
+
+def shape(statement: str) -> str:
+    """Statement without its parameters, e.g. the same for any id.
+    """
+    statement = PARAMETER.sub("?", " ".join(statement.split()))
+    return PARAMETER_LIST.sub("(?...)", statement)
+
+def active_stats() -> list:
+    """Stats that record the current statement.
+    """
+    stats = list(recorders) if recorders else []
+    if has_app_context():
+        current = g.get("query_stats")
+        if current is not None:
+            stats.append(current)
+    return stats
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany) -> None:
+    connection.info.setdefault("query_start", []).append(time.perf_counter())
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - connection.info["query_start"].pop()
+    stats = active_stats()
+    if not stats:
+        return
+    statement_shape = shape(statement)
+    # Rows written, the rows read are counted as they are loaded
+    written = cursor.rowcount if cursor.rowcount > 0 and statement.lstrip()[:6].upper() != "SELECT" else 0
+    for current in stats:
+        current.queries += 1
+        current.seconds += elapsed
+        current.rows += written
+        current.shapes[statement_shape] += 1
+
+def on_load(target, context) -> None:
+    for current in active_stats():
+        current.rows += 1
+
+def listen() -> None:
+    """Adds the listeners to every engine and model, once per process.
+    """
+    if event.contains(Engine, "after_cursor_execute", after_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(db.Model, "load", on_load, propagate = True)
+
+class QueryMonitor:
+    """Counts the statements of the requests of an app"""
+
+    def __init__(self, repeat_warning: int = 10, server_timing: bool = True) -> None:
+        """
+        Args:
+            repeat_warning: times a statement can run in a request without a warning.
+            server_timing: send the Server-Timing header.
+        """
+        self.repeat_warning = repeat_warning
+        self.server_timing = server_timing
+        self.histogram = None
+
+    def init_app(self, app) -> None:
+        """Counts the statements of the requests of an app, and adds their
+        histogram to its metrics if they are enabled.
+        """
+        listen()
+        app.extensions["query_monitor"] = self
+        metrics = app.extensions.get("metrics")
+        if metrics is not None:
+            self.histogram = metrics.add(Histogram("catalog_db_queries",\
+                "Statements run by a request", ("endpoint",), QUERY_BUCKETS))
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    def before_request(self) -> None:
+        g.query_stats = QueryStats()
+        g.query_start = time.perf_counter()
+
+    def after_request(self, response):
+        stats = g.get("query_stats")
+        if stats is None:
+            return response
+        # The statements of a streamed answer run after its headers are sent
+        if self.server_timing:
+            total = (time.perf_counter() - g.query_start) * 1000
+            response.headers.add("Server-Timing",\
+                f'db;dur={stats.seconds * 1000:.2f};desc="{stats.queries} queries, {stats.rows} rows"')
+            response.headers.add("Server-Timing", f"app;dur={total:.2f}")
+
+        if self.histogram is not None and request.url_rule is not None:
+            self.histogram.observe((request.url_rule.endpoint,), stats.queries)
+
+        for statement_shape, count in stats.repeated(self.repeat_warning):
+            current_app.logger.warning("%s %s ran the same statement %d times: %s",\
+                request.method, request.path, count, statement_shape)
+        return response
+
+@contextmanager
+def query_budget(max_queries: int = None, max_repeats: int = None):
+    """Records the statements run inside the block, in any thread.
+
+    Args:
+        max_queries: statements allowed, None for no limit.
+        max_repeats: times the same statement can run, None for no limit.
+
+    Yields:
+        QueryStats of the block
+
+    Raises:
+        QueryBudgetExceeded: when the block runs more statements than allowed.
+    """
+    listen()
+    stats = QueryStats()
+    with recorders_lock:
+        recorders.append(stats)
+    try:
+        yield stats
+    finally:
+        with recorders_lock:
+            recorders.remove(stats)
+
+    if max_queries is not None and stats.queries > max_queries:
+        raise QueryBudgetExceeded(f"{stats.queries} statements, the budget is {max_queries}: "\
+            + "; ".join(f"{count}x {statement_shape}" for statement_shape, count in stats.shapes.most_common()))
+    repeated = stats.repeated(max_repeats) if max_repeats is not None else []
+    if repeated:
+        raise QueryBudgetExceeded(f"Statement run {repeated[0][1]} times, the budget is {max_repeats}: "\
+            + repeated[0][0])
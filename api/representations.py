@@ -0,0 +1,161 @@
+"""REID
+   Representations of the objects of the API
+
+   The objects of the JSON answers (the to_json of the models, the pages,
+   counts and ratings) are also sent and read in the other formats of the
+   registry, chosen by the content type of the request like JSON and XML:
+   application/msgpack with the msgpack package and application/cbor with
+   cbor2. XML keeps its own codec and templates.
+
+   The dates are native: a MessagePack timestamp (midnight UTC) and a CBOR
+   full-date (tag 1004). A format is added with register(), e.g. by an
+   extension of the app.
+"""
+
+import datetime
+
+from flask import current_app, jsonify, request, Response
+from flask_restful import abort
+import status
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# Content type -> representation
+REPRESENTATIONS = {}
+
+class Representation:
+    """Format of the objects of the API, which are dicts, lists, strings,
+    numbers, dates and None"""
+
+    # Content type and name in the errors
+    mimetype = None
+    name = None
+
+    def dumps(self, data) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, body: bytes):
+        """Raises ValueError if the body is not valid."""
+        raise NotImplementedError
+
+    def response(self, data) -> Response:
+        return Response(self.dumps(data), mimetype = self.mimetype)
+
+    def request_data(self):
+        """Objects of the body of the request.
+        """
+        try:
+            return self.loads(request.get_data())
+        except ValueError:
+            abort(status.HTTP_400_BAD_REQUEST, message=f"{self.name} not valid!")
+
+    def chunks(self, name: str, page, to_data):
+        """Envelope {name: [...], "next": cursor} written row by row.
+
+        Args:
+            page: rows, its next attribute is the cursor once they are read.
+            to_data: function from a row to its object.
+        """
+        raise NotImplementedError
+
+class JsonRepresentation(Representation):
+    """JSON with the provider of the app, dates as HTTP dates"""
+
+    mimetype = "application/json"
+    name = "JSON"
+
+    def dumps(self, data) -> bytes:
+        return current_app.json.dumps(data).encode("utf-8")
+
+    def loads(self, body: bytes):
+        return current_app.json.loads(body)
+
+    def response(self, data) -> Response:
+        return jsonify(data)
+
+    def request_data(self):
+        return request.get_json()
+
+    def chunks(self, name: str, page, to_data):
+        dumps = current_app.json.dumps
+        yield f'{{"{name}": ['
+        separator = ""
+        for row in page:
+            yield separator + dumps(to_data(row))
+            separator = ","
+        yield f'], "next": {dumps(page.next)}}}'
+
+def msgpack_default(value):
+    if isinstance(value, datetime.date):
+        return msgpack.Timestamp.from_datetime(datetime.datetime.combine(value, datetime.time(),\
+            datetime.timezone.utc))
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+class MsgpackRepresentation(Representation):
+    """MessagePack, dates as timestamps read back as UTC datetimes"""
+
+    mimetype = "application/msgpack"
+    name = "MessagePack"
+
+    def dumps(self, data) -> bytes:
+        return msgpack.packb(data, default = msgpack_default, datetime = True)
+
+    def loads(self, body: bytes):
+        return msgpack.unpackb(body, timestamp = 3)
+
+    def chunks(self, name: str, page, to_data):
+        """The length of a MessagePack array goes before its items, so a
+        streamed answer is a sequence of objects: the rows and then
+        {"next": cursor}.
+        """
+        packer = msgpack.Packer(default = msgpack_default, datetime = True)
+        for row in page:
+            yield packer.pack(to_data(row))
+        yield packer.pack({"next": page.next})
+
+class CborRepresentation(Representation):
+    """CBOR, dates as full-dates (RFC 8943)"""
+
+    mimetype = "application/cbor"
+    name = "CBOR"
+
+    def dumps(self, data) -> bytes:
+        return cbor2.dumps(data)
+
+    def loads(self, body: bytes):
+        try:
+            return cbor2.loads(body)
+        except cbor2.CBORDecodeError as error:
+            raise ValueError(str(error))
+
+    def chunks(self, name: str, page, to_data):
+        """The list is an array of indefinite length."""
+        yield b"\xa2" + cbor2.dumps(name) + b"\x9f"
+        for row in page:
+            yield cbor2.dumps(to_data(row))
+        yield b"\xff" + cbor2.dumps("next") + cbor2.dumps(page.next)
+
+def register(representation: Representation) -> None:
+    """Adds a format to the registry, it replaces the one with its content type.
+    """
+    REPRESENTATIONS[representation.mimetype] = representation
+
+def current_representation() -> Representation:
+    """Representation of the content type of the request, None for XML or
+    a type that is not supported.
+    """
+    return REPRESENTATIONS.get(request.content_type)
+
+register(JsonRepresentation())
+if msgpack is not None:
+    register(MsgpackRepresentation())
+if cbor2 is not None:
+    register(CborRepresentation())
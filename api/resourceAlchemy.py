@@ -2,33 +2,233 @@
    Resource Models and database
 """
 
-from flask import Blueprint, jsonify, request, Response
+from flask import Blueprint, current_app, request, Response
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.exc import IntegrityError
-from modelsAlchemy import db, Pieces, Studios, Evaluations
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from modelsAlchemy import db, Pieces, Studios, Evaluations, StudioPieceCounts, PieceRatingStats
 from flask_restful import abort
-import xmltodict
+from pagination import MAX_LIMIT, decode_cursor, page_args, keyset_cursor, keyset_page, keyset_query,\
+    offset_cursor, offset_page, xml_next
+from streaming import stream_list, stream_requested
+from representations import REPRESENTATIONS, current_representation
+from fieldsets import only_fields, requested_fields
+from cache import cached, invalidate, version_etag
+from xmlcodec import XmlError
+from urls import serializer
+from validation import READ_ONLY, check_values, patch_values
+from collections import Counter
+import datetime
+import search
 import status
 
+# Maximum number of objects of a bulk POST
+MAX_BULK_ITEMS = 50000
+# Rows of every INSERT of a bulk POST, well under the bind parameters of SQLite
+BULK_INSERT_ROWS = 1000
+# Errors of a UNIQUE or PRIMARY KEY constraint: SQLSTATE of PostgreSQL and
+# extended error names of SQLite
+UNIQUE_ERRORS = ("23505", "SQLITE_CONSTRAINT_UNIQUE", "SQLITE_CONSTRAINT_PRIMARYKEY")
+# Errors of a FOREIGN KEY without its row
+FOREIGN_KEY_ERRORS = ("23503", "SQLITE_CONSTRAINT_FOREIGNKEY")
+
 # Creates the Flask blueprints
 pieces = Blueprint("pieces", __name__)
 studios = Blueprint("studios", __name__)
 evaluations = Blueprint("evaluations", __name__)
 
+def counter_enabled() -> bool:
+    """Checks if the studio_piece_counts table is used and kept up to date.
+    """
+    return current_app.config.get("STUDIO_PIECE_COUNTER", False)
+
+def rating_requested() -> bool:
+    """Checks if the pieces of the answer have their rating (?rating=true).
+    """
+    return request.args.get("rating", default = "false").lower() in ("1", "true", "yes")
+
+def pieces_query():
+    """Query of the pieces, with their rating in the same statement if it is requested.
+    """
+    if rating_requested():
+        return Pieces.query.options(joinedload(Pieces.rating))
+    return Pieces.query
+
+def modified_meanwhile(model, id: int) -> None:
+    """Answers 409 when another request wrote the row between the read and
+    the write of a PUT or DELETE, as the ORM only writes the version it read.
+    """
+    db.session.rollback()
+    abort(status.HTTP_409_CONFLICT, message=f"{model.xml_codec.element} {id} was modified")
+
+def date_arg(name: str) -> datetime.date:
+    """Reads a date (YYYY-MM-DD) from the parameters of the request.
+
+    Args:
+        name: name of the parameter.
+
+    Returns:
+        date or None if the parameter is missing
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Date {value} not valid!")
+
+def xml_items(model) -> tuple:
+    """Reads the XML body of a request with one object or a collection.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+
+    Returns:
+        (list of elements as dicts, True if the body is a collection)
+    """
+    try:
+        return model.xml_codec.decode(request.get_data())
+    except XmlError as error:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"XML not valid! {error}")
+
+def constraint_error(model, row: dict, error: IntegrityError) -> str:
+    """Message of the result of a row that breaks a constraint.
+    """
+    code = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)\
+        or getattr(error.orig, "sqlite_errorname", None)
+    if code in UNIQUE_ERRORS:
+        return "Already exists"
+    if code in FOREIGN_KEY_ERRORS:
+        columns = model.__table__.columns
+        fields = [f"{field} {row.get(attribute)}" for field, attribute in model.xml_codec.fields.items()\
+            if columns[attribute].foreign_keys]
+        return f"{', '.join(fields)} not valid!"
+    return "Data not valid!"
+
+def insert_rows(model, rows: list) -> list:
+    """Inserts rows with one INSERT ... VALUES (...), (...) RETURNING id.
+
+    Returns:
+        ids of the rows, in their order
+    """
+    statement = insert(model).values(rows).returning(model.id)
+    #RETURNING has no order, but the ids of one statement follow its VALUES
+    return sorted(db.session.scalars(statement).all())
+
+def bulk_create(model, items: list, values, after_insert) -> tuple:
+    """Adds many rows of a model in one transaction and reports the
+    result of every item.
+
+    Every item is checked against the columns (validation.py) and the
+    valid ones are written with one INSERT with many VALUES for every
+    BULK_INSERT_ROWS rows. If they break a constraint, every row is
+    written again in its own savepoint to find which ones fail.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+        items: objects of the request.
+        values: function from an object to the values of a row.
+        after_insert: function called in the transaction with the values of
+            the inserted rows, returns the cache tags to invalidate.
+    """
+    if len(items) > current_app.config.get("BULK_MAX_ITEMS", MAX_BULK_ITEMS):
+        abort(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, message=f"Too many items!")
+
+    results = [None] * len(items)
+    rows = []
+    indexes = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(check_values(model, values(item)))
+            indexes.append(index)
+        except (KeyError, AttributeError, TypeError):
+            results[index] = {"index": index, "status": status.HTTP_400_BAD_REQUEST,\
+                "message": "Missing data!"}
+        except ValueError as error:
+            results[index] = {"index": index, "status": status.HTTP_400_BAD_REQUEST,\
+                "message": str(error)}
+
+    inserted = []
+    try:
+        for start in range(0, len(rows), BULK_INSERT_ROWS):
+            chunk = rows[start:start + BULK_INSERT_ROWS]
+            inserted += zip(indexes[start:start + BULK_INSERT_ROWS], chunk, insert_rows(model, chunk))
+    except IntegrityError:
+        db.session.rollback()
+        inserted = []
+        for index, row in zip(indexes, rows):
+            try:
+                with db.session.begin_nested():
+                    inserted.append((index, row, insert_rows(model, [row])[0]))
+            except IntegrityError as error:
+                results[index] = {"index": index, "status": status.HTTP_400_BAD_REQUEST,\
+                    "message": constraint_error(model, row, error)}
+
+    try:
+        tags = after_insert([row for index, row, id in inserted])
+        db.session.commit()
+    except (IntegrityError, TypeError, ValueError):
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Data not valid!")
+
+    for index, row, id in inserted:
+        results[index] = {"index": index, "status": status.HTTP_201_CREATED, "id": id}
+    invalidate(*tags)
+
+    representation = current_representation()
+    if representation is not None:
+        return representation.response(results), status.HTTP_202_ACCEPTED
+    xml_data = "".join("<Result>" + "".join(f"<{key}>{value}</{key}>" for key, value in result.items())\
+        + "</Result>" for result in results)
+    xml_data = f"<Results>{xml_data}</Results>"
+    return Response(xml_data, mimetype="application/xml"), status.HTTP_202_ACCEPTED
+
+def pieces_inserted(rows: list) -> list:
+    """Updates the studio counters after a bulk insert of pieces.
+    """
+    studios = Counter(row["studio"] for row in rows)
+    if counter_enabled():
+        for studio, count in studios.items():
+            StudioPieceCounts.add(studio, count)
+    return ["pieces", "studio_counts"] + [f"studio_pieces:{studio}" for studio in studios]
+
+def studios_inserted(rows: list) -> list:
+    return ["studios", "studio_counts"]
+
+def evaluations_inserted(rows: list) -> list:
+    """Updates the rating of the pieces after a bulk insert of evaluations.
+    """
+    notes = {}
+    for row in rows:
+        notes.setdefault(row["piece"], Counter())[row["note"]] += 1
+    for piece, counter in notes.items():
+        PieceRatingStats.add(piece, counter)
+    return ["evaluations", "ratings"] + [f"evaluations_of:{piece}" for piece in notes]\
+        + [f"rating:{piece}" for piece in notes]
+
 #POST
 @pieces.route("/api/pieces", methods = ["POST"])
 def add_piece():
-    """Adds a piece in the table given a XML or JSON as request.
+    """Adds a piece in the table given a XML element or a JSON object as request,
+        or many pieces given a JSON list (even of one) or a XML collection
     """
     #Create a new piece
+    representation = current_representation()
     if request.content_type == "application/xml":
-        xml = xmltodict.parse(request.get_data())
-        new_piece = Pieces.from_xml(xml)
+        items, many = xml_items(Pieces)
+        if many:
+            return bulk_create(Pieces, items, Pieces.xml_values, pieces_inserted)
+        new_piece = Pieces.from_xml(items[0])
 
-    elif request.content_type == "application/json":
-        json = request.get_json()
+    elif representation is not None:
+        json = representation.request_data()
         if json == None:
-            abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"JSON not valid!")
-        new_piece = Pieces.from_json(json)
+            abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"{representation.name} not valid!")
+        if isinstance(json, list):
+            return bulk_create(Pieces, json, Pieces.json_values, pieces_inserted)
+        new_piece = Pieces.from_json([json])
     
     else:
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
@@ -38,28 +238,41 @@ def add_piece():
 
     try:
         db.session.add(new_piece)
+        if counter_enabled():
+            StudioPieceCounts.add(new_piece.studio, 1)
         db.session.commit()
 
     except IntegrityError:
         # Fail to store new data.
         abort(status.HTTP_400_BAD_REQUEST, message=f"Piece {new_piece.name} already exists")
 
+    except ValueError:
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Studio {new_piece.studio} not valid!")
+
+    invalidate("pieces", f"studio_pieces:{new_piece.studio}", "studio_counts")
     return new_piece.to_xml(), status.HTTP_202_ACCEPTED
 
 @studios.route("/api/studios", methods = ["POST"])
 def add_studio():
-    """Adds a studio in the table given a XML or JSON as request.
+    """Adds a studio in the table given a XML element or a JSON object as request,
+        or many studios given a JSON list (even of one) or a XML collection
     """
     #Create a new studio
+    representation = current_representation()
     if request.content_type == "application/xml":
-        xml = xmltodict.parse(request.get_data())
-        new_studio = Studios.from_xml(xml)
+        items, many = xml_items(Studios)
+        if many:
+            return bulk_create(Studios, items, Studios.xml_values, studios_inserted)
+        new_studio = Studios.from_xml(items[0])
 
-    elif request.content_type == "application/json":
-        json = request.get_json()
+    elif representation is not None:
+        json = representation.request_data()
         if json == None:
-            abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"JSON not valid!")
-        new_studio = Studios.from_json(json)
+            abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"{representation.name} not valid!")
+        if isinstance(json, list):
+            return bulk_create(Studios, json, Studios.json_values, studios_inserted)
+        new_studio = Studios.from_json([json])
 
     else:
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
@@ -75,22 +288,29 @@ def add_studio():
         # Fail to store new data.
         abort(status.HTTP_400_BAD_REQUEST, message=f"Studio {new_studio.name} already exists")
 
+    invalidate("studios", "studio_counts")
     return new_studio.to_xml(), status.HTTP_202_ACCEPTED
         
 @evaluations.route("/api/evaluations", methods = ["POST"])
 def add_evaluation():
-    """Adds a evaluation in the table given a XML or JSON as request.
+    """Adds a evaluation in the table given a XML element or a JSON object as request,
+        or many evaluations given a JSON list (even of one) or a XML collection
     """
     #Create a new evaluation
+    representation = current_representation()
     if request.content_type == "application/xml":
-        xml = xmltodict.parse(request.get_data())
-        new_evaluation = Evaluations.from_xml(xml)
+        items, many = xml_items(Evaluations)
+        if many:
+            return bulk_create(Evaluations, items, Evaluations.xml_values, evaluations_inserted)
+        new_evaluation = Evaluations.from_xml(items[0])
 
-    elif request.content_type == "application/json":
-        json = request.get_json()
+    elif representation is not None:
+        json = representation.request_data()
         if json == None:
-            abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"JSON not valid!")
-        new_evaluation = Evaluations.from_json(json)
+            abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"{representation.name} not valid!")
+        if isinstance(json, list):
+            return bulk_create(Evaluations, json, Evaluations.json_values, evaluations_inserted)
+        new_evaluation = Evaluations.from_json([json])
 
     else:
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
@@ -100,194 +320,414 @@ def add_evaluation():
 
     try:
         db.session.add(new_evaluation)
+        PieceRatingStats.add(new_evaluation.piece, Counter([new_evaluation.note]))
         db.session.commit()
 
     except IntegrityError:
         # Fail to store new data.
         abort(status.HTTP_400_BAD_REQUEST, message=f"Evaluation already exists")
 
+    except (TypeError, ValueError):
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Evaluation not valid!")
+
+    invalidate("evaluations", f"evaluations_of:{new_evaluation.piece}", "ratings",\
+        f"rating:{new_evaluation.piece}")
     return new_evaluation.to_xml(), status.HTTP_202_ACCEPTED
 
 #GET 
 @pieces.route("/api/pieces/<int:id>", methods = ["GET"])
+@cached("piece:{id}", "rating:{id}")
 def get_piece(id: int):
-    """Returns the piece with the given id
+    """Returns the piece with the given id, and its rating with rating=true
     """
-    piece = Pieces.query.filter(Pieces.id == id).first()
+    fields = requested_fields(Pieces)
+    piece = only_fields(pieces_query(), Pieces, fields, Pieces.version).filter(Pieces.id == id).first()
 
     if piece is None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Piece {id} does not exists")
         
-    if request.content_type == "application/json":
-        return jsonify(piece.to_json()), status.HTTP_202_ACCEPTED  
+    representation = current_representation()
+    if representation is not None:
+        response = representation.response(piece.to_json(fields = fields))
+        return version_etag(response, piece.version), status.HTTP_202_ACCEPTED
     elif request.content_type == "application/xml":    
-        xml_data = piece.to_xml()
+        xml_data = piece.to_xml(fields = fields)
         response = Response(xml_data, mimetype="application/xml")
-        return response, status.HTTP_202_ACCEPTED
+        return version_etag(response, piece.version), status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 @studios.route("/api/studios/<int:id>", methods = ["GET"])
+@cached("studio:{id}")
 def get_studio(id: int):
     """Returns the studio with the given id
     """
-    studio = Studios.query.filter(Studios.id == id).first()
+    fields = requested_fields(Studios)
+    studio = only_fields(Studios.query, Studios, fields, Studios.version).filter(Studios.id == id).first()
 
     if studio is None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Studio {id} does not exists")
         
-    if request.content_type == "application/json":
-        return jsonify(studio.to_json()), status.HTTP_202_ACCEPTED  
+    representation = current_representation()
+    if representation is not None:
+        response = representation.response(studio.to_json(fields = fields))
+        return version_etag(response, studio.version), status.HTTP_202_ACCEPTED
     elif request.content_type == "application/xml":    
-        xml_data = studio.to_xml()
+        xml_data = studio.to_xml(fields = fields)
         response = Response(xml_data, mimetype="application/xml")
-        return response, status.HTTP_202_ACCEPTED
+        return version_etag(response, studio.version), status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 @evaluations.route("/api/evaluations/<int:id>", methods = ["GET"])
+@cached("evaluation:{id}")
 def get_evaluation(id: int):
     """Returns the evaluation with the given id
     """
-    evaluation = Studios.query.filter(Studios.id == id).first()
+    fields = requested_fields(Evaluations)
+    evaluation = only_fields(Evaluations.query, Evaluations, fields, Evaluations.version).filter(Evaluations.id == id).first()
 
     if evaluation is None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Evaluation {id} does not exists")
         
-    if request.content_type == "application/json":
-        return jsonify(evaluation.to_json()), status.HTTP_202_ACCEPTED  
+    representation = current_representation()
+    if representation is not None:
+        response = representation.response(evaluation.to_json(fields = fields))
+        return version_etag(response, evaluation.version), status.HTTP_202_ACCEPTED
     elif request.content_type == "application/xml":    
-        xml_data = evaluation.to_xml()
+        xml_data = evaluation.to_xml(fields = fields)
         response = Response(xml_data, mimetype="application/xml")
-        return response, status.HTTP_202_ACCEPTED
+        return version_etag(response, evaluation.version), status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 @pieces.route("/api/pieces", methods = ["GET"])
+@cached("pieces", "ratings")
 def all_pieces():
-    """Returns all the pieces of the collection
+    """Returns a page of the pieces of the collection ordered by id
+        (after a cursor, default first page, and up to limit pieces, default 100),
+        with their rating if rating=true
     """
-    all_pieces = Pieces.query.all()
-    if request.content_type == "application/json":
-        json_data = list(map(Pieces.to_json, all_pieces))
-        return jsonify(json_data), status.HTTP_202_ACCEPTED
+    after, limit = page_args(unbounded = stream_requested())
+    fields = requested_fields(Pieces)
+    query = only_fields(pieces_query(), Pieces, fields)
+    if stream_requested():
+        query = keyset_query(query, Pieces.id, after)
+        return stream_list("pieces", "Pieces", query, limit, keyset_cursor(Pieces.id), Pieces, fields)
+
+    all_pieces, next_cursor = keyset_page(query, Pieces.id, after, limit)
+    representation = current_representation()
+    if representation is not None:
+        json_data = {
+            "pieces": list(map(serializer(Pieces, Pieces.to_json, fields), all_pieces)),
+            "next": next_cursor
+        }
+        return representation.response(json_data), status.HTTP_202_ACCEPTED
     elif request.content_type == "application/xml":
-        xml_data = "".join(map(Pieces.to_xml, all_pieces))
-        xml_data = f"<Pieces> {xml_data} </Pieces>"
+        xml_data = "".join(map(serializer(Pieces, Pieces.to_xml, fields), all_pieces))
+        xml_data = f"<Pieces>{xml_data}{xml_next(next_cursor)}</Pieces>"
         response = Response(xml_data, mimetype="application/xml")
         return response, status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 @studios.route("/api/studios", methods = ["GET"])
+@cached("studios")
 def all_studios():
-    """ Returns all the studios
+    """ Returns a page of the studios ordered by id
+        (after a cursor, default first page, and up to limit studios, default 100)
     """
-    all_studios = Studios.query.all()
-    if request.content_type == "application/json":
-        json_data = list(map(Studios.to_json, all_studios))
-        return jsonify(json_data), status.HTTP_202_ACCEPTED
+    after, limit = page_args(unbounded = stream_requested())
+    fields = requested_fields(Studios)
+    query = only_fields(Studios.query, Studios, fields)
+    if stream_requested():
+        query = keyset_query(query, Studios.id, after)
+        return stream_list("studios", "Studios", query, limit, keyset_cursor(Studios.id), Studios, fields)
+
+    all_studios, next_cursor = keyset_page(query, Studios.id, after, limit)
+    representation = current_representation()
+    if representation is not None:
+        json_data = {
+            "studios": list(map(serializer(Studios, Studios.to_json, fields), all_studios)),
+            "next": next_cursor
+        }
+        return representation.response(json_data), status.HTTP_202_ACCEPTED
     elif request.content_type == "application/xml":
-        xml_data = "".join(map(Studios.to_xml, all_studios))
-        xml_data = f"<Studios> {xml_data} </Studios>"
+        xml_data = "".join(map(serializer(Studios, Studios.to_xml, fields), all_studios))
+        xml_data = f"<Studios>{xml_data}{xml_next(next_cursor)}</Studios>"
         response = Response(xml_data, mimetype="application/xml")
         return response, status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 @evaluations.route("/api/pieces/<int:id_piece>/evaluations", methods = ["GET"])
+@cached("evaluations_of:{id_piece}")
 def evaluations_filter(id_piece: int):
-    """Returns all the evaluations in a specific date (default 2022-12-13)
-        or from start (default 0) to end default (100)
+    """Returns the evaluations of a piece in a specific date (default 2022-12-13)
+        or between date_from and date_to, with a note between min_note and max_note,
+        ordered by date (order asc or desc) from start (default 0) to end default (100)
+        or after a cursor
     """
-    date = request.args.get("date", default = "2022-12-13")
+    date = date_arg("date")
+    date_from = date_arg("date_from")
+    date_to = date_arg("date_to")
+    if date is None and date_from is None and date_to is None:
+        date = datetime.date(2022, 12, 13)
+    min_note = request.args.get("min_note", type = int)
+    max_note = request.args.get("max_note", type = int)
+    order = request.args.get("order", default = "asc")
     start = request.args.get("start", default = 0, type = int)
-    end = request.args.get("end", default = 100, type = int)
-    evaluations = Evaluations.query.filter(Evaluations.date == date, Evaluations.piece == id_piece).all()
-    if evaluations is None:
-        abort(status.HTTP_404_NOT_FOUND, message=f"Evaluations Not Founded")
-    
-    evaluations = evaluations[start:(start + end)]
-    if request.content_type == "application/json":
-        json_data = list(map(Evaluations.to_json, evaluations))
-        return jsonify(json_data), status.HTTP_202_ACCEPTED
+    end = request.args.get("end", default = None if stream_requested() else 100, type = int)
+    if order not in ("asc", "desc"):
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Order must be asc or desc")
+    if start < 0 or (end is not None and end < 1) or (end is not None and end > MAX_LIMIT\
+        and not stream_requested()):
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Start must be positive and end between 1 and {MAX_LIMIT}")
+    after = request.args.get("after")
+    if after:
+        after = decode_cursor(after)
+        #The cursor is already past the rows skipped by the first page
+        start = 0
+
+    #Every filter is done by the database, using the (piece, date) index
+    fields = requested_fields(Evaluations)
+    query = only_fields(Evaluations.query, Evaluations, fields, Evaluations.date)\
+        .filter(Evaluations.piece == id_piece)
+    if date is not None:
+        query = query.filter(Evaluations.date == date)
+    if date_from is not None:
+        query = query.filter(Evaluations.date >= date_from)
+    if date_to is not None:
+        query = query.filter(Evaluations.date <= date_to)
+    if min_note is not None:
+        query = query.filter(Evaluations.note >= min_note)
+    if max_note is not None:
+        query = query.filter(Evaluations.note <= max_note)
+
+    key = (Evaluations.date, Evaluations.id)
+    if stream_requested():
+        query = keyset_query(query, key, after, descending = (order == "desc")).offset(start)
+        return stream_list("evaluations", "Evaluations", query, end, keyset_cursor(key), Evaluations, fields)
+
+    evaluations, next_cursor = keyset_page(query, key, after, end,\
+        descending = (order == "desc"), offset = start)
+    representation = current_representation()
+    if representation is not None:
+        json_data = {
+            "evaluations": list(map(serializer(Evaluations, Evaluations.to_json, fields), evaluations)),
+            "next": next_cursor
+        }
+        return representation.response(json_data), status.HTTP_202_ACCEPTED
+    elif request.content_type == "application/xml":
+        xml_data = "".join(map(serializer(Evaluations, Evaluations.to_xml, fields), evaluations))
+        xml_data = f"<Evaluations>{xml_data}{xml_next(next_cursor)}</Evaluations>"
+        response = Response(xml_data, mimetype="application/xml")
+        return response, status.HTTP_202_ACCEPTED
+    else: # Invalid format
+        abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
+
+@pieces.route("/api/pieces/<int:id>/rating", methods = ["GET"])
+@cached("rating:{id}")
+def piece_rating(id: int):
+    """Returns the number, sum, average and histogram of the notes of a piece
+    """
+    #The stats are kept by the writes of evaluations, the piece is only
+    #read when it has none
+    stats = db.session.get(PieceRatingStats, id)
+    if stats is None and db.session.get(Pieces, id) is None:
+        abort(status.HTTP_404_NOT_FOUND, message=f"Piece {id} does not exists")
+
+    representation = current_representation()
+    if representation is not None:
+        json_data = {"piece_id": id, **PieceRatingStats.json_of(stats)}
+        return representation.response(json_data), status.HTTP_202_ACCEPTED
     elif request.content_type == "application/xml":
-        xml_data = "".join(map(Evaluations.to_xml, evaluations))
-        xml_data = f"<Evaluations> {xml_data} </Evaluations>"
+        xml_data = PieceRatingStats.xml_of(stats)
+        xml_data = f"<Rating><piece_id>{id}</piece_id>{xml_data[len('<rating>'):-len('</rating>')]}</Rating>"
         response = Response(xml_data, mimetype="application/xml")
         return response, status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 @pieces.route("/api/studios/<int:studio_id>/pieces", methods = ["GET"])
+@cached("studio_pieces:{studio_id}")
 def pieces_by_studio(studio_id: int):
     """Returns the number of pieces with the given studio
     """
-    #We obtain all the pieces and filter by studio
-    pieces = Pieces.query.filter(Pieces.studio == studio_id).all()
-
-    if pieces is None:
-        abort(status.HTTP_404_NOT_FOUND, message=f"Studio {studio_id} does not have pieces")
+    #We read the maintained counter or count the pieces in the database
+    if counter_enabled():
+        counter = db.session.get(StudioPieceCounts, studio_id)
+        pieces = counter.count if counter is not None else 0
+    else:
+        pieces = db.session.query(func.count(Pieces.id)).filter(Pieces.studio == studio_id).scalar()
 
-    #We obtain the number of pieces
-    pieces = len(pieces)
-    if request.content_type == "application/json":
+    representation = current_representation()
+    if representation is not None:
         json_data = {
             "number of pieces": pieces
         }
-        return jsonify(json_data), status.HTTP_202_ACCEPTED
+        return representation.response(json_data), status.HTTP_202_ACCEPTED
 
     elif request.content_type == "application/xml":
-        xml_data = f"""
-        <Pieces>
-            <number> {pieces} </number>
-        </Pieces>
-        """
+        xml_data = f"<Pieces><number>{pieces}</number></Pieces>"
+        response = Response(xml_data, mimetype="application/xml")
+        return response, status.HTTP_202_ACCEPTED
+    else: # Invalid format
+        abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
+
+@studios.route("/api/studios/counts", methods = ["GET"])
+@cached("studio_counts")
+def studios_counts():
+    """Returns the number of pieces of every studio
+    """
+    #One query for all the studios, studios without pieces count 0
+    if counter_enabled():
+        count = func.coalesce(StudioPieceCounts.count, 0)
+        query = db.session.query(Studios.id, count)\
+            .outerjoin(StudioPieceCounts, StudioPieceCounts.studio == Studios.id)
+    else:
+        query = db.session.query(Studios.id, func.count(Pieces.id))\
+            .outerjoin(Pieces, Pieces.studio == Studios.id).group_by(Studios.id)
+    counts = query.order_by(Studios.id).all()
+
+    representation = current_representation()
+    if representation is not None:
+        json_data = [{"id": studio, "number of pieces": pieces} for studio, pieces in counts]
+        return representation.response(json_data), status.HTTP_202_ACCEPTED
+
+    elif request.content_type == "application/xml":
+        xml_data = "".join(f"<Studio><id>{studio}</id><number>{pieces}</number></Studio>"\
+            for studio, pieces in counts)
+        xml_data = f"<Studios>{xml_data}</Studios>"
         response = Response(xml_data, mimetype="application/xml")
         return response, status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 @evaluations.route("/api/evaluations", methods = ["GET"])
+@cached("evaluations")
 def get_evaluations_pattern():
-    """Returns all evaluations whose text contains a pattern
+    """Returns the evaluations whose text contains the words of a pattern,
+        best ranked first (mode words, phrase or prefix), a page of limit
+        evaluations (default 100) after a cursor
     """
     pattern = request.args.get("pattern", default="")
-    evaluations = Evaluations.query.filter(Evaluations.text.contains(pattern)).all()
-    if evaluations is None:
-        abort(status.HTTP_404_NOT_FOUND, message=f"No evaluation contains that pattern")
-    
-    if request.content_type == "application/json":
-        json_data = list(map(Evaluations.to_json, evaluations))
-        return jsonify(json_data), status.HTTP_202_ACCEPTED
+    mode = request.args.get("mode", default="words")
+    if mode not in search.MODES:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Mode must be one of {', '.join(search.MODES)}")
+
+    after, limit = page_args(unbounded = stream_requested())
+    fields = requested_fields(Evaluations)
+    query = search.search(pattern, mode)
+    if query is not None:
+        query = only_fields(query, Evaluations, fields)
+    if stream_requested():
+        if query is None:
+            query = keyset_query(only_fields(Evaluations.query, Evaluations, fields), Evaluations.id, after)
+            cursor = keyset_cursor(Evaluations.id)
+        else:
+            offset, cursor = offset_cursor(after)
+            query = query.offset(offset)
+        return stream_list("evaluations", "Evaluations", query, limit, cursor, Evaluations, fields)
+
+    if query is None:
+        #Without words every evaluation matches
+        evaluations, next_cursor = keyset_page(only_fields(Evaluations.query, Evaluations, fields),\
+            Evaluations.id, after, limit)
+    else:
+        evaluations, next_cursor = offset_page(query, after, limit)
+
+    representation = current_representation()
+    if representation is not None:
+        json_data = {
+            "evaluations": list(map(serializer(Evaluations, Evaluations.to_json, fields), evaluations)),
+            "next": next_cursor
+        }
+        return representation.response(json_data), status.HTTP_202_ACCEPTED
     elif request.content_type == "application/xml":    
-        xml_data = "".join(map(Evaluations.to_xml, evaluations))
-        xml_data = f"<Evaluations> {xml_data} </Evaluations>"
+        xml_data = "".join(map(serializer(Evaluations, Evaluations.to_xml, fields), evaluations))
+        xml_data = f"<Evaluations>{xml_data}{xml_next(next_cursor)}</Evaluations>"
         response = Response(xml_data, mimetype="application/xml")
         return response, status.HTTP_202_ACCEPTED
     else: # Invalid format
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
 #DELETE
+def delete_pieces_and_evaluations(ids: list) -> list:
+    """Deletes some pieces and all their evaluations, one statement for each
+    table, in the current transaction.
+
+    Args:
+        ids: ids of the pieces.
+
+    Returns:
+        (list of (id, studio) of the deleted pieces, cache tags to invalidate)
+    """
+    #First we must delete all the evaluations that reference these pieces
+    deleted_evaluations = db.session.execute(
+        delete(Evaluations).where(Evaluations.piece.in_(ids)).returning(Evaluations.id),
+        execution_options = {"synchronize_session": False}
+    ).scalars().all()
+    deleted_pieces = db.session.execute(
+        delete(Pieces).where(Pieces.id.in_(ids)).returning(Pieces.id, Pieces.studio),
+        execution_options = {"synchronize_session": False}
+    ).all()
+
+    studios = Counter(studio for id, studio in deleted_pieces)
+    if counter_enabled():
+        for studio, count in studios.items():
+            StudioPieceCounts.add(studio, -count)
+    PieceRatingStats.remove_pieces([id for id, studio in deleted_pieces])
+
+    tags = ["pieces", "studio_counts", "evaluations", "ratings"]
+    tags += [f"piece:{id}" for id, studio in deleted_pieces]
+    tags += [f"evaluations_of:{id}" for id, studio in deleted_pieces]
+    tags += [f"rating:{id}" for id, studio in deleted_pieces]
+    tags += [f"studio_pieces:{studio}" for studio in studios]
+    tags += [f"evaluation:{id}" for id in deleted_evaluations]
+    return deleted_pieces, tags
+
 @pieces.route("/api/pieces/<int:id>", methods = ["DELETE"])
 def delete_piece(id: int):
-    """Delete a piece by id
+    """Delete a piece by id and its evaluations
     """
-    #First we must delete all the evaluations that reference this piece
-    evaluations = Evaluations.query.filter(Evaluations.piece == id).all()
-    for evaluation in evaluations:
-        delete_evaluation(evaluation.id)
-        
-    #We get the piece
-    piece = Pieces.query.filter(Pieces.id == id).first()
-    if piece == None:
+    deleted, tags = delete_pieces_and_evaluations([id])
+    if not deleted:
+        db.session.rollback()
         abort(status.HTTP_404_NOT_FOUND, message=f"Piece {id} does not exists")
 
-    db.session.delete(piece)
     db.session.commit()
 
+    invalidate(*tags)
     return "", status.HTTP_204_NO_CONTENT
 
+@pieces.route("/api/pieces", methods = ["DELETE"])
+def delete_pieces():
+    """Delete the pieces whose ids are given (ids=1,2,3) and their evaluations
+    """
+    try:
+        ids = [int(id) for id in request.args.get("ids", default = "").split(",") if id.strip()]
+    except ValueError:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Ids not valid!")
+    if not ids:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Missing ids!")
+    if len(ids) > current_app.config.get("BULK_MAX_ITEMS", MAX_BULK_ITEMS):
+        abort(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, message=f"Too many items!")
+
+    deleted, tags = delete_pieces_and_evaluations(ids)
+    deleted = sorted(id for id, studio in deleted)
+    db.session.commit()
+
+    invalidate(*tags)
+    if request.content_type == "application/xml":
+        xml_data = "".join(f"<id>{id}</id>" for id in deleted)
+        xml_data = f"<Deleted>{xml_data}</Deleted>"
+        return Response(xml_data, mimetype="application/xml"), status.HTTP_202_ACCEPTED
+    #JSON for the other types
+    representation = current_representation() or REPRESENTATIONS["application/json"]
+    return representation.response({"deleted": deleted}), status.HTTP_202_ACCEPTED
+
 @studios.route("/api/studios/<int:id>", methods = ["DELETE"])
 def delete_studio(id: int):
     """Delete a studio by id only if it does not have any associated pieces
@@ -296,13 +736,19 @@ def delete_studio(id: int):
     if studio == None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Studio {id} does not exists")
     
-    pieces = Pieces.query.filter(Pieces.studio == id).all()
-    if pieces is None:
+    has_pieces = db.session.query(Pieces.query.filter(Pieces.studio == id).exists()).scalar()
+    if has_pieces:
         abort(status.HTTP_400_BAD_REQUEST, message = f"Studio {id} has associated pieces")
     
-    db.session.delete(studio)
-    db.session.commit()
+    #Its count is 0 but the row is kept after its last piece
+    try:
+        StudioPieceCounts.remove(id)
+        db.session.delete(studio)
+        db.session.commit()
+    except StaleDataError:
+        modified_meanwhile(Studios, id)
 
+    invalidate(f"studio:{id}", "studios", f"studio_pieces:{id}", "studio_counts")
     return "", status.HTTP_204_NO_CONTENT
 
 @evaluations.route("/api/evaluations/<int:id>", methods = ["DELETE"])
@@ -310,15 +756,45 @@ def delete_evaluation(id: int):
     """Delete an evaluation by id
     """
     evaluation = Evaluations.query.filter(Evaluations.id == id).first()
-    if evaluations == None:
+    if evaluation == None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Evaluation {id} does not exists")
 
-    db.session.delete(evaluation)
-    db.session.commit()
+    try:
+        db.session.delete(evaluation)
+        PieceRatingStats.add(evaluation.piece, Counter([evaluation.note]), -1)
+        db.session.commit()
+    except StaleDataError:
+        modified_meanwhile(Evaluations, id)
 
+    invalidate(f"evaluation:{id}", "evaluations", f"evaluations_of:{evaluation.piece}", "ratings",\
+        f"rating:{evaluation.piece}")
     return "", status.HTTP_204_NO_CONTENT
 
 #PUT
+def put_item(model) -> dict:
+    """Reads the fields of a PUT, which replaces all of them: the body of a
+    PATCH (see patch_item) with every field of the resource.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+
+    Returns:
+        column values of the fields, validated
+    """
+    values = patch_item(model)
+    missing = [field for field, attribute in model.xml_codec.fields.items()\
+        if field not in READ_ONLY and attribute not in values]
+    if missing:
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Missing {', '.join(missing)}!")
+    return values
+
+def put_values(row, values: dict) -> None:
+    """Writes the validated values of a PUT to the row read by the request,
+    the ORM updates it (and checks its version) at the commit.
+    """
+    for attribute, value in values.items():
+        setattr(row, attribute, value)
+
 @pieces.route("/api/pieces/<int:id>", methods = ["PUT"])
 def update_piece(id: int):
     """Update a piece from the collection
@@ -327,15 +803,29 @@ def update_piece(id: int):
     if piece == None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Piece {id} does not exists")
 
-    if request.content_type == "application/xml":
-        piece.update_xml(request.get_data())
-    elif request.content_type == "application/json":
-        piece.update_json(request.get_json())
-    else:
-        abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
+    old_studio = piece.studio
+    put_values(piece, put_item(Pieces))
 
-    db.session.commit()
+    #The rollback expires the piece, its new studio is kept for the message
+    new_studio = piece.studio
+    try:
+        if counter_enabled() and old_studio != new_studio:
+            #A studio that does not exist fails when the piece is flushed by the counts
+            try:
+                StudioPieceCounts.add(old_studio, -1)
+                StudioPieceCounts.add(new_studio, 1)
+            except IntegrityError:
+                db.session.rollback()
+                abort(status.HTTP_400_BAD_REQUEST, message=f"Studio {new_studio} not valid!")
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Data not valid!")
+    except StaleDataError:
+        modified_meanwhile(Pieces, id)
 
+    invalidate(f"piece:{id}", "pieces", f"studio_pieces:{old_studio}", f"studio_pieces:{piece.studio}",\
+        "studio_counts")
     return piece.to_xml(), status.HTTP_202_ACCEPTED
 
 @studios.route("/api/studios/<int:id>", methods = ["PUT"])
@@ -346,15 +836,17 @@ def update_studio(id: int):
     if studio == None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Studio {id} does not exists")
 
-    if request.content_type == "application/xml":
-        studio.update_xml(request.get_data())
-    elif request.content_type == "application/json":
-        studio.update_json(request.get_json())
-    else:
-        abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
+    put_values(studio, put_item(Studios))
 
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Data not valid!")
+    except StaleDataError:
+        modified_meanwhile(Studios, id)
 
+    invalidate(f"studio:{id}", "studios")
     return studio.to_xml(), status.HTTP_202_ACCEPTED
 
 @evaluations.route("/api/evaluations/<int:id>", methods = ["PUT"])
@@ -365,14 +857,189 @@ def update_evaluation(id: int):
     if evaluation == None:
         abort(status.HTTP_404_NOT_FOUND, message=f"Evaluation {id} does not exists")
 
+    old_piece = evaluation.piece
+    old_note = evaluation.note
+    put_values(evaluation, put_item(Evaluations))
+
+    #The rollback expires the evaluation, its new piece is kept for the message
+    new_piece = evaluation.piece
+    try:
+        #A piece that does not exist fails when the evaluation is flushed by the ratings
+        try:
+            if old_piece != new_piece or old_note != evaluation.note:
+                PieceRatingStats.add(old_piece, Counter([old_note]), -1)
+                PieceRatingStats.add(new_piece, Counter([evaluation.note]))
+        except IntegrityError:
+            db.session.rollback()
+            abort(status.HTTP_400_BAD_REQUEST, message=f"Piece {new_piece} not valid!")
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Data not valid!")
+    except StaleDataError:
+        modified_meanwhile(Evaluations, id)
+
+    invalidate(f"evaluation:{id}", "evaluations", f"evaluations_of:{old_piece}",\
+        f"evaluations_of:{new_piece}", "ratings", f"rating:{old_piece}", f"rating:{new_piece}")
+    return evaluation.to_xml(), status.HTTP_202_ACCEPTED
+
+#PATCH
+def patch_item(model) -> dict:
+    """Reads the fields of a PATCH: a JSON object (or a list with one object
+    like the body of a PUT) or one XML element.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+
+    Returns:
+        column values of the fields, validated
+    """
+    representation = current_representation()
     if request.content_type == "application/xml":
-        evaluation.update_xml(request.get_data())
-    elif request.content_type == "application/json":
-        evaluation.update_json(request.get_json())
+        item, many = xml_items(model)
+    elif representation is not None:
+        item = representation.request_data()
     else:
         abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
 
+    if isinstance(item, list) and len(item) == 1:
+        item = item[0]
+    if not isinstance(item, dict):
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Missing data!")
+    try:
+        return patch_values(model, item)
+    except ValueError as error:
+        abort(status.HTTP_400_BAD_REQUEST, message=str(error))
+
+def if_match_versions() -> list:
+    """Versions of the If-Match of the request, None without it or with *.
+    The tags are the ETags of the GET and PATCH answers ("3-<hash>") or
+    bare versions ("3"), a weak or other tag matches no version.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    versions = [tag.split("-", 1)[0] for tag in request.if_match.as_set()]
+    return [int(version) for version in versions if version.isdigit()]
+
+def current_row(model, id: int, *columns):
+    """Values of some columns of a row before a PATCH changes them, locked
+    until the end of the transaction (FOR UPDATE where the database has it).
+    Only used where an UPDATE cannot return them (not PostgreSQL).
+    """
+    row = db.session.execute(select(*columns).where(model.id == id).with_for_update()).first()
+    if row is None:
+        abort(status.HTTP_404_NOT_FOUND, message=f"{model.xml_codec.element} {id} does not exists")
+    return row
+
+def patch_row(model, id: int, values: dict, *old_columns):
+    """Writes some fields of a row with one UPDATE ... RETURNING, which also
+    adds 1 to its version and, with If-Match, only matches the versions given.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+        values: column values of the fields.
+        old_columns: columns whose values before the UPDATE are needed too,
+            returned by the same statement on PostgreSQL (WITH old AS
+            (SELECT ... FOR UPDATE) UPDATE ... FROM old) and read first by a
+            SELECT elsewhere, as SQLite only returns the updated table.
+
+    Returns:
+        the updated row and the old values of old_columns (None without them)
+    """
+    versions = if_match_versions()
+    old = None
+    returned = []
+    statement = update(model)
+    if old_columns and db.session.connection().dialect.name == "postgresql":
+        before = select(model.id, *old_columns).where(model.id == id).with_for_update().cte("old")
+        returned = [before.c[column.key].label(f"old_{column.key}") for column in old_columns]
+        statement = statement.where(model.id == before.c.id)
+    else:
+        if old_columns:
+            old = tuple(current_row(model, id, *old_columns))
+        statement = statement.where(model.id == id)
+    if versions is not None:
+        statement = statement.where(model.version.in_(versions))
+    statement = statement.values(version = model.version + 1, **values).returning(model, *returned)
+    try:
+        result = db.session.execute(statement, execution_options = {"synchronize_session": False}).first()
+    except IntegrityError:
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Data not valid!")
+
+    if result is None:
+        #Only a failed PATCH reads the row again, to tell why
+        db.session.rollback()
+        exists = db.session.query(model.query.filter(model.id == id).exists()).scalar()
+        if not exists:
+            abort(status.HTTP_404_NOT_FOUND, message=f"{model.xml_codec.element} {id} does not exists")
+        abort(status.HTTP_412_PRECONDITION_FAILED, message=f"{model.xml_codec.element} {id} was modified")
+    row = result[0]
+    if returned:
+        old = tuple(result[1:])
+    #The answer is written from the values returned, not read again after the commit
+    db.session.expunge(row)
+    return row, old
+
+def patched(row):
+    """Answer of a PATCH, the updated row in the format of the request with
+    the ETag that If-Match of the next PATCH gives back.
+    """
+    representation = current_representation()
+    if representation is not None:
+        return version_etag(representation.response(row.to_json()), row.version), status.HTTP_202_ACCEPTED
+    response = Response(row.to_xml(), mimetype="application/xml")
+    return version_etag(response, row.version), status.HTTP_202_ACCEPTED
+
+@pieces.route("/api/pieces/<int:id>", methods = ["PATCH"])
+def patch_piece(id: int):
+    """Update some fields of a piece, if its version is one of If-Match when
+    it is given
+    """
+    values = patch_item(Pieces)
+    #The counters and the list of the old studio need the studio it leaves
+    piece, old = patch_row(Pieces, id, values, *([Pieces.studio] if "studio" in values else []))
+    old_studio = old[0] if old is not None else None
+
+    tags = [f"piece:{id}", "pieces", f"studio_pieces:{piece.studio}"]
+    if "studio" in values and old_studio != piece.studio:
+        if counter_enabled():
+            StudioPieceCounts.add(old_studio, -1)
+            StudioPieceCounts.add(piece.studio, 1)
+        tags += [f"studio_pieces:{old_studio}", "studio_counts"]
     db.session.commit()
 
-    return evaluation.to_xml(), status.HTTP_202_ACCEPTED
+    invalidate(*tags)
+    return patched(piece)
+
+@studios.route("/api/studios/<int:id>", methods = ["PATCH"])
+def patch_studio(id: int):
+    """Update some fields of a studio, if its version is one of If-Match when
+    it is given
+    """
+    studio, _ = patch_row(Studios, id, patch_item(Studios))
+    db.session.commit()
+
+    invalidate(f"studio:{id}", "studios")
+    return patched(studio)
+
+@evaluations.route("/api/evaluations/<int:id>", methods = ["PATCH"])
+def patch_evaluation(id: int):
+    """Update some fields of an evaluation, if its version is one of If-Match
+    when it is given
+    """
+    values = patch_item(Evaluations)
+    #The rating of the pieces needs the note it had
+    moved = "piece" in values or "note" in values
+    evaluation, old = patch_row(Evaluations, id, values, *([Evaluations.piece, Evaluations.note] if moved else []))
+
+    tags = [f"evaluation:{id}", "evaluations", f"evaluations_of:{evaluation.piece}"]
+    if old is not None and old != (evaluation.piece, evaluation.note):
+        old_piece, old_note = old
+        PieceRatingStats.add(old_piece, Counter([old_note]), -1)
+        PieceRatingStats.add(evaluation.piece, Counter([evaluation.note]))
+        tags += [f"evaluations_of:{old_piece}", "ratings", f"rating:{old_piece}", f"rating:{evaluation.piece}"]
+    db.session.commit()
 
+    invalidate(*tags)
+    return patched(evaluation)
@@ -0,0 +1,62 @@
+"""REID
+   Reads of the GET requests on a replica of the database
+
+   With DATABASE_REPLICA_URI the app has a second engine, the "replica"
+   bind, and the session runs the statements of the GET requests on it.
+   The other requests, and the CLI commands, run on the primary.
+
+   A replica is behind the primary, so a client that has just written
+   gets a cookie, and its reads go to the primary (without the answer
+   cache) for READ_YOUR_WRITES_SECONDS.
+"""
+
+import time
+import flask_sqlalchemy.session
+from flask import current_app, has_request_context, request
+
+# Bind key of the replica in SQLALCHEMY_BINDS
+REPLICA = "replica"
+# Requests whose statements can run on the replica
+READ_METHODS = ("GET", "HEAD")
+# Time (of the server) until which the client reads from the primary
+COOKIE = "catalog_primary_until"
+
+def after_own_write() -> bool:
+    """Checks if the client of the request wrote less than
+    READ_YOUR_WRITES_SECONDS ago.
+    """
+    try:
+        return float(request.cookies.get(COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def reads_replica() -> bool:
+    """Checks if the statements of the current request can run on the replica.
+    """
+    return has_request_context() and request.method in READ_METHODS and not after_own_write()
+
+class RoutingSession(flask_sqlalchemy.session.Session):
+    """Session that runs the statements of the GET requests on the replica,
+    if the app has one, and everything else on the bind of the model"""
+
+    def get_bind(self, mapper = None, clause = None, bind = None, **kwargs):
+        if bind is None:
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None and reads_replica():
+                return replica
+        return super().get_bind(mapper = mapper, clause = clause, bind = bind, **kwargs)
+
+def remember_write(response):
+    """Sets the cookie of the client after a successful write.
+    """
+    if request.method not in READ_METHODS and response.status_code < 400:
+        seconds = current_app.config["READ_YOUR_WRITES_SECONDS"]
+        response.set_cookie(COOKIE, f"{time.time() + seconds:.3f}", max_age = seconds, httponly = True,\
+            path = request.script_root or "/")
+    return response
+
+def init_app(app) -> None:
+    """Adds the cookie of read-your-writes to an app with a replica.
+    """
+    if REPLICA in app.config.get("SQLALCHEMY_BINDS", {}) and app.config["READ_YOUR_WRITES_SECONDS"] > 0:
+        app.after_request(remember_write)
@@ -0,0 +1,132 @@
+"""REID
+   Full-text search of the evaluations text
+
+   PostgreSQL keeps a tsvector column with a GIN index and SQLite an FTS5
+   table kept in sync with triggers, so a search reads only the matching
+   rows. Any other database falls back to LIKE.
+"""
+
+import re
+
+from sqlalchemy import DDL, column, event, func, literal_column, table
+from modelsAlchemy import db, Evaluations
+
+MODES = ("words", "phrase", "prefix")
+
+POSTGRES_INSTALL = [
+    DDL("ALTER TABLE evaluations ADD COLUMN IF NOT EXISTS text_search tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED"),
+    DDL("CREATE INDEX IF NOT EXISTS ix_evaluations_text_search "
+        "ON evaluations USING GIN (text_search)"),
+]
+
+SQLITE_INSTALL = [
+    DDL("CREATE VIRTUAL TABLE IF NOT EXISTS evaluations_fts "
+        "USING fts5(text, content='evaluations', content_rowid='id')"),
+    DDL("CREATE TRIGGER IF NOT EXISTS evaluations_fts_insert AFTER INSERT ON evaluations BEGIN "
+        "INSERT INTO evaluations_fts(rowid, text) VALUES (new.id, new.text); END"),
+    DDL("CREATE TRIGGER IF NOT EXISTS evaluations_fts_delete AFTER DELETE ON evaluations BEGIN "
+        "INSERT INTO evaluations_fts(evaluations_fts, rowid, text) VALUES ('delete', old.id, old.text); END"),
+    DDL("CREATE TRIGGER IF NOT EXISTS evaluations_fts_update AFTER UPDATE OF text ON evaluations BEGIN "
+        "INSERT INTO evaluations_fts(evaluations_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+        "INSERT INTO evaluations_fts(rowid, text) VALUES (new.id, new.text); END"),
+    # Index the rows that already exist
+    DDL("INSERT INTO evaluations_fts(evaluations_fts) VALUES ('rebuild')"),
+]
+
+SQLITE_UNINSTALL = [
+    DDL("DROP TABLE IF EXISTS evaluations_fts"),
+]
+
+text_search = literal_column("evaluations.text_search")
+evaluations_fts = table("evaluations_fts", column("rowid"), column("rank"), column("evaluations_fts"))
+
+def install(connection) -> None:
+    """Creates the search index of the evaluations table.
+
+    Args:
+        connection: connection where the evaluations table exists.
+    """
+    if connection.dialect.name == "postgresql":
+        statements = POSTGRES_INSTALL
+    elif connection.dialect.name == "sqlite":
+        statements = SQLITE_INSTALL
+    else:
+        statements = []
+    for statement in statements:
+        connection.execute(statement)
+
+def uninstall(connection) -> None:
+    """Drops the search index that is not removed with the evaluations table.
+
+    Args:
+        connection: connection where the evaluations table exists.
+    """
+    if connection.dialect.name == "sqlite":
+        for statement in SQLITE_UNINSTALL:
+            connection.execute(statement)
+
+event.listen(Evaluations.__table__, "after_create",\
+    lambda target, connection, **kw: install(connection))
+event.listen(Evaluations.__table__, "before_drop",\
+    lambda target, connection, **kw: uninstall(connection))
+
+def words(pattern: str) -> list:
+    """Splits a pattern into lower case words.
+    """
+    return re.findall(r"\w+", pattern.lower())
+
+def fts5_query(terms: list, mode: str) -> str:
+    """Builds a FTS5 MATCH expression. Every word is quoted so the
+    pattern can not inject FTS5 operators.
+    """
+    if mode == "phrase":
+        return '"' + " ".join(terms) + '"'
+    if mode == "prefix":
+        return " ".join(f'"{term}"*' for term in terms)
+    return " ".join(f'"{term}"' for term in terms)
+
+def ts_query(terms: list, mode: str):
+    """Builds a PostgreSQL tsquery.
+    """
+    if mode == "phrase":
+        return func.phraseto_tsquery("simple", " ".join(terms))
+    if mode == "prefix":
+        return func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+    return func.plainto_tsquery("simple", " ".join(terms))
+
+def search(pattern: str, mode: str = "words"):
+    """Query of the evaluations matching a pattern, best ranked first.
+
+    Args:
+        pattern: words to look for.
+        mode: words (all the words), phrase (the words together and in order)
+            or prefix (words starting with every term).
+
+    Returns:
+        query of evaluations, None if the pattern has no words
+    """
+    terms = words(pattern)
+    if not terms:
+        return None
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        tsquery = ts_query(terms, mode)
+        return Evaluations.query.filter(text_search.op("@@")(tsquery))\
+            .order_by(func.ts_rank(text_search, tsquery).desc(), Evaluations.id)
+
+    if dialect == "sqlite":
+        return Evaluations.query\
+            .join(evaluations_fts, evaluations_fts.c.rowid == Evaluations.id)\
+            .filter(evaluations_fts.c.evaluations_fts.op("MATCH")(fts5_query(terms, mode)))\
+            .order_by(evaluations_fts.c.rank, Evaluations.id)
+
+    #No text index, scan the table
+    query = Evaluations.query
+    if mode == "phrase":
+        query = query.filter(Evaluations.text.contains(" ".join(terms)))
+    else:
+        for term in terms:
+            query = query.filter(Evaluations.text.contains(term))
+    return query.order_by(Evaluations.id)
@@ -0,0 +1,74 @@
+"""REID
+   Example data of the catalog
+
+   The seed can run on every start: a studio or piece that already exists
+   (by name) is not added again, nor an evaluation with the same piece,
+   note, date and text.
+"""
+
+from modelsAlchemy import db, Pieces, Studios, Evaluations, StudioPieceCounts, PieceRatingStats, to_date
+
+STUDIOS = [
+    ("Estudio 1", "email1@email.com", "+34-123456789"),
+    ("Estudio 2", "email2@email.com", "+34-234567891"),
+    ("Estudio 3", "email3@email.com", "+1-123456789"),
+    ("Estudio 4", "email4@email.com", "+34-987654321"),
+]
+
+# The studio and the piece are given by name
+PIECES = [
+    ("Piece 1", "2022-12-16", "band", "vocal", "spanish", "Estudio 1", "This piece..."),
+    ("Piece 2", "2018-11-14", "composer", "instrumental", "spanish", "Estudio 1", "This piece..."),
+    ("Piece 3", "1987-07-13", "band", "intrumental", "french", "Estudio 2", "This piece..."),
+    ("Piece 4", "1967-05-22", "composer", "vocal", "english", "Estudio 2", "This piece..." ),
+]
+
+EVALUATIONS = [
+    ("Piece 1", 4, "2021-08-11", "The piece is good"),
+    ("Piece 1", 2, "2021-08-11", "The piece is bad"),
+    ("Piece 2", 5, "2022-01-14", "The piece is good"),
+    ("Piece 3", 1, "2017-11-02", "The piece is bad"),
+]
+
+def seed() -> dict:
+    """Adds the example studios, pieces and evaluations that are missing.
+
+    Returns:
+        number of studios, pieces and evaluations added
+    """
+    added = {"studios": 0, "pieces": 0, "evaluations": 0}
+
+    studios = {studio.name: studio.id for studio in Studios.query\
+        .filter(Studios.name.in_([name for name, *_ in STUDIOS]))}
+    for name, email, phone in STUDIOS:
+        if name not in studios:
+            studio = Studios(name, email, phone)
+            db.session.add(studio)
+            db.session.flush()
+            studios[name] = studio.id
+            added["studios"] += 1
+
+    pieces = {piece.name: piece.id for piece in Pieces.query\
+        .filter(Pieces.name.in_([name for name, *_ in PIECES]))}
+    for name, date, author, genre, nationality, studio, summary in PIECES:
+        if name not in pieces:
+            piece = Pieces(name, date, author, genre, nationality, studios[studio], summary)
+            db.session.add(piece)
+            db.session.flush()
+            pieces[name] = piece.id
+            added["pieces"] += 1
+    if added["pieces"]:
+        StudioPieceCounts.rebuild()
+
+    for piece, note, date, text in EVALUATIONS:
+        exists = Evaluations.query.filter(Evaluations.piece == pieces[piece], Evaluations.note == note,\
+            Evaluations.date == to_date(date), Evaluations.text == text).first()
+        if exists is None:
+            db.session.add(Evaluations(pieces[piece], note, date, text))
+            added["evaluations"] += 1
+    if added["evaluations"]:
+        db.session.flush()
+        PieceRatingStats.rebuild()
+
+    db.session.commit()
+    return added
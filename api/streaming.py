@@ -0,0 +1,109 @@
+"""REID
+   Streamed answers for the lists
+
+   With ?stream=true a list is sent while it is read: the rows are fetched
+   in batches (yield_per, a server side cursor on PostgreSQL) and written
+   as chunks in the format of the request, so the memory used does not depend on the size
+   of the list.
+"""
+
+from flask import request, Response, stream_with_context
+from flask_restful import abort
+from pagination import xml_next
+from representations import current_representation
+from urls import serializer
+import status
+
+# Rows fetched from the database at once
+BATCH_ROWS = 500
+# Bytes sent at once
+CHUNK_SIZE = 64 * 1024
+
+def stream_requested() -> bool:
+    """Checks if the request asks for a streamed answer.
+    """
+    return request.args.get("stream", default = "false").lower() in ("1", "true", "yes")
+
+class StreamedPage:
+    """Iterates over the rows of a query up to a limit and keeps the cursor
+    of the next page, which is known once the rows have been sent.
+    """
+
+    def __init__(self, query, limit: int, cursor) -> None:
+        """
+        Args:
+            query: ordered query.
+            limit: maximum number of rows or None for all of them.
+            cursor: function (last row, number of rows) -> next cursor.
+        """
+        if limit is not None:
+            # One extra row to know if there is a next page
+            query = query.limit(limit + 1)
+        self.rows = query.yield_per(BATCH_ROWS)
+        self.session = query.session
+        self.limit = limit
+        self.cursor = cursor
+        self.next = None
+
+    def __iter__(self):
+        last = None
+        try:
+            for count, row in enumerate(self.rows):
+                if count == self.limit:
+                    self.next = self.cursor(last, count)
+                    break
+                yield row
+                last = row
+        finally:
+            # The session of the view is removed when the answer starts, the
+            # connection of the rows goes back to the pool here
+            self.session.close()
+
+def xml_chunks(root: str, page: StreamedPage, to_xml):
+    """XML envelope <root>...<next/></root> written row by row.
+    """
+    yield f"<{root}>"
+    for row in page:
+        yield to_xml(row)
+    yield f"{xml_next(page.next)}</{root}>"
+
+def buffered(chunks, size: int = CHUNK_SIZE):
+    """Joins small chunks so every write to the client has about size bytes.
+    """
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            # Text or bytes
+            yield buffer[0][:0].join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield buffer[0][:0].join(buffer)
+
+def stream_list(name: str, root: str, query, limit: int, cursor, model, fields: tuple = None) -> Response:
+    """Streamed answer with the rows of a query in the format of the request.
+
+    Args:
+        name: key of the list in JSON and the other representations (e.g. pieces).
+        root: root element in XML (e.g. Pieces).
+        query: ordered query.
+        limit: maximum number of rows or None for all of them.
+        cursor: function (last row, number of rows) -> next cursor.
+        model: model with the to_json and to_xml serializers.
+        fields: fields written (default all), see fieldsets.py.
+    """
+    representation = current_representation()
+    if representation is not None:
+        chunks = representation.chunks(name, StreamedPage(query, limit, cursor), serializer(model, model.to_json, fields))
+        mimetype = representation.mimetype
+    elif request.content_type == "application/xml":
+        chunks = xml_chunks(root, StreamedPage(query, limit, cursor), serializer(model, model.to_xml, fields))
+        mimetype = "application/xml"
+    else: # Invalid format
+        abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a JSON or XML!")
+
+    return Response(stream_with_context(buffered(chunks)), status = status.HTTP_202_ACCEPTED,\
+        mimetype = mimetype)
@@ -0,0 +1,341 @@
+"""REID
+   Streamed import and export of the catalog as NDJSON or CSV
+
+   An export reads the rows in batches (a server side cursor on PostgreSQL)
+   and writes them while they are read. An import reads the input one line
+   at a time and writes batches of IMPORT_BATCH_ROWS rows, each committed
+   on its own, so the memory used does not depend on the size of the file.
+   PostgreSQL loads every batch with COPY, any other database with one
+   INSERT of many rows.
+
+   Every row is normalized and checked like the body of a POST (json_values
+   of the model), the invalid ones are reported and skipped. The fields are
+   the ones of the JSON answers without the url, so an export can be
+   imported again; when the rows have an id it is kept.
+"""
+
+import csv
+import datetime
+import io
+import json
+import time
+from flask import Blueprint, current_app, jsonify, request, Response, stream_with_context
+from flask_restful import abort
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import DataError, IntegrityError
+from modelsAlchemy import db, Pieces, Studios, Evaluations
+from resourceAlchemy import pieces_inserted, studios_inserted, evaluations_inserted
+from streaming import BATCH_ROWS, buffered
+from validation import check_values
+from cache import invalidate
+import status
+
+# Content type of the request -> format
+FORMATS = {"application/x-ndjson": "ndjson", "text/csv": "csv"}
+MIMETYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Table -> (model, function called in the transaction with the inserted
+# rows that returns the cache tags to invalidate)
+TABLES = {
+    "pieces": (Pieces, pieces_inserted),
+    "studios": (Studios, studios_inserted),
+    "evaluations": (Evaluations, evaluations_inserted),
+}
+
+# Rows written and committed at once by an import
+IMPORT_BATCH_ROWS = 5000
+# Invalid rows listed in the report of an import, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+transfer = Blueprint("transfer", __name__)
+
+def format_of(path: str, format: str = None) -> str:
+    """Format given or guessed from the extension of a file (NDJSON by default).
+    """
+    if format is not None:
+        return format
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+def copy_cursor():
+    """Cursor of the connection of the current transaction if it can run COPY
+    (PostgreSQL with psycopg or psycopg2), None otherwise.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != "postgresql":
+        return None
+    cursor = connection.connection.cursor()
+    return cursor if hasattr(cursor, "copy") or hasattr(cursor, "copy_expert") else None
+
+def copy_from(cursor, statement: str, data: str) -> None:
+    """Runs a COPY ... FROM STDIN with the given text.
+    """
+    if hasattr(cursor, "copy"):
+        with cursor.copy(statement) as copy:
+            copy.write(data)
+    else:
+        cursor.copy_expert(statement, io.StringIO(data))
+
+def copy_to(cursor, statement: str, output) -> None:
+    """Runs a COPY ... TO STDOUT and writes the text in a file.
+    """
+    if hasattr(cursor, "copy"):
+        with cursor.copy(statement) as copy:
+            for data in copy:
+                output.write(bytes(data).decode("utf-8"))
+    else:
+        cursor.copy_expert(statement, output)
+
+def throughput(report: dict, start: float) -> dict:
+    """Adds the seconds since start and the rows per second to a report.
+    """
+    seconds = time.perf_counter() - start
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["rows"] / seconds) if seconds > 0 else None
+    return report
+
+#Export
+def export_query(model):
+    """Columns of the export ordered by id, fetched BATCH_ROWS at once.
+    """
+    columns = [getattr(model, attribute) for attribute in model.xml_codec.fields.values()]
+    return select(*columns).order_by(model.id).execution_options(yield_per = BATCH_ROWS)
+
+def ndjson_chunks(model):
+    """One JSON object by line, the dates as YYYY-MM-DD.
+    """
+    fields = list(model.xml_codec.fields)
+    for rows in db.session.execute(export_query(model)).partitions():
+        yield "".join(json.dumps({field: value.isoformat() if isinstance(value, datetime.date) else value\
+            for field, value in zip(fields, row)}) + "\n" for row in rows), len(rows)
+
+def csv_chunks(model):
+    """CSV with a header, NULL is an empty value.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(model.xml_codec.fields)
+    for rows in db.session.execute(export_query(model)).partitions():
+        writer.writerows(rows)
+        yield buffer.getvalue(), len(rows)
+        buffer.seek(0)
+        buffer.truncate()
+
+def export_chunks(model, format: str, report: dict = None):
+    """Text of the export of a table, written while the rows are read.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+        format: ndjson or csv.
+        report: dict where the number of rows and the time are written
+            once the export ends.
+    """
+    report = report if report is not None else {}
+    report.update(table = model.__tablename__, rows = 0)
+    start = time.perf_counter()
+    for chunk, rows in (csv_chunks if format == "csv" else ndjson_chunks)(model):
+        report["rows"] += rows
+        yield chunk
+    throughput(report, start)
+
+def export_file(model, format: str, output) -> dict:
+    """Writes the export of a table in a file, with COPY on PostgreSQL
+    when the format is CSV.
+
+    Returns:
+        table, rows, seconds and rows_per_second
+    """
+    cursor = copy_cursor() if format == "csv" else None
+    if cursor is None:
+        report = {}
+        for chunk in export_chunks(model, format, report):
+            output.write(chunk)
+        return report
+
+    start = time.perf_counter()
+    columns = ", ".join(f"{attribute} AS {field}" for field, attribute in model.xml_codec.fields.items())
+    copy_to(cursor, f"COPY (SELECT {columns} FROM {model.__tablename__} ORDER BY id) "
+        "TO STDOUT WITH (FORMAT csv, HEADER)", output)
+    return throughput({"table": model.__tablename__, "rows": cursor.rowcount}, start)
+
+#Import
+def read_ndjson(lines):
+    """(line number, object) of every line that is not blank, the object is
+    None when the line is not valid JSON.
+    """
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+def read_csv(lines):
+    """(line number, object) of every row after the header.
+    """
+    reader = csv.DictReader(lines)
+    for item in reader:
+        yield reader.line_num, item
+
+def row_values(model, item, ids: bool) -> dict:
+    """Column values of one row of an import, normalized like the body of a
+    POST and checked against the columns, so a batch does not fail in the
+    database because of one row.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+        item: object of the row.
+        ids: the id of the row is kept.
+
+    Raises:
+        ValueError: with the reason when the row is not valid.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Not a JSON object!")
+    try:
+        values = model.json_values(item)
+    except (KeyError, AttributeError, TypeError):
+        raise ValueError("Missing data!")
+    if ids:
+        values["id"] = item.get("id")
+
+    return check_values(model, values)
+
+def copy_rows(cursor, model, rows: list) -> None:
+    """Writes rows with COPY, as CSV where only the empty numbers are NULL.
+    """
+    columns = list(rows[0])
+    texts = [column for column in columns if model.__table__.columns[column].type.python_type is str]
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([row[column] for column in columns] for row in rows)
+    options = f", FORCE_NOT_NULL ({', '.join(texts)})" if texts else ""
+    copy_from(cursor, f"COPY {model.__tablename__} ({', '.join(columns)}) FROM STDIN "
+        f"WITH (FORMAT csv{options})", buffer.getvalue())
+
+def reject(report: dict, line: int, message: str) -> None:
+    report["rejected"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"line": line, "message": message})
+
+def write_batch(model, after_insert, batch: list, report: dict) -> None:
+    """Writes and commits a batch of rows. If the batch breaks a constraint,
+    every row is written again in its own savepoint to find which ones fail.
+
+    Args:
+        batch: list of (line, values).
+    """
+    errors = (IntegrityError, DataError)
+    cursor = copy_cursor()
+    if cursor is not None:
+        dbapi = db.session.connection().dialect.loaded_dbapi
+        errors += (dbapi.IntegrityError, dbapi.DataError)
+
+    rows = [values for line, values in batch]
+    try:
+        with db.session.begin_nested():
+            if cursor is not None:
+                copy_rows(cursor, model, rows)
+            else:
+                db.session.execute(insert(model.__table__), rows)
+        inserted = rows
+    except errors:
+        inserted = []
+        for line, values in batch:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(model.__table__), [values])
+                inserted.append(values)
+            except errors:
+                reject(report, line, "Already exists or not valid!")
+
+    tags = after_insert(inserted)
+    db.session.commit()
+    invalidate(*tags)
+    report["inserted"] += len(inserted)
+
+def import_rows(table: str, items, batch_rows: int = IMPORT_BATCH_ROWS) -> dict:
+    """Adds the valid rows of an import to a table.
+
+    Args:
+        table: pieces, studios or evaluations.
+        items: (line number, object) of every row, from read_ndjson or read_csv.
+        batch_rows: rows written and committed at once.
+
+    Returns:
+        table, rows read, inserted, rejected, the first errors (line and
+        message), seconds and rows_per_second
+    """
+    model, after_insert = TABLES[table]
+    report = {"table": table, "rows": 0, "inserted": 0, "rejected": 0, "errors": []}
+    start = time.perf_counter()
+    ids = None
+    batch = []
+    for line, item in items:
+        report["rows"] += 1
+        #The ids are kept if the first row has one
+        if ids is None:
+            ids = isinstance(item, dict) and item.get("id") not in (None, "")
+        try:
+            batch.append((line, row_values(model, item, ids)))
+        except ValueError as error:
+            reject(report, line, str(error))
+        if len(batch) >= batch_rows:
+            write_batch(model, after_insert, batch, report)
+            batch = []
+    if batch:
+        write_batch(model, after_insert, batch, report)
+
+    if ids and db.session.connection().dialect.name == "postgresql":
+        #The next ids given by the database come after the imported ones
+        db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"(SELECT max(id) FROM {table}))"))
+        db.session.commit()
+    return throughput(report, start)
+
+def import_file(table: str, format: str, lines, batch_rows: int = IMPORT_BATCH_ROWS) -> dict:
+    """Adds the valid rows of a NDJSON or CSV text to a table.
+
+    Args:
+        lines: file or any iterable of lines.
+    """
+    return import_rows(table, (read_csv if format == "csv" else read_ndjson)(lines), batch_rows)
+
+#Endpoints
+@transfer.route("/api/<any(pieces, studios, evaluations):table>/export", methods = ["GET"])
+def export_table(table: str):
+    """Returns all the rows of a table as NDJSON or CSV, sent while they are read
+    """
+    format = FORMATS.get(request.content_type)
+    if format is None:
+        abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a NDJSON or CSV!")
+
+    model, after_insert = TABLES[table]
+    report = {}
+
+    def chunks():
+        yield from export_chunks(model, format, report)
+        current_app.logger.info(f"Exported {report['rows']} {table} in {report['seconds']} s "
+            f"({report['rows_per_second']} rows/s)")
+
+    return Response(stream_with_context(buffered(chunks())), status = status.HTTP_202_ACCEPTED,\
+        mimetype = MIMETYPES[format])
+
+@transfer.route("/api/<any(pieces, studios, evaluations):table>/import", methods = ["POST"])
+def import_table(table: str):
+    """Adds the rows of a NDJSON or CSV body to a table, read while they are
+    received, and returns the report of the import
+    """
+    format = FORMATS.get(request.content_type)
+    if format is None:
+        abort(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, message=f"Not a NDJSON or CSV!")
+
+    lines = io.TextIOWrapper(request.stream, encoding = "utf-8", newline = "")
+    try:
+        report = import_file(table, format, lines, current_app.config.get("IMPORT_BATCH_ROWS",\
+            IMPORT_BATCH_ROWS))
+    except (UnicodeDecodeError, csv.Error) as error:
+        db.session.rollback()
+        abort(status.HTTP_400_BAD_REQUEST, message=f"Body not valid! {error}")
+
+    current_app.logger.info(f"Imported {report['inserted']} of {report['rows']} {table} in "
+        f"{report['seconds']} s ({report['rows_per_second']} rows/s)")
+    return jsonify(report), status.HTTP_202_ACCEPTED
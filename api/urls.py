@@ -0,0 +1,52 @@
+"""REID
+   URLs of the resources for the serializers
+
+   url_for matches the whole URL map on every call. The URL of a resource
+   only changes with its id, so the URL of every endpoint is built once per
+   app and script root with a marker id and then the ids are formatted in.
+"""
+
+from flask import current_app, has_request_context, request, url_for
+
+# An id that can not be part of the rest of the URL
+MARKER = 9876543210123
+
+def url_template(endpoint: str) -> str:
+    """Format string of the URL of an endpoint with an id argument.
+
+    Args:
+        endpoint: e.g. pieces.get_piece.
+    """
+    templates = current_app.extensions.setdefault("url_templates", {})
+    key = (endpoint, request.script_root if has_request_context() else None)
+    template = templates.get(key)
+    if template is None:
+        url = url_for(endpoint, id = MARKER)
+        template = url.replace("{", "{{").replace("}", "}}").replace(str(MARKER), "{}")
+        templates[key] = template
+    return template
+
+def build_url(endpoint: str, id: int) -> str:
+    """Same URL as url_for(endpoint, id = id).
+
+    Args:
+        endpoint: e.g. pieces.get_piece.
+        id: id of the resource.
+    """
+    return url_template(endpoint).format(id)
+
+def serializer(model, method, fields: tuple = None):
+    """Serializer for many rows of a model that resolves the URL template once.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+        method: to_json or to_xml of the model.
+        fields: fields written (default all), see fieldsets.py.
+
+    Returns:
+        function row -> method(row, url of the row)
+    """
+    url = url_template(model.endpoint).format
+    if fields is not None:
+        return lambda row: method(row, url(row.id), fields)
+    return lambda row: method(row, url(row.id))
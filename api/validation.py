@@ -0,0 +1,94 @@
+"""REID
+   Checks of the column values written by the requests
+
+   The values of the rows of an import and of the fields of a PATCH or PUT are
+   checked against the types, lengths and NOT NULL of the columns before
+   they are written, so an invalid value is reported with its field
+   instead of failing the statement.
+"""
+
+import datetime
+from modelsAlchemy import json_date
+
+# Model -> checks of its columns
+CHECKS = {}
+# Fields that are never written by a request
+READ_ONLY = ("id",)
+
+def column_checks(model) -> list:
+    """(field, attribute, type, nullable, length) of every column of a model,
+    read once as the column types are slow to inspect for every row.
+    """
+    checks = CHECKS.get(model)
+    if checks is None:
+        columns = model.__table__.columns
+        checks = [(field, attribute, columns[attribute].type.python_type, columns[attribute].nullable,\
+            getattr(columns[attribute].type, "length", None)) for field, attribute in model.xml_codec.fields.items()]
+        CHECKS[model] = checks
+    return checks
+
+def check_values(model, values: dict) -> dict:
+    """Checks the column values of a row, the integers given as strings
+    (CSV and XML) are converted.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+        values: attribute -> value, the missing attributes are not checked.
+
+    Raises:
+        ValueError: with the reason when a value is not valid.
+    """
+    for field, attribute, python_type, nullable, length in column_checks(model):
+        if attribute not in values:
+            continue
+        value = values[attribute]
+        #CSV values are strings, an empty number is NULL
+        if python_type is int and isinstance(value, str):
+            try:
+                value = values[attribute] = int(value) if value.strip() else None
+            except ValueError:
+                raise ValueError(f"{field} {value} not valid!")
+        if value is None:
+            if not nullable:
+                raise ValueError(f"Missing {field}!")
+        elif python_type is int and (value.__class__ is not int):
+            raise ValueError(f"{field} {value} not valid!")
+        elif python_type is datetime.date and not isinstance(value, datetime.date):
+            raise ValueError(f"Date {value} not valid!")
+        elif python_type is str and not isinstance(value, str):
+            raise ValueError(f"{field} {value} not valid!")
+        elif length and python_type is str and len(value) > length:
+            raise ValueError(f"{field} is too long!")
+    return values
+
+def patch_values(model, item: dict) -> dict:
+    """Column values of the fields of a PATCH, normalized like the body of
+    a POST (strings stripped and lower, dates from YYYY-MM-DD) and checked.
+
+    Args:
+        model: Pieces, Studios or Evaluations.
+        item: JSON object or XML element as dict, with only the fields changed.
+
+    Raises:
+        ValueError: with the reason when a field is unknown or not valid.
+    """
+    unknown = [field for field in item if field not in model.xml_codec.fields or field in READ_ONLY]
+    if unknown:
+        raise ValueError(f"Fields {', '.join(sorted(unknown))} not valid!")
+    if not item:
+        raise ValueError("Missing data!")
+
+    columns = model.__table__.columns
+    values = {}
+    for field, value in item.items():
+        attribute = model.xml_codec.fields[field]
+        python_type = columns[attribute].type.python_type
+        if python_type is str and isinstance(value, str):
+            value = value.rstrip().lower()
+        elif python_type is datetime.date and value is not None:
+            try:
+                value = json_date(value)
+            except AttributeError:
+                raise ValueError(f"Date {value} not valid!")
+        values[attribute] = value
+    return check_values(model, values)
@@ -0,0 +1,141 @@
+"""REID
+   XML encoder and decoder of the models
+
+   Every model has a XmlCodec built from its list of fields. The encoder is
+   compiled once into a function with a single compact f-string, which only
+   escapes the columns that can hold text, and the decoder reads the body
+   with iterparse, one element at a time.
+"""
+
+import datetime
+import io
+from xml.etree import ElementTree
+
+# Types whose text never needs to be escaped
+PLAIN_TYPES = (int, datetime.date)
+
+class XmlError(ValueError):
+    """The body is not a valid XML for the model"""
+
+def escape(value) -> str:
+    """Text of a value with the XML special characters escaped.
+    None is an empty element.
+    """
+    if value is None:
+        return ""
+    text = value if value.__class__ is str else str(value)
+    if "&" in text or "<" in text or ">" in text:
+        return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return text
+
+class XmlCodec:
+    """Encodes and decodes one model as XML"""
+
+    def __init__(self, element: str, collection: str, fields: dict) -> None:
+        """
+        Args:
+            element: tag of one object (e.g. Piece).
+            collection: tag of a list of objects (e.g. Pieces).
+            fields: tag -> attribute of the model, in the order they are written.
+                The <uri> is always the first element.
+        """
+        self.element = element
+        self.collection = collection
+        self.fields = fields
+        # Tags written (None for all of them) -> encoder
+        self.encoders = {}
+
+    def compile(self, model, tags: tuple = None):
+        """Builds the encoder of a model. The columns that can not be NULL and
+        hold numbers or dates are written without escaping.
+
+        Args:
+            model: class of the objects.
+            tags: fields written, in the order of the codec (default all).
+        """
+        columns = model.__table__.columns
+        parts = [f"<{self.element}><uri>{{escape(uri)}}</uri>"]
+        for tag in (tags if tags is not None else self.fields):
+            attribute = self.fields[tag]
+            column = columns[attribute]
+            if not column.nullable and column.type.python_type in PLAIN_TYPES:
+                parts.append(f"<{tag}>{{obj.{attribute}}}</{tag}>")
+            else:
+                parts.append(f"<{tag}>{{escape(obj.{attribute})}}</{tag}>")
+        parts.append(f"</{self.element}>")
+
+        source = "def encode(obj, uri):\n    return f\"" + "".join(parts) + "\"\n"
+        namespace = {"escape": escape}
+        exec(compile(source, f"<xml encoder of {model.__name__}>", "exec"), namespace)
+        return namespace["encode"]
+
+    def encode(self, obj, uri: str, fields: tuple = None) -> str:
+        """XML of one object.
+
+        Args:
+            obj: instance of the model.
+            uri: uri of the object.
+            fields: tags written, in the order of the codec (default all).
+        """
+        encoder = self.encoders.get(fields)
+        if encoder is None:
+            encoder = self.encoders[fields] = self.compile(type(obj), fields)
+        return encoder(obj, uri)
+
+    def iter_decode(self, body: bytes):
+        """Reads a body with one element or a collection of them.
+
+        Args:
+            body: XML of the request.
+
+        Yields:
+            (dict tag -> text of every element, True if the root is the collection)
+        """
+        depth = 0
+        item_depth = None
+        root = None
+        try:
+            for event, node in ElementTree.iterparse(io.BytesIO(body), events = ("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        root = node
+                        if node.tag == self.element:
+                            item_depth = 1
+                        elif node.tag == self.collection:
+                            item_depth = 2
+                        else:
+                            raise XmlError(f"Expected <{self.element}> or <{self.collection}>")
+                    continue
+
+                if depth == item_depth and node.tag == self.element:
+                    item = {}
+                    for child in node:
+                        text = child.text.strip() if child.text else None
+                        item[child.tag] = text if text else None
+                    yield item, item_depth == 2
+                    # The elements already read are not kept
+                    node.clear()
+                    if root is not node:
+                        root.clear()
+                depth -= 1
+        except ElementTree.ParseError as error:
+            raise XmlError(str(error))
+
+    def decode(self, body: bytes) -> tuple:
+        """Reads a body with one element or a collection of them.
+
+        Args:
+            body: XML of the request.
+
+        Returns:
+            (list of dicts tag -> text, True if the root is the collection)
+        """
+        items = []
+        many = False
+        for item, many in self.iter_decode(body):
+            items.append(item)
+        if not items and not many:
+            # An empty collection
+            many = True
+        return items, many
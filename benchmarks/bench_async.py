@@ -0,0 +1,158 @@
+"""REID
+   Slow clients on the sync and the ASGI modes
+
+   The same migrated and seeded SQLite file is served by the threaded sync
+   server (werkzeug, one thread per connection) and by uvicorn with
+   asgiAlchemy (one greenlet per request on the event loop, aiosqlite).
+   Every client sends the start of a GET request, waits --slow seconds,
+   sends the rest and reads the answer, again until --duration ends.
+   For every number of clients it prints the answers per second, the
+   latency added by the server (without the wait of the client), the
+   errors and the threads and memory of the server at their peak.
+
+   Usage: python benchmarks/bench_async.py [--clients 100 1000 3000] [--slow 1] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+
+# Commands of the servers, the port is the last argument
+SERVERS = {
+    "sync": [sys.executable, "-c", "import sys; from initAlchemy import api; "
+        "api.run(port = int(sys.argv[1]), threaded = True)"],
+    "async": [sys.executable, "-m", "uvicorn", "asgiAlchemy:app", "--log-level", "warning",\
+        "--backlog", "4096", "--port"],
+}
+
+# Requests sent by the clients, {piece} is a random id
+PATHS = ["/api/pieces/{piece}", "/api/pieces?limit=4", "/api/studios", "/api/pieces/{piece}/rating"]
+
+def process_status(pid: int) -> dict:
+    """Threads and resident memory (MB) of a process.
+    """
+    values = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            if name == "Threads":
+                values["threads"] = int(value)
+            elif name == "VmRSS":
+                values["rss_mb"] = int(value.split()[0]) / 1024
+    return values
+
+async def slow_request(port: int, path: str, slow: float) -> float:
+    """Sends a request in two parts --slow seconds apart and reads the answer.
+
+    Returns:
+        seconds taken by the server, without the wait of the client
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n".encode())
+        await writer.drain()
+        await asyncio.sleep(slow)
+        writer.write(b"Content-Type: application/json\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        answer = await reader.read()
+    finally:
+        writer.close()
+    if not answer.startswith(b"HTTP/1.1 20") and not answer.startswith(b"HTTP/1.0 20"):
+        raise ValueError(answer[:40])
+    return time.perf_counter() - start - slow
+
+async def client(port: int, slow: float, until: float, pieces: int, latencies: list, errors: list) -> None:
+    while time.perf_counter() < until:
+        path = random.choice(PATHS).format(piece = random.randint(1, pieces))
+        try:
+            latencies.append(await asyncio.wait_for(slow_request(port, path, slow), 60))
+        except (OSError, ValueError, asyncio.TimeoutError) as error:
+            errors.append(type(error).__name__)
+            await asyncio.sleep(slow)
+
+async def sample(pid: int, peak: dict, until: float) -> None:
+    while time.perf_counter() < until:
+        try:
+            for key, value in process_status(pid).items():
+                peak[key] = max(peak.get(key, 0), value)
+        except FileNotFoundError:
+            return
+        await asyncio.sleep(0.2)
+
+async def run_clients(pid: int, port: int, clients: int, slow: float, duration: float, pieces: int) -> dict:
+    latencies, errors, peak = [], [], {}
+    start = time.perf_counter()
+    until = start + duration
+    await asyncio.gather(sample(pid, peak, until),\
+        *[client(port, slow, until, pieces, latencies, errors) for _ in range(clients)])
+    seconds = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "answers_per_second": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+        "errors": len(errors),
+        **peak,
+    }
+
+def wait_ready(port: int, process) -> None:
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError(f"The server stopped with {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout = 1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The server did not start")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Slow clients on the sync and the ASGI modes")
+    parser.add_argument("--clients", type = int, nargs = "+", default = [100, 1000, 3000])
+    parser.add_argument("--slow", type = float, default = 1.0, help = "seconds between the two parts of a request")
+    parser.add_argument("--duration", type = float, default = 10.0, help = "seconds of every run")
+    parser.add_argument("--modes", nargs = "+", choices = list(SERVERS), default = list(SERVERS))
+    parser.add_argument("--port", type = int, default = 8765)
+    args = parser.parse_args()
+
+    #Every client has its own connection
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, CATALOG_SQLALCHEMY_DATABASE_URI = f"sqlite:///{directory}/catalog.sqlite",\
+            CATALOG_RESPONSE_CACHE_SIZE = "0")
+        for command in ("migrate", "seed"):
+            subprocess.run([sys.executable, "-m", "flask", "--app", "initAlchemy", command], cwd = API_DIR,\
+                env = env, check = True, capture_output = True)
+
+        print(f"{'mode':6} {'clients':>7} {'answers/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}"
+            f" {'threads':>8} {'RSS MB':>7}")
+        for mode in args.modes:
+            for clients in args.clients:
+                server = subprocess.Popen(SERVERS[mode] + [str(args.port)], cwd = API_DIR, env = env,\
+                    stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+                try:
+                    wait_ready(args.port, server)
+                    result = asyncio.run(run_clients(server.pid, args.port, clients, args.slow, args.duration, 4))
+                finally:
+                    server.terminate()
+                    server.wait()
+                p50 = f"{result['p50_ms']:8.1f}" if result["p50_ms"] is not None else f"{'-':>8}"
+                p99 = f"{result['p99_ms']:8.1f}" if result["p99_ms"] is not None else f"{'-':>8}"
+                print(f"{mode:6} {clients:7} {result['answers_per_second']:10.1f} {p50} {p99}"
+                    f" {result['errors']:7} {result.get('threads', 0):8} {result.get('rss_mb', 0):7.1f}")
+
+if __name__ == "__main__":
+    main()
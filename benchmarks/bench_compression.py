@@ -0,0 +1,75 @@
+"""REID
+   Benchmark of the compression of the list answers
+
+   A page of pieces is written as JSON and XML, the way all_pieces answers,
+   and compressed whole and in 64 KB flushed chunks (the streamed answers)
+   with every gzip level and brotli quality given.
+
+   Usage: python benchmarks/bench_compression.py [--rows 1000] [--repeat 5]
+   (brotli is only timed when the brotli package is installed)
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from flask import json
+from apiAlchemy import create_api
+from compression import Brotli, Gzip, brotli
+from modelsAlchemy import Pieces
+from streaming import CHUNK_SIZE
+
+def pieces(rows: int) -> list:
+    result = []
+    for id in range(1, rows + 1):
+        piece = Pieces(f"piece {id}", datetime.date(2020, 1, 1) + datetime.timedelta(days = id),\
+            ("band", "composer")[id % 2], ("vocal", "instrumental")[id % 3 % 2], "spanish", id % 50 + 1,\
+            f"This piece number {id} ...")
+        piece.id = id
+        result.append(piece)
+    return result
+
+def whole(encoder, level: int, body: bytes) -> bytes:
+    return encoder(level).finish(body)
+
+def chunked(encoder, level: int, body: bytes) -> bytes:
+    compressor = encoder(level)
+    chunks = [compressor.compress(body[start:start + CHUNK_SIZE]) for start in range(0, len(body), CHUNK_SIZE)]
+    return b"".join(chunks) + compressor.finish()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--rows", type = int, default = 1000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--gzip", type = int, nargs = "+", default = [1, 6, 9], help = "gzip levels")
+    parser.add_argument("--brotli", type = int, nargs = "+", default = [1, 4, 11], help = "brotli qualities")
+    args = parser.parse_args()
+
+    api = create_api()
+    data = pieces(args.rows)
+    with api.test_request_context():
+        bodies = {
+            "json": json.dumps({"pieces": [piece.to_json() for piece in data]}).encode("utf-8"),
+            "xml": ("<Pieces>" + "".join(map(Pieces.to_xml, data)) + "</Pieces>").encode("utf-8"),
+        }
+    encoders = [("gzip", Gzip, level) for level in args.gzip]
+    if brotli is not None:
+        encoders += [("br", Brotli, quality) for quality in args.brotli]
+
+    print(f"{args.rows} pieces, best of {args.repeat}")
+    print(f"{'format':6} {'encoding':9} {'mode':8} {'bytes':>9} {'ratio':>6} {'ms':>8} {'MB/s':>7}")
+    for format, body in bodies.items():
+        print(f"{format:6} {'identity':9} {'':8} {len(body):9}")
+        for name, encoder, level in encoders:
+            for mode, function in (("whole", whole), ("chunked", chunked)):
+                size = len(function(encoder, level, body))
+                best = min(timeit.repeat(lambda: function(encoder, level, body), number = 1, repeat = args.repeat))
+                print(f"{format:6} {f'{name}-{level}':9} {mode:8} {size:9} {size / len(body):6.3f}"
+                    f" {best * 1000:8.2f} {len(body) / best / 1e6:7.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""REID
+   Benchmark of every route of the API on a synthetic catalog
+
+   The app is built with create_api() on a SQLite file (or a throwaway
+   database given with --uri) filled with --rows evaluations, rows / 10
+   pieces and rows / 1000 studios. Every route is timed in JSON and XML
+   through the Flask test client. The writes create, edit and delete
+   their own rows, so the dataset is the same after every run.
+
+   Usage:
+       python benchmarks/bench_endpoints.py --rows 100000 --output results.json
+       python benchmarks/bench_endpoints.py --rows 100000 --compare results.json
+       python benchmarks/bench_endpoints.py --load new.json --compare old.json
+
+   The database is kept with --database and reused by the next runs with
+   the same number of rows. The answer cache is disabled unless --cache.
+   The statements of every request are counted with query_budget() and
+   the run exits with 1 when a case runs more than its budget, or with
+   --compare when a route is slower than --threshold times the baseline.
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import sqlalchemy
+from sqlalchemy import func, insert
+from apiAlchemy import create_api
+from modelsAlchemy import db, Pieces, Studios, Evaluations, StudioPieceCounts, PieceRatingStats
+from querystats import QueryBudgetExceeded, query_budget
+from resourceAlchemy import BULK_INSERT_ROWS
+
+FORMATS = {
+    "json": {"content-type": "application/json"},
+    "xml": {"content-type": "application/xml"},
+}
+
+# Rows inserted at once while seeding
+SEED_BATCH = 10000
+SEED = 2022
+
+AUTHORS = ["band", "composer", "orchestra", "director", "producer"]
+GENRES = ["vocal", "instrumental", "documentary", "animation", "drama"]
+NATIONALITIES = ["spanish", "french", "english", "italian", "german"]
+WORDS = ["good", "bad", "great", "boring", "beautiful", "long", "short", "music", "story",\
+    "actors", "sound", "images", "ending", "piece", "classic", "modern"]
+FIRST_DATE = datetime.date(2000, 1, 1)
+DAYS = 8766
+
+# (case, path) of the reads, with the ids of rows in the middle of the tables
+READ_CASES = [
+    ("GET /api/pieces", "/api/pieces"),
+    ("GET /api/pieces limit=1000", "/api/pieces?limit=1000"),
+    ("GET /api/pieces middle page", "/api/pieces?after={piece}"),
+    ("GET /api/pieces stream limit=1000", "/api/pieces?stream=true&limit=1000"),
+    ("GET /api/pieces/<id>", "/api/pieces/{piece}"),
+    ("GET /api/pieces/<id> rating", "/api/pieces/{piece}?rating=true"),
+    ("GET /api/pieces rating", "/api/pieces?rating=true"),
+    ("GET /api/pieces/<id>/rating", "/api/pieces/{piece}/rating"),
+    ("GET /api/studios", "/api/studios"),
+    ("GET /api/studios/<id>", "/api/studios/{studio}"),
+    ("GET /api/studios/counts", "/api/studios/counts"),
+    ("GET /api/studios/<id>/pieces", "/api/studios/{studio}/pieces"),
+    ("GET /api/evaluations/<id>", "/api/evaluations/{evaluation}"),
+    ("GET /api/pieces/<id>/evaluations", "/api/pieces/{piece}/evaluations?date_from=2000-01-01"),
+    ("GET /api/evaluations filter", "/api/evaluations?date_from=2010-01-01&date_to=2010-12-31&min_note=4"),
+    ("GET /api/evaluations pattern", "/api/evaluations?pattern=good+music"),
+    ("GET /api/evaluations pattern prefix", "/api/evaluations?pattern=beau&mode=prefix"),
+]
+
+def sizes(rows: int) -> dict:
+    """Number of rows of every table for a number of evaluations.
+    """
+    return {
+        "studios": max(rows // 1000, 4),
+        "pieces": max(rows // 10, 4),
+        "evaluations": rows,
+    }
+
+def insert_batches(model, rows) -> None:
+    """Inserts the rows of an iterator in batches of SEED_BATCH.
+    """
+    while True:
+        batch = list(itertools.islice(rows, SEED_BATCH))
+        if not batch:
+            return
+        db.session.execute(insert(model), batch)
+
+def seed(rows: int) -> None:
+    """Creates the tables and fills them with the synthetic catalog.
+    """
+    rng = random.Random(SEED)
+    counts = sizes(rows)
+    db.drop_all()
+    db.create_all()
+
+    insert_batches(Studios, ({"name": f"studio {i}", "email": f"studio{i}@email.com",\
+        "phone": f"+34-{i:09d}"} for i in range(1, counts["studios"] + 1)))
+    insert_batches(Pieces, ({"name": f"piece {i}",\
+        "date": FIRST_DATE + datetime.timedelta(days = rng.randrange(DAYS)),\
+        "author": rng.choice(AUTHORS), "genre": rng.choice(GENRES),\
+        "nationality": rng.choice(NATIONALITIES), "studio": rng.randint(1, counts["studios"]),\
+        "summary": "This piece..."} for i in range(1, counts["pieces"] + 1)))
+    insert_batches(Evaluations, ({"piece": rng.randint(1, counts["pieces"]), "note": rng.randint(1, 5),\
+        "date": FIRST_DATE + datetime.timedelta(days = rng.randrange(DAYS)),\
+        "text": "The piece is " + " ".join(rng.sample(WORDS, 3))} for _ in range(rows)))
+    StudioPieceCounts.rebuild()
+    PieceRatingStats.rebuild()
+    db.session.commit()
+
+def seeded(rows: int) -> bool:
+    """Checks if the database already holds the catalog of rows evaluations.
+    """
+    try:
+        return db.session.scalar(func.count(Evaluations.id).select()) == rows
+    except sqlalchemy.exc.DBAPIError:
+        db.session.rollback()
+        return False
+
+def piece_body(fmt: str, name: str, studio: int) -> str:
+    if fmt == "json":
+        return json.dumps([{"piece_name": name, "date": "2015-08-19", "author": "composer",\
+            "genre": "vocal", "nationality": "spanish", "studio": studio, "summary": "This piece..."}])
+    return f"<Piece><piece_name>{name}</piece_name><date>2015-08-19</date><author>composer</author>"\
+        f"<genre>vocal</genre><nationality>spanish</nationality><studio>{studio}</studio>"\
+        f"<summary>This piece...</summary></Piece>"
+
+def pieces_body(fmt: str, names: list, studio: int) -> str:
+    """Body of a bulk POST of pieces.
+    """
+    if fmt == "json":
+        return json.dumps([json.loads(piece_body(fmt, name, studio))[0] for name in names])
+    return "<Pieces>" + "".join(piece_body(fmt, name, studio) for name in names) + "</Pieces>"
+
+def studio_body(fmt: str, name: str) -> str:
+    if fmt == "json":
+        return json.dumps([{"studio_name": name, "email": f"{name}@email.com", "phone": name}])
+    return f"<Studio><studio_name>{name}</studio_name><email>{name}@email.com</email>"\
+        f"<phone>{name}</phone></Studio>"
+
+def evaluation_body(fmt: str, piece: int, note: int) -> str:
+    if fmt == "json":
+        return json.dumps([{"piece_id": piece, "note": note, "date": "2017-08-11",\
+            "text": "The piece is good"}])
+    return f"<Evaluation><piece_id>{piece}</piece_id><note>{note}</note><date>2017-08-11</date>"\
+        f"<text>The piece is good</text></Evaluation>"
+
+def post_body(fmt: str, body: str) -> str:
+    """Body of the POST of one object, a JSON list is a bulk POST.
+    """
+    if fmt == "json":
+        return json.dumps(json.loads(body)[0])
+    return body
+
+def patch_body(fmt: str, element: str, field: str, value: str) -> str:
+    """Body of a PATCH of one field.
+    """
+    if fmt == "json":
+        return json.dumps({field: value})
+    return f"<{element}><{field}>{value}</{field}></{element}>"
+
+def query_budgets(bulk: int) -> dict:
+    """Statements allowed for every case, in any format.
+    """
+    budgets = {
+        "POST /api/studios": 2,
+        "PUT /api/studios/<id>": 3,
+        # The count of the studio is deleted before it
+        "DELETE /api/studios/<id>": 4,
+        "POST /api/pieces": 3,
+        "PUT /api/pieces/<id>": 3,
+        # The rating stats of the pieces are deleted with them
+        "DELETE /api/pieces/<id>": 4,
+        # The rating of the piece is updated (or inserted with its first evaluation)
+        "POST /api/evaluations": 4,
+        "PUT /api/evaluations/<id>": 6,
+        # A PATCH that does not move the row is one UPDATE ... RETURNING
+        "PATCH /api/studios/<id>": 1,
+        "PATCH /api/pieces/<id>": 1,
+        "PATCH /api/evaluations/<id>": 1,
+        "DELETE /api/evaluations/<id>": 3,
+        f"DELETE /api/pieces bulk {bulk}": 4,
+        # One INSERT for every BULK_INSERT_ROWS pieces and the count of their studio
+        f"POST /api/pieces bulk {bulk}": math.ceil(bulk / BULK_INSERT_ROWS) + 1,
+    }
+    # Every read is a single statement
+    for case in READ_CASES:
+        budgets[case[0]] = 1
+    # The piece is read when it has no evaluations
+    budgets["GET /api/pieces/<id>/rating"] = 2
+    return budgets
+
+def created_ids(response) -> list:
+    """Ids of the objects created by a POST (any format).
+    """
+    text = response.get_data(as_text = True)
+    return [int(xml or json) for xml, json in re.findall(r'<id>(\d+)</id>|"id":\s*(\d+)', text)]
+
+class Runner:
+    """Times the requests of the cases and keeps the results by case"""
+
+    def __init__(self, client, repeat: int, warmup: int, budgets: dict) -> None:
+        self.client = client
+        self.repeat = repeat
+        self.warmup = warmup
+        self.budgets = budgets
+        self.over_budget = {}
+        self.timings = {}
+        self.sizes = {}
+        self.errors = {}
+        self.queries = {}
+        self.covered = set()
+
+    def request(self, case: str, method: str, path: str, fmt: str, body: str = None,\
+        expected: tuple = (200, 202, 204), record: bool = True, headers: dict = None):
+        """Sends a request and keeps its time under the case name.
+        """
+        name = f"{case} {fmt}"
+        try:
+            with query_budget(self.budgets.get(case) if record else None) as stats:
+                start = time.perf_counter()
+                response = self.client.open(path, method = method, data = body,\
+                    headers = {**FORMATS[fmt], **(headers or {})})
+                data = response.get_data()
+                elapsed = time.perf_counter() - start
+        except QueryBudgetExceeded as error:
+            self.over_budget[name] = str(error)
+        if record:
+            self.timings.setdefault(name, []).append(elapsed)
+            self.queries[name] = max(self.queries.get(name, 0), stats.queries)
+            self.sizes[name] = len(data)
+            if response.status_code not in expected:
+                self.errors.setdefault(name, set()).add(response.status_code)
+            self.covered.add((method, path.split("?")[0]))
+        return response
+
+    def read(self, case: str, path: str) -> None:
+        """Times a GET in both formats.
+        """
+        for fmt in FORMATS:
+            for i in range(self.warmup + self.repeat):
+                self.request(case, "GET", path, fmt, record = i >= self.warmup)
+
+    def results(self) -> dict:
+        results = {}
+        for name, timings in self.timings.items():
+            timings = sorted(timings)
+            results[name] = {
+                "n": len(timings),
+                "median_ms": round(statistics.median(timings) * 1000, 3),
+                "p95_ms": round(timings[max(math.ceil(0.95 * len(timings)), 1) - 1] * 1000, 3),
+                "min_ms": round(timings[0] * 1000, 3),
+                "bytes": self.sizes[name],
+                "queries": self.queries[name],
+                "query_budget": self.budgets.get(name.rsplit(" ", 1)[0]),
+            }
+            if name in self.errors:
+                results[name]["errors"] = sorted(self.errors[name])
+        return results
+
+def run_reads(runner: Runner, counts: dict) -> None:
+    """GET of every route."""
+    ids = {
+        "piece": counts["pieces"] // 2,
+        "studio": counts["studios"] // 2,
+        "evaluation": counts["evaluations"] // 2,
+    }
+    for case, path in READ_CASES:
+        runner.read(case, path.format(**ids))
+
+def run_writes(runner: Runner, counts: dict, bulk: int) -> None:
+    """POST, PUT, PATCH and DELETE of every resource on rows created by the run."""
+    piece = counts["pieces"] // 2
+    for fmt in FORMATS:
+        for i in range(runner.warmup + runner.repeat):
+            record = i >= runner.warmup
+            name = f"bench {fmt} {i} {time.time_ns()}"
+
+            response = runner.request("POST /api/studios", "POST", "/api/studios", fmt,\
+                post_body(fmt, studio_body(fmt, name)), record = record)
+            studio = created_ids(response)[0]
+            runner.request("PUT /api/studios/<id>", "PUT", f"/api/studios/{studio}", fmt,\
+                studio_body(fmt, name + " edited"), record = record)
+            runner.request("PATCH /api/studios/<id>", "PATCH", f"/api/studios/{studio}", fmt,\
+                patch_body(fmt, "Studio", "phone", name + " patched"), record = record)
+
+            response = runner.request("POST /api/pieces", "POST", "/api/pieces", fmt,\
+                post_body(fmt, piece_body(fmt, name, studio)), record = record)
+            new_piece = created_ids(response)[0]
+            runner.request("PUT /api/pieces/<id>", "PUT", f"/api/pieces/{new_piece}", fmt,\
+                piece_body(fmt, name + " edited", studio), record = record)
+            #Created with version 1, then edited by the PUT
+            runner.request("PATCH /api/pieces/<id>", "PATCH", f"/api/pieces/{new_piece}", fmt,\
+                patch_body(fmt, "Piece", "summary", "Patched"), record = record, headers = {"If-Match": '"2"'})
+
+            response = runner.request("POST /api/evaluations", "POST", "/api/evaluations", fmt,\
+                post_body(fmt, evaluation_body(fmt, piece, 3)), record = record)
+            evaluation = created_ids(response)[0]
+            runner.request("PUT /api/evaluations/<id>", "PUT", f"/api/evaluations/{evaluation}", fmt,\
+                evaluation_body(fmt, piece, 4), record = record)
+            runner.request("PATCH /api/evaluations/<id>", "PATCH", f"/api/evaluations/{evaluation}", fmt,\
+                patch_body(fmt, "Evaluation", "text", "The piece is fine"), record = record)
+            runner.request("DELETE /api/evaluations/<id>", "DELETE", f"/api/evaluations/{evaluation}",\
+                fmt, record = record)
+
+            runner.request("DELETE /api/pieces/<id>", "DELETE", f"/api/pieces/{new_piece}", fmt,\
+                record = record)
+
+            response = runner.request(f"POST /api/pieces bulk {bulk}", "POST", "/api/pieces", fmt,\
+                pieces_body(fmt, [f"{name} {n}" for n in range(bulk)], studio), record = record)
+            ids = ",".join(map(str, created_ids(response)))
+            runner.request(f"DELETE /api/pieces bulk {bulk}", "DELETE", f"/api/pieces?ids={ids}", fmt,\
+                record = record)
+
+            runner.request("DELETE /api/studios/<id>", "DELETE", f"/api/studios/{studio}", fmt,\
+                record = record)
+
+def missing_routes(api, covered: set) -> list:
+    """Routes of the blueprints of the API that no case requested.
+    """
+    adapter = api.url_map.bind("localhost")
+    hit = set()
+    for method, path in covered:
+        endpoint, arguments = adapter.match(path, method = method)
+        hit.add((endpoint, method))
+    missing = []
+    for rule in api.url_map.iter_rules():
+        if rule.endpoint.split(".")[0] not in ("pieces", "studios", "evaluations"):
+            continue
+        for method in rule.methods - {"HEAD", "OPTIONS"}:
+            if (rule.endpoint, method) not in hit:
+                missing.append(f"{method} {rule.rule}")
+    return sorted(missing)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True,\
+            text = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Prints the change of the median of every case and returns the regressions.
+    """
+    regressions = []
+    if baseline["meta"]["rows"] != current["meta"]["rows"]:
+        print(f"\nThe baseline has other sizes: {baseline['meta']['rows']}")
+    print(f"\n{'case':48} {'base ms':>9} {'new ms':>9} {'ratio':>7}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        # Differences under 0.05 ms are noise
+        slower = ratio > threshold and result["median_ms"] - base["median_ms"] > 0.05
+        if slower:
+            regressions.append(name)
+        print(f"{name:48} {base['median_ms']:9.3f} {result['median_ms']:9.3f} {ratio:7.2f}"\
+            f"{'  SLOWER' if slower else ''}")
+    return regressions
+
+def benchmark(args, directory: str) -> dict:
+    """Runs every case.
+
+    Args:
+        args: arguments of the command line.
+        directory: where the temporary SQLite database is created.
+    """
+    counts = sizes(args.rows)
+    database = os.path.abspath(args.database or os.path.join(directory, "bench.sqlite"))
+    api = create_api({
+        "SQLALCHEMY_DATABASE_URI": args.uri or f"sqlite:///{database}",
+        "RESPONSE_CACHE_SIZE": 1024 if args.cache else 0,
+        "BULK_MAX_ITEMS": max(args.bulk, 1000),
+    })
+
+    with api.app_context():
+        if not seeded(args.rows):
+            start = time.perf_counter()
+            seed(args.rows)
+            print(f"Seeded {counts} in {time.perf_counter() - start:.1f} s")
+        dialect = db.engine.dialect.name
+
+    client = api.test_client()
+    runner = Runner(client, args.repeat, args.warmup, query_budgets(args.bulk))
+    run_reads(runner, counts)
+    run_writes(runner, counts, args.bulk)
+
+    with api.app_context():
+        db.engine.dispose()
+
+    missing = missing_routes(api, runner.covered)
+    if missing:
+        print("Routes without a case: " + ", ".join(missing))
+    for name, error in runner.over_budget.items():
+        print(f"Over the query budget: {name}: {error}")
+
+    return {
+        "meta": {
+            "rows": counts,
+            "dialect": dialect,
+            "cache": args.cache,
+            "repeat": args.repeat,
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec = "seconds"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+        },
+        "results": runner.results(),
+        "over_budget": runner.over_budget,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Benchmark of every route of the API")
+    parser.add_argument("--rows", type = int, default = 10000, help = "evaluations (1000 to 10000000)")
+    parser.add_argument("--database", help = "SQLite file, kept and reused (default: temporary)")
+    parser.add_argument("--uri", help = "database URI instead of SQLite, its tables are dropped")
+    parser.add_argument("--repeat", type = int, default = 20, help = "timed requests per case")
+    parser.add_argument("--warmup", type = int, default = 2, help = "untimed requests per case")
+    parser.add_argument("--bulk", type = int, default = 100, help = "pieces of the bulk POST")
+    parser.add_argument("--cache", action = "store_true", help = "enable the answer cache")
+    parser.add_argument("--output", help = "write the results as JSON to this file")
+    parser.add_argument("--load", help = "read the results from this file instead of running")
+    parser.add_argument("--compare", help = "results to compare with")
+    parser.add_argument("--threshold", type = float, default = 1.25, help = "slowdown that fails --compare")
+    args = parser.parse_args()
+
+    if args.load:
+        with open(args.load) as file:
+            results = json.load(file)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            results = benchmark(args, directory)
+        print(f"\n{'case':48} {'median ms':>10} {'p95 ms':>9} {'bytes':>9} {'queries':>8}")
+        for name, result in results["results"].items():
+            errors = f"  status {result['errors']}" if "errors" in result else ""
+            print(f"{name:48} {result['median_ms']:10.3f} {result['p95_ms']:9.3f} {result['bytes']:9} {result['queries']:8}{errors}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent = 2)
+
+    failed = bool(results.get("over_budget"))
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} cases slower than {args.threshold}x the baseline")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
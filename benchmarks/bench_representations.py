@@ -0,0 +1,72 @@
+"""REID
+   Benchmark of the representations of a list of pieces
+
+   A page of pieces is encoded the way all_pieces answers in JSON, XML and
+   every format of the registry (MessagePack and CBOR when their packages
+   are installed), then decoded back to the values of the rows the way a
+   bulk POST reads them. It prints the size of every payload, the time to
+   encode and decode it, and the size after gzip.
+
+   Usage: python benchmarks/bench_representations.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from apiAlchemy import create_api
+from modelsAlchemy import Pieces
+from representations import REPRESENTATIONS
+from urls import serializer
+
+def pieces(rows: int) -> list:
+    result = []
+    for id in range(1, rows + 1):
+        piece = Pieces(f"piece {id}", datetime.date(2020, 1, 1) + datetime.timedelta(days = id % 3000),\
+            "band", "vocal", "spanish", id % 50 + 1, f"this piece number {id} & <others>...")
+        piece.id = id
+        result.append(piece)
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--rows", type = int, default = 10000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    api = create_api()
+    data = pieces(args.rows)
+    with api.test_request_context():
+        to_json = serializer(Pieces, Pieces.to_json)
+        to_xml = serializer(Pieces, Pieces.to_xml)
+        cases = {
+            "xml": (
+                lambda: ("<Pieces>" + "".join(map(to_xml, data)) + "</Pieces>").encode("utf-8"),
+                lambda body: [Pieces.xml_values(item) for item in Pieces.xml_codec.decode(body)[0]],
+            ),
+        }
+        for representation in REPRESENTATIONS.values():
+            cases[representation.name.lower()] = (
+                lambda representation = representation:\
+                    representation.dumps({"pieces": [to_json(piece) for piece in data], "next": None}),
+                lambda body, representation = representation:\
+                    [Pieces.json_values(item) for item in representation.loads(body)["pieces"]],
+            )
+
+        print(f"{args.rows} pieces, best of {args.repeat}")
+        print(f"{'format':12} {'bytes':>10} {'gzip':>9} {'encode ms':>10} {'decode ms':>10}")
+        for name, (encode, decode) in cases.items():
+            body = encode()
+            assert len(decode(body)) == args.rows
+            encoded = min(timeit.repeat(encode, number = 1, repeat = args.repeat))
+            decoded = min(timeit.repeat(lambda: decode(body), number = 1, repeat = args.repeat))
+            print(f"{name:12} {len(body):10} {len(zlib.compress(body, 6)):9} {encoded * 1000:10.1f}"
+                f" {decoded * 1000:10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""REID
+   Cold start of the app factory
+
+   Every run is a new Python process on a migrated and seeded SQLite file,
+   like a worker of a pre-fork server. It times the import of initAlchemy
+   (which builds the app with create_api), the first request and the whole
+   process. The previous startup, which dropped, created and filled the
+   tables on import, is timed with --previous for comparison.
+
+   Usage: python benchmarks/bench_startup.py [--runs 10] [--previous]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api")
+
+# Code of a worker, prints the times in ms as JSON
+WORKER = """
+import json, sys, time
+start = time.perf_counter()
+from initAlchemy import api
+imported = time.perf_counter()
+if sys.argv[1] == "previous":
+    from modelsAlchemy import db
+    from seed import seed
+    with api.app_context():
+        db.drop_all()
+        db.create_all()
+        seed()
+ready = time.perf_counter()
+response = api.test_client().get("/api/pieces", headers = {"content-type": "application/json"})
+assert response.status_code == 202, response.status_code
+answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "database_ms": (ready - imported) * 1000,
+    "first_request_ms": (answered - ready) * 1000,
+}))
+"""
+
+def run_worker(mode: str, env: dict) -> dict:
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", WORKER, mode], cwd = API_DIR, env = env,\
+        capture_output = True, text = True, check = True).stdout
+    times = json.loads(output.strip().splitlines()[-1])
+    times["process_ms"] = (time.perf_counter() - start) * 1000
+    return times
+
+def report(name: str, runs: list) -> None:
+    print(name)
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        print(f"  {key:18} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Cold start of the app factory")
+    parser.add_argument("--runs", type = int, default = 10)
+    parser.add_argument("--previous", action = "store_true",\
+        help = "also time the previous startup that recreated the tables on import")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "catalog.sqlite")
+        env = dict(os.environ, CATALOG_SQLALCHEMY_DATABASE_URI = f"sqlite:///{database}")
+        subprocess.run([sys.executable, "-m", "flask", "--app", "initAlchemy", "migrate"], cwd = API_DIR,\
+            env = env, check = True, capture_output = True)
+        subprocess.run([sys.executable, "-m", "flask", "--app", "initAlchemy", "seed"], cwd = API_DIR,\
+            env = env, check = True, capture_output = True)
+
+        # One untimed run so the bytecode is compiled
+        run_worker("factory", env)
+        report("factory (no database work on import)", [run_worker("factory", env) for _ in range(args.runs)])
+
+        if args.previous:
+            copy = os.path.join(directory, "previous.sqlite")
+            shutil.copy(database, copy)
+            env["CATALOG_SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{copy}"
+            report("previous (drop, create and seed on import)",\
+                [run_worker("previous", env) for _ in range(args.runs)])
+
+if __name__ == "__main__":
+    main()
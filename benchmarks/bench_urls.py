@@ -0,0 +1,67 @@
+"""REID
+   Benchmark of url_for against the precomputed URL templates
+
+   Usage: python benchmarks/bench_urls.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from flask import url_for
+from apiAlchemy import create_api
+from modelsAlchemy import Pieces
+from urls import build_url, serializer
+
+ENDPOINTS = ["pieces.get_piece", "studios.get_studio", "evaluations.get_evaluation"]
+
+def legacy_to_json(piece: Pieces) -> dict:
+    """to_json with url_for"""
+    return Pieces.to_json(piece, url_for("pieces.get_piece", id = piece.id))
+
+def pieces(rows: int) -> list:
+    result = []
+    for id in range(1, rows + 1):
+        piece = Pieces(f"piece {id}", datetime.date(2020, 1, 1), "band", "vocal", "spanish", 1, "summary")
+        piece.id = id
+        result.append(piece)
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--rows", type = int, default = 10000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    api = create_api()
+    data = pieces(args.rows)
+    ids = range(1, args.rows + 1)
+    # A script root checks the URLs are still the same behind a prefix
+    for script_root in ["", "/catalog"]:
+        with api.test_request_context(environ_overrides = {"SCRIPT_NAME": script_root}):
+            for endpoint in ENDPOINTS:
+                for id in (1, 42, 10 ** 12):
+                    assert build_url(endpoint, id) == url_for(endpoint, id = id), (endpoint, id)
+
+    with api.test_request_context():
+        assert list(map(legacy_to_json, data)) == list(map(serializer(Pieces, Pieces.to_json), data))
+        cases = [
+            ("url_for", lambda: [url_for("pieces.get_piece", id = id) for id in ids]),
+            ("build_url", lambda: [build_url("pieces.get_piece", id) for id in ids]),
+            ("to_json url_for", lambda: list(map(legacy_to_json, data))),
+            ("to_json build_url", lambda: list(map(Pieces.to_json, data))),
+            ("to_json serializer", lambda: list(map(serializer(Pieces, Pieces.to_json), data))),
+            ("to_xml url_for", lambda: [piece.to_xml(url_for("pieces.get_piece", id = piece.id)) for piece in data]),
+            ("to_xml serializer", lambda: list(map(serializer(Pieces, Pieces.to_xml), data))),
+        ]
+        print(f"{args.rows} rows, best of {args.repeat}, same output as url_for")
+        for name, case in cases:
+            best = min(timeit.repeat(case, number = 1, repeat = args.repeat))
+            print(f"{name:22} {best * 1000:9.1f} ms {best / args.rows * 1e6:7.2f} us/row")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""REID
+   Benchmark of the XML codec against the previous f-string and xmltodict path
+
+   Usage: python benchmarks/bench_xml.py [--rows 10000] [--repeat 5]
+   (xmltodict is only needed by this benchmark)
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from flask import url_for
+import xmltodict
+from apiAlchemy import create_api
+from modelsAlchemy import Pieces
+
+def legacy_to_xml(piece: Pieces) -> str:
+    """to_xml before the codec"""
+    xml_data = f"""
+        <Piece>
+            <uri>{url_for("pieces.get_piece", id = piece.id)}</uri>
+            <id>{piece.id}</id>
+            <piece_name>{piece.name}</piece_name>
+            <date>{piece.date}</date>
+            <author>{piece.author}</author>
+            <genre>{piece.genre}</genre>
+            <nationality>{piece.nationality}</nationality>
+            <studio>{piece.studio}</studio>
+            <summary>{piece.summary}</summary>
+        </Piece>
+        """
+    return xml_data
+
+def legacy_from_xml(body: bytes) -> list:
+    """Bulk decoding with xmltodict"""
+    items = xmltodict.parse(body)["Pieces"]["Piece"]
+    return [Pieces.xml_values(item) for item in items]
+
+def pieces(rows: int) -> list:
+    result = []
+    for id in range(1, rows + 1):
+        piece = Pieces(f"piece {id}", datetime.date(2020, 1, 1), "band", "vocal", "spanish", 1,\
+            "this piece & <others>...")
+        piece.id = id
+        result.append(piece)
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = __doc__)
+    parser.add_argument("--rows", type = int, default = 10000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    api = create_api()
+    data = pieces(args.rows)
+    with api.test_request_context():
+        legacy_body = ("<Pieces>" + "".join(map(legacy_to_xml, data)) + "</Pieces>")\
+            .replace("& <others>", "&amp; &lt;others&gt;").encode("utf-8")
+        body = ("<Pieces>" + "".join(map(Pieces.to_xml, data)) + "</Pieces>").encode("utf-8")
+
+        cases = [
+            ("encode f-string", lambda: "".join(map(legacy_to_xml, data))),
+            ("encode codec", lambda: "".join(map(Pieces.to_xml, data))),
+            ("decode xmltodict", lambda: legacy_from_xml(legacy_body)),
+            ("decode codec", lambda: [Pieces.xml_values(item) for item in Pieces.xml_codec.decode(body)[0]]),
+        ]
+        print(f"{args.rows} pieces, best of {args.repeat}")
+        print(f"payload: f-string {len(legacy_body)} bytes, codec {len(body)} bytes")
+        for name, case in cases:
+            best = min(timeit.repeat(case, number = 1, repeat = args.repeat))
+            print(f"{name:20} {best * 1000:9.1f} ms {best / args.rows * 1e6:7.2f} us/row")
+
+if __name__ == "__main__":
+    main()
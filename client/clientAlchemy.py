@@ -20,19 +20,20 @@ def print_response(action, response):
     print(f"-> Body:\n{body}")
     print(f"-> Header:\n{response.headers}\n\n")
 
-def xml_version():
+XML_HEADERS = {
+    "content-type": "application/xml"
+}
 
-    headers = {
-        "content-type": "application/xml"
-    }
+JSON_HEADERS = {
+    "content-type": "application/json"
+}
 
+# (method, path, body) of every request of the examples
+XML_SCENARIO = [
     #List all pieces
-    body = ""
-    response = requests.get(URL + "/api/pieces", data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/pieces", ""),
     #Add a new piece
-    body = """
+    ("POST", "/api/pieces", """
     <Piece>
         <piece_name>Piece 5</piece_name>
         <date>2011-12-27</date>
@@ -42,12 +43,9 @@ def xml_version():
         <studio>1</studio>
         <summary>This piece...</summary>
     </Piece>
-    """
-    response = requests.post(URL + "/api/pieces", data=body, headers=headers)
-    print_response("POST", response)
-
+    """),
     #Edit a piece
-    body = """
+    ("PUT", "/api/pieces/2", """
     <Piece>
         <piece_name>Piece 2</piece_name>
         <date>2004-12-17</date>
@@ -57,105 +55,68 @@ def xml_version():
         <studio>2</studio>
         <summary>This piece...</summary>
     </Piece>
-    """
-    response = requests.put(URL + "/api/pieces/2", data=body, headers=headers)
-    print_response("PUT", response)
-
+    """),
+    #Edit some fields of a piece
+    ("PATCH", "/api/pieces/2", """
+    <Piece>
+        <summary>This piece was remastered...</summary>
+    </Piece>
+    """),
     #Delete a piece
-    body = ""
-    response = requests.delete(URL + "/api/pieces/3", data=body, headers=headers)
-    print_response("DELETE", response)
-
+    ("DELETE", "/api/pieces/3", ""),
     #List all studios
-    body = ""
-    response = requests.get(URL + "/api/studios", data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/studios", ""),
     #Add a studio
-    body = """
+    ("POST", "/api/studios", """
     <Studio>
         <studio_name>Studio 5</studio_name>
         <email>email5@email.com</email>
         <phone>+99-123456789</phone>
     </Studio>
-    """
-    response = requests.post(URL + "/api/studios", data=body, headers=headers)
-    print_response("POST", response)
-
+    """),
     #Edit a studio
-    body = """
+    ("PUT", "/api/studios/2", """
     <Studio>
         <studio_name>Studio 2</studio_name>
         <email>email2222@email.com</email>
         <phone>+22-222256789</phone>
     </Studio>
-    """
-    response = requests.put(URL + "/api/studios/2", data=body, headers=headers)
-    print_response("PUT", response)
-
+    """),
     #Delete a studio
-    body = ""
-    response = requests.delete(URL + "/api/studios/3", data=body, headers=headers)
-    print_response("DELETE", response)
-
+    ("DELETE", "/api/studios/3", ""),
     #Add an evaluation
-    body = """
+    ("POST", "/api/evaluations", """
     <Evaluation>
         <piece_id>1</piece_id>
         <note>4</note>
         <date>2014-09-14</date>
         <text>The piece is good</text>
     </Evaluation>
-    """
-    response = requests.post(URL + "/api/evaluations", data=body, headers=headers)
-    print_response("POST", response)
-
+    """),
     #Edit an evaluation
-    body = """
+    ("PUT", "/api/evaluations/3", """
     <Evaluation>
         <piece_id>2</piece_id>
         <note>2</note>
         <date>2015-09-14</date>
         <text>The piece is bad</text>
     </Evaluation>
-    """
-    response = requests.put(URL + "/api/evaluations/3", data=body, headers=headers)
-    print_response("PUT", response)
-
+    """),
     #Delete an evaluation
-    body = ""
-    response = requests.delete(URL + "/api/evaluations/3", data=body, headers=headers)
-    print_response("DELETE", response)
-
+    ("DELETE", "/api/evaluations/3", ""),
     #List all evaluations and filter by date and by amount
-    body = ""
-    response = requests.get(URL + "/api/pieces/1/evaluations?date=2021-08-11&start=1&end=2",\
-        data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/pieces/1/evaluations?date=2021-08-11&start=1&end=2", ""),
     #Obtain the number of pieces made by a studio
-    body = ""
-    response = requests.get(URL + "/api/studios/2/pieces", data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/studios/2/pieces", ""),
     #Filter evaluations by text
-    body = ""
-    response = requests.get(URL + "/api/evaluations?pattern=good", data=body, headers=headers)
-    print_response("GET", response)
-
-def json_version():
-
-    headers = {
-        "content-type": "application/json"
-    }
+    ("GET", "/api/evaluations?pattern=good", ""),
+]
 
+JSON_SCENARIO = [
     # List all pieces
-    body = ""
-    response = requests.get(URL + "/api/pieces", data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/pieces", ""),
     #Add a new piece
-    body = """
+    ("POST", "/api/pieces", """
     [{
         "piece_name": "Piece 6",
         "date": "2015-08-19",
@@ -165,12 +126,9 @@ def json_version():
         "studio": 2,
         "summary": "This piece..."
     }]
-    """
-    response = requests.post(URL + "/api/pieces", data=body, headers=headers)
-    print_response("POST", response)
-
+    """),
     #Edit a piece
-    body = """
+    ("PUT", "/api/pieces/2", """
     [{
         "piece_name": "Piece 2",
         "date": "2015-04-19",
@@ -180,91 +138,78 @@ def json_version():
         "studio": 1,
         "summary": "This piece..."
     }]
-    """
-    response = requests.put(URL + "/api/pieces/2", data=body, headers=headers)
-    print_response("PUT", response)
-
+    """),
+    #Edit some fields of a piece
+    ("PATCH", "/api/pieces/2", """
+    {
+        "genre": "vocal",
+        "summary": "This piece was remastered..."
+    }
+    """),
     #Delete a piece
-    body = ""
-    response = requests.delete(URL + "/api/pieces/3", data=body, headers=headers)
-    print_response("DELETE", response)
-
+    ("DELETE", "/api/pieces/3", ""),
     #List all studios
-    body = ""
-    response = requests.get(URL + "/api/studios", data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/studios", ""),
     #Add a studio
-    body = """
+    ("POST", "/api/studios", """
     [{
             "studio_name": "Studio 6",
             "email": "email6@email.com",
             "phone": "+56-565656556"
     }]
-    """
-    response = requests.post(URL + "/api/studios", data=body, headers=headers)
-    print_response("POST", response)
-
+    """),
     #Edit a studio
-    body = """
+    ("PUT", "/api/studios/2", """
     [{
             "studio_name": "Studio 2",
             "email": "e2m2a2i2l@email.com",
             "phone": "+56-222222222"
     }]
-    """
-    response = requests.put(URL + "/api/studios/2", data=body, headers=headers)
-    print_response("PUT", response)
-
+    """),
     #Delete a studio
-    body = ""
-    response = requests.delete(URL + "/api/studios/3", data=body, headers=headers)
-    print_response("DELETE", response)
-
+    ("DELETE", "/api/studios/3", ""),
     #Add an evaluation
-    body = """
+    ("POST", "/api/evaluations", """
     [{
             "piece_id": 2,
             "note": 4,
             "date": "2017-08-11",
             "text": "The piece is good"
     }]
-    """
-    response = requests.post(URL + "/api/evaluations", data=body, headers=headers)
-    print_response("POST", response)
-
+    """),
     #Edit an evaluation
-    body = """
+    ("PUT", "/api/evaluations/3", """
     [{
             "piece_id": 2,
             "note": 2,
             "date": "2017-08-11",
             "text": "The piece is bad"
     }]
-    """
-    response = requests.put(URL + "/api/evaluations/3", data=body, headers=headers)
-    print_response("PUT", response)
-
+    """),
     #Delete an evaluation
-    body = ""
-    response = requests.delete(URL + "/api/evaluations/3", data=body, headers=headers)
-    print_response("DELETE", response)
-
+    ("DELETE", "/api/evaluations/3", ""),
     #List all evaluations and filter by date and by amount
-    body = ""
-    response = requests.get(URL + "/api/pieces/1/evaluations?date=2021-08-11&start=1&end=2",\
-        data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/pieces/1/evaluations?date=2021-08-11&start=1&end=2", ""),
     #Obtain the number of pieces made by a studio
-    body = ""
-    response = requests.get(URL + "/api/studios/1/pieces", data=body, headers=headers)
-    print_response("GET", response)
-
+    ("GET", "/api/studios/1/pieces", ""),
     #Filter evaluations by text
-    body = ""
-    response = requests.get(URL + "/api/evaluations?pattern=bad", data=body, headers=headers)
-    print_response("GET", response)
+    ("GET", "/api/evaluations?pattern=bad", ""),
+]
+
+def run_scenario(scenario: list, headers: dict) -> None:
+    """Sends the requests of a scenario one after another through the same
+    connection and prints the answers.
+    """
+    with requests.Session() as session:
+        for method, path, body in scenario:
+            response = session.request(method, URL + path, data=body, headers=headers)
+            print_response(method, response)
+
+def xml_version():
+    run_scenario(XML_SCENARIO, XML_HEADERS)
+
+def json_version():
+    run_scenario(JSON_SCENARIO, JSON_HEADERS)
 
 #TESTS
 #xml_version()
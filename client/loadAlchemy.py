@@ -0,0 +1,255 @@
+"""REID
+    Load generator for the API
+
+    Replays the JSON and XML scenarios of clientAlchemy with many requests
+    in flight at once. Every worker sends requests through a shared pool of
+    keep-alive connections (aiohttp) and the start of the requests can be
+    paced to a fixed rate. The report shows the throughput, the latency
+    percentiles and the error rate of every endpoint.
+
+    The scenarios also write, so after the first round some DELETE and PUT
+    requests answer 404 and count as errors. Use --methods GET to replay
+    only the reads.
+
+    Usage:
+        python client/loadAlchemy.py --serve --concurrency 32 --duration 30
+        python client/loadAlchemy.py --url http://127.0.0.1:5000 --rate 500 --formats json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from clientAlchemy import JSON_HEADERS, JSON_SCENARIO, URL, XML_HEADERS, XML_SCENARIO
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "api")
+
+# Starts the API of initAlchemy after creating and filling the database
+SERVE_CODE = """
+import sys
+from initAlchemy import api
+from commands import migrate_database
+from seed import seed
+with api.app_context():
+    migrate_database()
+    seed()
+api.run(port=int(sys.argv[1]), threaded=True)
+"""
+
+SCENARIOS = {
+    "json": (JSON_SCENARIO, JSON_HEADERS),
+    "xml": (XML_SCENARIO, XML_HEADERS),
+}
+
+class EndpointStats:
+    """Latencies and errors of one endpoint"""
+
+    def __init__(self) -> None:
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def add(self, latency: float, status) -> None:
+        self.latencies.append(latency)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors += 1
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest rank percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(values)), 1)
+    return values[rank - 1]
+
+def endpoint_name(method: str, path: str, name: str) -> str:
+    """Name of the endpoint of a request, e.g. GET /api/pieces/<id> json.
+    """
+    path = re.sub(r"/\d+", "/<id>", path.split("?")[0])
+    return f"{method} {path} {name}"
+
+def build_requests(formats: list, methods: list) -> list:
+    """(endpoint, method, path, body, headers) of the scenarios to replay.
+    """
+    requests = []
+    for name in formats:
+        scenario, headers = SCENARIOS[name]
+        for method, path, body in scenario:
+            if methods and method not in methods:
+                continue
+            requests.append((endpoint_name(method, path, name), method, path,\
+                body.encode("utf-8") if body else None, headers))
+    return requests
+
+async def worker(session, url: str, requests: list, schedule, stats: dict, deadline: float) -> None:
+    """Sends requests until the deadline or the end of the schedule.
+    """
+    while True:
+        index = await schedule.next()
+        if index is None or time.perf_counter() > deadline:
+            return
+        endpoint, method, path, body, headers = requests[index % len(requests)]
+        start = time.perf_counter()
+        try:
+            async with session.request(method, url + path, data = body, headers = headers) as response:
+                await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            status = type(error).__name__
+        stats.setdefault(endpoint, EndpointStats()).add(time.perf_counter() - start, status)
+
+class Schedule:
+    """Hands out the index of the next request, at most rate per second
+    (open loop: a slow answer does not delay the next start).
+    """
+
+    def __init__(self, rate: float, total: int) -> None:
+        self.rate = rate
+        self.total = total
+        self.sent = 0
+        self.started = time.perf_counter()
+
+    async def next(self):
+        if self.total is not None and self.sent >= self.total:
+            return None
+        index = self.sent
+        self.sent += 1
+        if self.rate:
+            delay = self.started + index / self.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return index
+
+async def run(url: str, requests: list, concurrency: int, rate: float, duration: float,\
+    total: int, timeout: float) -> tuple:
+    """Replays the requests and returns (stats by endpoint, seconds).
+    """
+    stats = {}
+    connector = aiohttp.TCPConnector(limit = concurrency)
+    client_timeout = aiohttp.ClientTimeout(total = timeout)
+    async with aiohttp.ClientSession(connector = connector, timeout = client_timeout) as session:
+        schedule = Schedule(rate, total)
+        deadline = schedule.started + duration
+        await asyncio.gather(*(worker(session, url, requests, schedule, stats, deadline)\
+            for _ in range(concurrency)))
+        elapsed = time.perf_counter() - schedule.started
+    return stats, elapsed
+
+def report(stats: dict, elapsed: float) -> dict:
+    """Prints a table with the results of every endpoint and returns them.
+    """
+    results = {"seconds": round(elapsed, 3), "endpoints": {}}
+    print(f"{'endpoint':48} {'requests':>8} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    total = errors = 0
+    for endpoint in sorted(stats):
+        endpoint_stats = stats[endpoint]
+        latencies = sorted(endpoint_stats.latencies)
+        count = len(latencies)
+        total += count
+        errors += endpoint_stats.errors
+        result = {
+            "requests": count,
+            "throughput": round(count / elapsed, 1),
+            "error_rate": round(endpoint_stats.errors / count, 4),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "statuses": {str(status): n for status, n in endpoint_stats.statuses.items()},
+        }
+        results["endpoints"][endpoint] = result
+        print(f"{endpoint:48} {count:8} {result['throughput']:8} {result['error_rate']:7.1%}"\
+            f" {result['p50_ms']:8} {result['p95_ms']:8} {result['p99_ms']:8}")
+    results["requests"] = total
+    results["throughput"] = round(total / elapsed, 1) if elapsed else 0.0
+    results["error_rate"] = round(errors / total, 4) if total else 0.0
+    print(f"\n{total} requests in {elapsed:.1f} s: {results['throughput']} req/s,"\
+        f" {results['error_rate']:.1%} errors")
+    return results
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def serve(database: str, cache: bool) -> tuple:
+    """Starts the API on a local port with a SQLite database.
+
+    Returns:
+        (process, url)
+    """
+    port = free_port()
+    env = dict(os.environ)
+    env["CATALOG_SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.abspath(database)}"
+    if not cache:
+        env["CATALOG_RESPONSE_CACHE_SIZE"] = "0"
+    process = subprocess.Popen([sys.executable, "-c", SERVE_CODE, str(port)], cwd = API_DIR,\
+        env = env, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+
+    for _ in range(100):
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout = 0.1):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.terminate()
+    sys.exit("The API did not start")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description = "Load generator for the API")
+    parser.add_argument("--url", default = URL, help = "API to test")
+    parser.add_argument("--serve", action = "store_true",\
+        help = "start the API with a new SQLite database and test it")
+    parser.add_argument("--database", help = "SQLite file of --serve (default: a temporary file)")
+    parser.add_argument("--no-cache", action = "store_true", help = "disable the answer cache of --serve")
+    parser.add_argument("--formats", default = "json,xml", help = "scenarios to replay: json, xml")
+    parser.add_argument("--methods", default = "", help = "only these methods, e.g. GET")
+    parser.add_argument("--concurrency", type = int, default = 16, help = "requests in flight")
+    parser.add_argument("--rate", type = float, default = 0, help = "requests per second (0: no limit)")
+    parser.add_argument("--duration", type = float, default = 10, help = "seconds")
+    parser.add_argument("--requests", type = int, help = "stop after this many requests")
+    parser.add_argument("--timeout", type = float, default = 30, help = "seconds per request")
+    parser.add_argument("--output", help = "write the results as JSON to this file")
+    args = parser.parse_args()
+
+    methods = [method.strip().upper() for method in args.methods.split(",") if method.strip()]
+    formats = [name.strip().lower() for name in args.formats.split(",") if name.strip()]
+    requests = build_requests(formats, methods)
+    if not requests:
+        sys.exit("No requests to send")
+
+    process = None
+    url = args.url
+    with tempfile.TemporaryDirectory() as directory:
+        if args.serve:
+            process, url = serve(args.database or os.path.join(directory, "catalog.sqlite"),\
+                not args.no_cache)
+        try:
+            stats, elapsed = asyncio.run(run(url, requests, args.concurrency, args.rate,\
+                args.duration, args.requests, args.timeout))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    results = report(stats, elapsed)
+    results["options"] = {"url": url, "concurrency": args.concurrency, "rate": args.rate,\
+        "formats": formats, "methods": methods}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent = 2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""REID
+   Fixtures of the tests
+
+   Every test builds the API with create_api() on its own SQLite file,
+   migrated and seeded like a deployment (flask migrate and flask seed),
+   with the foreign keys checked as PostgreSQL does.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+import pytest
+from sqlalchemy import event
+from apiAlchemy import create_api
+from modelsAlchemy import db
+from seed import seed
+import migrations
+
+JSON = {"content-type": "application/json"}
+XML = {"content-type": "application/xml"}
+
+def foreign_keys(connection, record) -> None:
+    connection.execute("PRAGMA foreign_keys = ON")
+
+@pytest.fixture
+def make_api(tmp_path):
+    """Builds an app on the database of the test, every app built by a test
+    shares it like the workers of a deployment.
+    """
+    def make(**config):
+        api = create_api({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'catalog.sqlite'}", **config})
+        with api.app_context():
+            event.listen(db.engine, "connect", foreign_keys)
+            migrations.upgrade(db.engine)
+            seed()
+        return api
+    return make
+
+@pytest.fixture
+def api(make_api):
+    return make_api()
+
+@pytest.fixture
+def client(api):
+    return api.test_client()
@@ -0,0 +1,64 @@
+"""REID
+   Bulk creation: one result for every item
+"""
+
+from conftest import JSON
+from querystats import query_budget
+
+def piece(name: str, **values) -> dict:
+    return {"piece_name": name, "date": "2020-01-02", "author": "band", "genre": "vocal",\
+        "nationality": "spanish", "studio": 1, "summary": "This piece...", **values}
+
+def test_partial_success(client):
+    items = [piece("Bulk 1"), {"piece_name": "Missing"}, piece("Bulk 1"), piece("Bulk 2")]
+    response = client.post("/api/pieces", json = items)
+    assert response.status_code == 202
+    results = response.get_json()
+    assert [result["status"] for result in results] == [201, 400, 400, 201]
+    assert results[2]["message"] == "Already exists"
+    counts = client.get("/api/studios/1/pieces", headers = JSON).get_json()
+    assert counts["number of pieces"] == 4
+
+def test_too_many_items(make_api):
+    client = make_api(BULK_MAX_ITEMS = 2).test_client()
+    response = client.post("/api/pieces", json = [piece(f"Bulk {n}") for n in range(3)])
+    assert response.status_code == 413
+
+def test_invalid_items_are_reported(client):
+    items = [piece("Bulk 1", date = "2020-13-45"), piece("Bulk 2", studio = "x"), piece("Bulk 3"),\
+        piece("Bulk 4", author = 5)]
+    response = client.post("/api/pieces", json = items)
+    assert response.status_code == 202
+    results = response.get_json()
+    assert [result["status"] for result in results] == [400, 400, 201, 400]
+    assert results[0]["message"] == "Date 2020-13-45 not valid!"
+    assert results[1]["message"] == "studio x not valid!"
+
+def test_invalid_notes_are_reported(client):
+    items = [{"piece_id": 1, "note": "high", "date": "2023-01-01", "text": "Good"},\
+        {"piece_id": 1, "note": 5, "date": "2023-01-01", "text": "Good"}]
+    results = client.post("/api/evaluations", json = items).get_json()
+    assert [result["status"] for result in results] == [400, 201]
+    assert client.get("/api/pieces/1/rating", headers = JSON).get_json()["count"] == 3
+
+def test_xml_collection(client):
+    body = "<Studios><Studio><studio_name>New</studio_name><email>n@x</email><phone>1</phone></Studio>"\
+        "<Studio><studio_name>Other</studio_name><email>o@x</email><phone></phone></Studio></Studios>"
+    response = client.post("/api/studios", data = body, headers = {"content-type": "application/xml"})
+    assert response.get_data(as_text = True).count("<status>201</status>") == 1
+
+def test_one_insert_for_many_rows(client):
+    with client.application.app_context(), query_budget(3):
+        results = client.post("/api/pieces", json = [piece(f"Bulk {n}") for n in range(1500)]).get_json()
+    assert [result["id"] for result in results] == list(range(5, 1505))
+
+def test_missing_studio_is_not_valid(client):
+    results = client.post("/api/pieces", json = [piece("Bulk 1", studio = 99), piece("Bulk 1")]).get_json()
+    assert [result["status"] for result in results] == [400, 201]
+    assert results[0]["message"] == "studio 99 not valid!"
+
+def test_list_of_one_is_a_bulk_post(client):
+    response = client.post("/api/pieces", json = [piece("Bulk 1")])
+    assert response.get_json() == [{"index": 0, "status": 201, "id": 5}]
+    response = client.post("/api/pieces", json = piece("Bulk 2"))
+    assert response.status_code == 202 and "<piece_name>bulk 2</piece_name>" in response.get_data(as_text = True)
@@ -0,0 +1,33 @@
+"""REID
+   Cached GET answers and their invalidation
+"""
+
+from conftest import JSON
+
+def test_not_modified(client):
+    response = client.get("/api/pieces/1", headers = JSON)
+    etag = response.headers["ETag"]
+    again = client.get("/api/pieces/1", headers = {**JSON, "If-None-Match": etag})
+    assert again.status_code == 304
+
+def test_writes_invalidate(client):
+    assert client.get("/api/pieces", headers = JSON).get_json()["pieces"][0]["piece_name"] == "Piece 1"
+    client.put("/api/pieces/1", json = [{"piece_name": "Renamed", "date": "2022-12-16", "author": "band",\
+        "genre": "vocal", "nationality": "spanish", "studio": 1, "summary": "This piece..."}])
+    assert client.get("/api/pieces", headers = JSON).get_json()["pieces"][0]["piece_name"] == "renamed"
+    assert client.get("/api/pieces/1", headers = JSON).get_json()["piece_name"] == "renamed"
+
+def test_rating_invalidated_by_an_evaluation(client):
+    assert client.get("/api/pieces/4/rating", headers = JSON).get_json()["count"] == 0
+    client.post("/api/evaluations", json = [{"piece_id": 4, "note": 5, "date": "2023-01-01", "text": "Good"}])
+    rating = client.get("/api/pieces/4/rating", headers = JSON).get_json()
+    assert (rating["count"], rating["average"]) == (1, 5.0)
+
+def test_no_last_modified_between_workers(make_api):
+    first, second = make_api().test_client(), make_api().test_client()
+    response = second.get("/api/pieces/1", headers = JSON)
+    assert "Last-Modified" not in response.headers
+    first.patch("/api/pieces/1", json = {"piece_name": "Renamed"})
+    #The second worker did not see the write, a date would still match
+    again = second.get("/api/pieces/1", headers = {**JSON, "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert again.status_code != 304
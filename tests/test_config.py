@@ -0,0 +1,21 @@
+"""REID
+   Defaults of create_api
+"""
+
+from conftest import JSON
+
+def test_internal_endpoints_are_off(client, make_api):
+    assert client.get("/api/_internal/pool").status_code == 404
+    assert make_api(INTERNAL_ENDPOINTS = True).test_client().get("/api/_internal/pool").status_code == 200
+
+def test_transfer_endpoints_are_off(client, make_api):
+    assert client.get("/api/studios/export", headers = {"content-type": "text/csv"}).status_code == 404
+    assert client.post("/api/studios/import", data = b"", headers = {"content-type": "text/csv"}).status_code == 404
+
+    client = make_api(TRANSFER_ENDPOINTS = True).test_client()
+    exported = client.get("/api/studios/export", headers = {"content-type": "application/x-ndjson"})
+    assert exported.get_data(as_text = True).count("\n") == 4
+    body = b"studio_name,email,phone\nNew,new@email.com,+1-2\n"
+    report = client.post("/api/studios/import", data = body, headers = {"content-type": "text/csv"}).get_json()
+    assert (report["inserted"], report["rejected"]) == (1, 0)
+    assert len(client.get("/api/studios", headers = JSON).get_json()["studios"]) == 5
@@ -0,0 +1,54 @@
+"""REID
+   Number of pieces of every studio
+"""
+
+from collections import Counter
+from conftest import JSON
+from modelsAlchemy import db, PieceRatingStats, StudioPieceCounts
+from querystats import query_budget
+
+def piece(name: str, studio: int) -> dict:
+    return {"piece_name": name, "date": "2020-01-02", "author": "band", "genre": "vocal",\
+        "nationality": "spanish", "studio": studio, "summary": "This piece..."}
+
+def counts(client) -> dict:
+    return {count["id"]: count["number of pieces"] for count in client.get("/api/studios/counts", headers = JSON).get_json()}
+
+def test_delete_a_studio_that_had_pieces(client):
+    client.post("/api/pieces", json = [piece("Moved", 3)])
+    assert counts(client)[3] == 1
+    client.patch("/api/pieces/5", json = {"studio": 4})
+    assert client.delete("/api/studios/3").status_code == 204
+    assert client.delete("/api/pieces/5").status_code == 204
+    assert client.delete("/api/studios/4").status_code == 204
+    assert set(counts(client)) == {1, 2}
+
+def test_first_count_is_one_statement(api):
+    with api.app_context():
+        #Two first writes of the same studio can not both insert its row
+        with query_budget(1):
+            StudioPieceCounts.add(3, 1)
+        with query_budget(1):
+            StudioPieceCounts.add(3, 1)
+        StudioPieceCounts.add(4, -1)
+        db.session.commit()
+        assert db.session.get(StudioPieceCounts, 3).count == 2
+        assert db.session.get(StudioPieceCounts, 4).count == 0
+
+def test_rating_stats_upsert(api):
+    with api.app_context():
+        with query_budget(1):
+            PieceRatingStats.add(4, Counter([5, 3]))
+        PieceRatingStats.add(4, Counter([5]))
+        PieceRatingStats.add(4, Counter([3]), -1)
+        db.session.commit()
+        stats = db.session.get(PieceRatingStats, 4)
+        assert (stats.count, stats.total, stats.note_3, stats.note_5) == (2, 10, 0, 2)
+
+def test_move_a_piece_to_a_missing_studio(make_api):
+    for counter in (True, False):
+        client = make_api(STUDIO_PIECE_COUNTER = counter).test_client()
+        response = client.put("/api/pieces/1", json = [{**piece("Piece 1", 99), "date": "2022-12-16"}])
+        assert response.status_code == 400
+        assert client.get("/api/pieces/1", headers = JSON).get_json()["studio"] == 1
+    assert counts(client)[1] == 2
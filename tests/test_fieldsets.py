@@ -0,0 +1,14 @@
+"""REID
+   Sparse fieldsets with ?fields=
+"""
+
+from conftest import JSON, XML
+
+def test_only_the_fields_asked(client):
+    piece = client.get("/api/pieces/1?fields=piece_name", headers = JSON).get_json()
+    assert set(piece) == {"id", "url", "piece_name"}
+    xml = client.get("/api/studios?fields=studio_name", headers = XML).get_data(as_text = True)
+    assert "<studio_name>" in xml and "<email>" not in xml
+
+def test_unknown_field(client):
+    assert client.get("/api/pieces?fields=nope", headers = JSON).status_code == 400
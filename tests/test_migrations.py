@@ -0,0 +1,47 @@
+"""REID
+   Versioned migrations
+"""
+
+from sqlalchemy import create_engine, inspect, text
+import migrations
+
+# Tables of the baseline, made by create_all before the migrations
+BASELINE = [
+    "CREATE TABLE studios (id INTEGER NOT NULL, name VARCHAR(250) NOT NULL, email VARCHAR(250) NOT NULL,"
+        " phone VARCHAR(250) NOT NULL, PRIMARY KEY (id), UNIQUE (name), UNIQUE (email), UNIQUE (phone))",
+    "CREATE TABLE pieces (id INTEGER NOT NULL, name VARCHAR(250) NOT NULL, date DATE NOT NULL,"
+        " author VARCHAR(250) NOT NULL, genre VARCHAR(250) NOT NULL, nationality VARCHAR(250) NOT NULL,"
+        " studio INTEGER, summary VARCHAR(250), PRIMARY KEY (id), UNIQUE (name),"
+        " FOREIGN KEY(studio) REFERENCES studios (id))",
+    "CREATE TABLE evaluations (id INTEGER NOT NULL, piece INTEGER, note INTEGER NOT NULL, date DATE NOT NULL,"
+        " text VARCHAR(250) NOT NULL, PRIMARY KEY (id), FOREIGN KEY(piece) REFERENCES pieces (id))",
+]
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.sqlite'}")
+    applied = migrations.upgrade(engine)
+    assert [version for version, description in applied] == [migration.VERSION for migration in migrations.MIGRATIONS]
+    assert migrations.upgrade(engine) == []
+    with engine.connect() as connection:
+        assert migrations.current_version(connection) == migrations.MIGRATIONS[-1].VERSION
+        assert migrations.pending(connection) == []
+
+def test_target_version(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.sqlite'}")
+    assert [version for version, description in migrations.upgrade(engine, 3)] == [1, 2, 3]
+    assert "version" not in [column["name"] for column in inspect(engine).get_columns("pieces")]
+    assert [version for version, description in migrations.upgrade(engine)] == [4, 5]
+    assert "version" in [column["name"] for column in inspect(engine).get_columns("pieces")]
+
+def test_adopt_a_baseline_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.sqlite'}")
+    with engine.begin() as connection:
+        for statement in BASELINE:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO studios VALUES (1, 'studio', 'mail', 'phone')"))
+        connection.execute(text("INSERT INTO pieces VALUES (1, 'piece', '2020-01-02', 'band', 'vocal', 'spanish', 1, '')"))
+    migrations.upgrade(engine)
+    indexes = [index["name"] for index in inspect(engine).get_indexes("evaluations")]
+    assert "ix_evaluations_piece_date" in indexes
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT studio, count FROM studio_piece_counts")).all() == [(1, 1)]
@@ -0,0 +1,47 @@
+"""REID
+   Keyset pages and streamed lists
+"""
+
+from conftest import JSON, XML
+
+def test_pages_follow_the_cursor(client):
+    first = client.get("/api/pieces?limit=3", headers = JSON).get_json()
+    assert [piece["id"] for piece in first["pieces"]] == [1, 2, 3]
+    second = client.get(f"/api/pieces?limit=3&after={first['next']}", headers = JSON).get_json()
+    assert [piece["id"] for piece in second["pieces"]] == [4]
+    assert second["next"] is None
+
+def test_limit_out_of_range(client):
+    assert client.get("/api/pieces?limit=0", headers = JSON).status_code == 400
+    assert client.get("/api/pieces?limit=100000", headers = JSON).status_code == 400
+
+def test_evaluations_of_a_piece_by_date(client):
+    response = client.get("/api/pieces/1/evaluations?date_from=2000-01-01&order=desc&end=1", headers = JSON)
+    assert response.status_code == 202
+    page = response.get_json()
+    assert len(page["evaluations"]) == 1
+    rest = client.get(f"/api/pieces/1/evaluations?date_from=2000-01-01&order=desc&after={page['next']}", headers = JSON).get_json()
+    ids = [evaluation["id"] for evaluation in page["evaluations"] + rest["evaluations"]]
+    assert sorted(ids) == [1, 2]
+
+
+def test_streamed_list_is_the_whole_page(client):
+    streamed = client.get("/api/pieces?stream=true", headers = JSON)
+    assert streamed.is_streamed
+    assert [piece["id"] for piece in streamed.get_json()["pieces"]] == [1, 2, 3, 4]
+    xml = client.get("/api/pieces?stream=true&limit=2", headers = XML).get_data(as_text = True)
+    assert xml.startswith("<Pieces>") and xml.count("<Piece>") == 2 and "<next>" in xml
+
+def test_start_only_skips_rows_of_the_first_page(client):
+    client.post("/api/evaluations", json = [{"piece_id": 4, "note": 3, "date": f"2023-01-{day:02}", "text": "Good"}\
+        for day in range(1, 11)])
+    query = "/api/pieces/4/evaluations?date_from=2000-01-01&start=5&end=2"
+    page = client.get(query, headers = JSON).get_json()
+    ids = [evaluation["id"] for evaluation in page["evaluations"]]
+    while page["next"]:
+        page = client.get(f"{query}&after={page['next']}", headers = JSON).get_json()
+        ids += [evaluation["id"] for evaluation in page["evaluations"]]
+    #The 10 new evaluations are 5 to 14, by date
+    assert ids == list(range(10, 15))
+    streamed = client.get(f"{query}&stream=true", headers = JSON).get_json()
+    assert len(streamed["evaluations"]) == 2
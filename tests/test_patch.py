@@ -0,0 +1,58 @@
+"""REID
+   Partial updates with PATCH
+"""
+
+from conftest import JSON, XML
+
+def test_only_the_fields_given(client):
+    response = client.patch("/api/pieces/1", json = {"summary": "New summary"})
+    assert response.status_code == 202
+    piece = response.get_json()
+    assert (piece["summary"], piece["piece_name"]) == ("new summary", "Piece 1")
+    #The version is only given by the ETag
+    assert "version" not in piece and response.headers["ETag"].startswith('"2-')
+
+def test_xml(client):
+    response = client.patch("/api/studios/2", data = "<Studio><phone>+34-1</phone></Studio>", headers = XML)
+    assert response.status_code == 202
+    assert "<phone>+34-1</phone>" in response.get_data(as_text = True)
+
+def test_validation(client):
+    for item in ({"id": 5}, {"nope": 1}, {}, {"date": "2020-13-45"}, {"studio": "x"}, {"author": None}):
+        assert client.patch("/api/pieces/1", json = item).status_code == 400
+    assert client.patch("/api/pieces/1", data = "x", headers = {"content-type": "text/plain"}).status_code == 415
+    assert client.patch("/api/pieces/99", json = {"summary": "x"}).status_code == 404
+
+def test_moves_keep_the_counters(client):
+    client.patch("/api/pieces/1", json = {"studio": 2})
+    counts = {count["id"]: count["number of pieces"] for count in client.get("/api/studios/counts", headers = JSON).get_json()}
+    assert (counts[1], counts[2]) == (1, 3)
+    client.patch("/api/evaluations/1", json = {"piece_id": 4, "note": 3})
+    assert client.get("/api/pieces/1/rating", headers = JSON).get_json()["count"] == 1
+    assert client.get("/api/pieces/4/rating", headers = JSON).get_json()["sum"] == 3
+
+def test_patch_with_the_etag_of_the_get(client):
+    etag = client.get("/api/pieces/1", headers = JSON).headers["ETag"]
+    response = client.patch("/api/pieces/1", json = {"piece_name": "First"}, headers = {"If-Match": etag})
+    assert response.status_code == 202
+    #The answer has the tag of the new version, for the next PATCH
+    again = client.patch("/api/pieces/1", json = {"piece_name": "Second"}, headers = {"If-Match": response.headers["ETag"]})
+    assert again.status_code == 202
+    assert client.patch("/api/pieces/1", json = {"piece_name": "Third"}, headers = {"If-Match": etag}).status_code == 412
+    assert client.get("/api/pieces/1", headers = JSON).headers["ETag"] == again.headers["ETag"]
+
+def test_etag_of_a_field_set_has_the_version(client):
+    etag = client.get("/api/studios/1?fields=studio_name", headers = XML).headers["ETag"]
+    assert client.patch("/api/studios/1", json = {"studio_name": "Renamed"}, headers = {"If-Match": etag}).status_code == 202
+
+def test_put_is_validated_like_a_patch(client):
+    piece = {"piece_name": "Piece 1", "date": "2004-12-17", "author": "band", "genre": "vocal",\
+        "nationality": "spanish", "studio": 2, "summary": "A piece"}
+    for item in ({**piece, "date": "2020-13-45"}, {**piece, "studio": "x"}, {**piece, "nope": 1},\
+        {**piece, "version": 7}, {key: value for key, value in piece.items() if key != "author"}):
+        assert client.put("/api/pieces/1", json = [item]).status_code == 400
+    assert client.get("/api/pieces/1", headers = JSON).get_json()["summary"] != "a piece"
+    assert client.put("/api/pieces/1", json = [piece]).status_code == 202
+    assert client.get("/api/pieces/1", headers = JSON).get_json()["studio"] == 2
+    evaluation = "<Evaluation><piece_id>99</piece_id><note>2</note><date>2015-09-14</date><text>x</text></Evaluation>"
+    assert client.put("/api/evaluations/3", data = evaluation, headers = XML).status_code == 400
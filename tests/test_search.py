@@ -0,0 +1,26 @@
+"""REID
+   Full-text search of the evaluations
+"""
+
+from conftest import JSON
+
+def search(client, query: str) -> list:
+    response = client.get(f"/api/evaluations?{query}", headers = JSON)
+    assert response.status_code == 202
+    return sorted(evaluation["id"] for evaluation in response.get_json()["evaluations"])
+
+def test_words(client):
+    assert search(client, "pattern=good") == [1, 3]
+    assert search(client, "pattern=piece%20bad") == [2, 4]
+
+def test_phrase_and_prefix(client):
+    assert search(client, "pattern=is%20good&mode=phrase") == [1, 3]
+    assert search(client, "pattern=go&mode=prefix") == [1, 3]
+
+def test_without_words_every_evaluation_matches(client):
+    assert search(client, "pattern=") == [1, 2, 3, 4]
+
+def test_index_follows_the_writes(client):
+    client.put("/api/evaluations/4", json = [{"piece_id": 3, "note": 1, "date": "2017-11-02", "text": "Now it is good"}])
+    assert search(client, "pattern=good") == [1, 3, 4]
+    assert search(client, "pattern=bad") == [2]
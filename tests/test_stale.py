@@ -0,0 +1,32 @@
+"""REID
+   PUT and DELETE of a row written by another request meanwhile
+"""
+
+import pytest
+from sqlalchemy import event, update
+from modelsAlchemy import db, Studios, Evaluations
+from conftest import JSON
+
+@pytest.fixture
+def concurrent_write(api):
+    """Adds 1 to the version of a row from another connection just before
+    the session of the request writes it.
+    """
+    def write(model, id):
+        def bump(session, context, instances):
+            with db.engine.begin() as connection:
+                connection.execute(update(model).where(model.id == id).values(version = model.version + 1))
+        event.listen(db.session, "before_flush", bump, once = True)
+    with api.app_context():
+        yield write
+
+def test_put_of_a_modified_row(api, concurrent_write):
+    concurrent_write(Studios, 1)
+    response = api.test_client().put("/api/studios/1", json = [{"studio_name": "Renamed", "email": "renamed@studio.com", "phone": "0102030405"}])
+    assert response.status_code == 409
+
+def test_delete_of_a_modified_row(api, concurrent_write):
+    concurrent_write(Evaluations, 1)
+    client = api.test_client()
+    assert client.delete("/api/evaluations/1").status_code == 409
+    assert client.get("/api/pieces/1/rating", headers = JSON).get_json()["count"] == 2